@@ -12,6 +12,5 @@ if args.sheet_task_id:
     agent.run(task)
 else:
     task_lst = sheet_task_loader.load_sheet_task_dataset()
-    for task_id, task in enumerate(task_lst):
-        args.sheet_task_id = task_id
-        agent.run(task)
\ No newline at end of file
+    for task_id, result in agent.run_many(task_lst, args.concurrency):
+        print('The result of sheet task {0}: {1}'.format(task_id, result))
\ No newline at end of file
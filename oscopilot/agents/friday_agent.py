@@ -1,10 +1,18 @@
 from oscopilot.agents.base_agent import BaseAgent
 from oscopilot.utils import check_os_version
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import copy
 import json
 import logging
+import queue
 import sys
+import tempfile
+import threading
 from oscopilot.prompts.friday_pt import prompt
 from oscopilot.utils import TaskStatusCode, InnerMonologue, ExecutionState, JudgementResult, RepairingResult
+from oscopilot.utils import TaskBudget, set_current_budget, reset_current_budget
+from oscopilot.utils import TraceReplayer, TraceMismatchError, recording_trace, replaying_trace, is_replaying, task_trace_path
 
 
 class FridayAgent(BaseAgent):
@@ -30,37 +38,185 @@ class FridayAgent(BaseAgent):
         """
         super().__init__()
         self.config = config
-        tool_manager = Tool_Manager(config.generated_tool_repo_path)
+        self.tool_manager = Tool_Manager(config.generated_tool_repo_path)
         self.planner = planner(prompt['planning_prompt'])
-        self.retriever = retriever(prompt['retrieve_prompt'], tool_manager)
-        self.executor = executor(prompt['execute_prompt'], tool_manager, config.max_repair_iterations)
+        self.retriever = retriever(prompt['retrieve_prompt'], self.tool_manager)
+        self.executor = executor(prompt['execute_prompt'], self.tool_manager, config.max_repair_iterations)
+        # Shared by the workers of run_many, so that concurrent tasks do not store tools at the same time
+        self.tool_store_lock = threading.Lock()
         self.score = self.config.score
+        self.fast_path = self.config.fast_path
+        self.direct_invoke = self.config.direct_invoke
+        self.native_api = self.config.native_api
+        self.batch_judge_size = self.config.batch_judge_size
+        self.prewarm_languages = [language.strip() for language in (self.config.prewarm or '').split(',') if language.strip()]
+        # The trace bundle the runs of this agent are recorded into, set per task by run_many
+        self.trace_path = self.config.trace_path
         self.task_status = TaskStatusCode.START
+        self.budget = TaskBudget()
         self.inner_monologue = InnerMonologue()
+        # Batched subtasks that ran but were not refined because of a replan, see `run_judge_batch`
+        self.pending_executions = {}
         try:
             check_os_version(self.system_version)
         except ValueError as e:
             print(e)        
 
-    def run(self, task):
+    def run(self, task, time_budget=None, token_budget=None):
         """
         Executes the given task by planning, executing, and refining as needed until the task is completed or fails.
 
+        The task runs within a wall-clock and token budget. Once the budget is low, the agent repairs at most once per
+        subtask, judges executions by their errors instead of asking the LLM, and the LLM switches to the fallback model
+        if one is configured. Once the budget is exhausted, the agent stops with the result obtained so far and sets
+        `task_status` to `TaskStatusCode.BUDGET_EXHAUSTED`.
+        If the `trace_path` setting is set, the run is recorded into a trace bundle that `replay` can re-drive. Kernels and shells are not prewarmed while a trace is replayed.
+        With the `shell_session` setting, the Shell subtasks of the task share one bash session, stopped at the end of the run.
+        With the `kernel_affinity` setting, the kernel steps of the task share one pooled kernel, returned to the pool at the end of the run.
+        With the `prewarm` setting, the kernels and shells of the listed languages start in the background while the task is planned.
+
         Args:
             query (object): The high-level task to be executed.
+            time_budget (float, optional): The wall-clock budget in seconds. Defaults to the `time_budget` setting, unlimited if unset.
+            token_budget (int, optional): The LLM token budget. Defaults to the `token_budget` setting, unlimited if unset.
 
         No explicit return value, but the method controls the flow of task execution and may exit the process in case of irreparable failures.
         """
+        self.task_status = TaskStatusCode.START
+        self.budget = TaskBudget(time_budget or self.config.time_budget, token_budget or self.config.token_budget)
+        budget_token = set_current_budget(self.budget)
+        if not is_replaying():
+            self.executor.prewarm(self.prewarm_languages)
+        try:
+            with recording_trace(task, self.trace_path):
+                self.plan_and_execute(task)
+        finally:
+            reset_current_budget(budget_token)
+            self.log_warmup_metrics()
+            self.executor.close_shell_session()
+            self.executor.release_kernel()
+        if self.budget.is_exhausted():
+            self.task_status = TaskStatusCode.BUDGET_EXHAUSTED
+
+    def replay(self, bundle, strict=False):
+        """
+        Re-drives `run` from a recorded trace bundle, without network access or real execution.
+
+        LLM responses, retrieved tools and execution states are served from the bundle in the order they were
+        recorded, so a replayed run follows the recorded one exactly while the agent's own code runs for real.
+        This allows profiling and bisecting the planner, retriever and agent loop independently of model and
+        execution latency.
+
+        Args:
+            bundle (str or dict): The path of a trace bundle written by `run`, or the loaded bundle.
+            strict (bool, optional): Whether to fail when a request differs from the recorded one, instead of logging it.
+
+        Returns:
+            TraceReplayer: The replayed trace. Its `recorded_seconds` is the model and execution time of the recorded run.
+
+        Raises:
+            TraceMismatchError: If the replayed run diverged from the recorded one and did not consume every event of the trace.
+        """
+        if isinstance(bundle, str):
+            replayer = TraceReplayer.load(bundle, strict)
+        else:
+            replayer = TraceReplayer(bundle, strict)
+        with replaying_trace(replayer):
+            self.run(replayer.task)
+        if replayer.position != len(replayer.events):
+            raise TraceMismatchError("The replayed run stopped after {} of {} recorded events.".format(
+                replayer.position, len(replayer.events)))
+        return replayer
+
+    def plan_and_execute(self, task):
+        """
+        Plans the task and executes its subtasks in order, the loop behind `run`.
+
+        Args:
+            task (object): The high-level task to be executed.
+        """
         self.planner.reset_plan()
         self.reset_inner_monologue()
         sub_tasks_list = self.planning(task)
         print("The task list obtained after planning is: {}".format(sub_tasks_list))
+        self.pending_executions = {}
+
+        while self.planner.sub_task_list:
+            if self.budget.is_exhausted():
+                print("The budget of the task is exhausted ({}), stopping with the partial result.".format(self.budget))
+                break
+            try:
+                sub_tasks = self.pop_judge_batch()
+                execution_states, judgements = self.run_judge_batch(sub_tasks, task)
+                isTaskFailed = False
+                for index, (sub_task, execution_state, judgement) in enumerate(zip(sub_tasks, execution_states, judgements)):
+                    isTaskCompleted, isReplan = self.self_refining(sub_task, execution_state, judgement)
+                    if isReplan:
+                        # The remaining subtasks of the batch already ran, they are scheduled again without re-executing them
+                        self.defer_judge_batch(sub_tasks[index + 1:], execution_states[index + 1:], judgements[index + 1:])
+                        break
+                    if isTaskCompleted:
+                        print("The execution of the current sub task has been successfully completed.")
+                    else:
+                        print("{} not completed in repair round {}".format(sub_task, self.config.max_repair_iterations))
+                        self.keep_judge_batch_results(sub_tasks[index + 1:], execution_states[index + 1:], judgements[index + 1:])
+                        isTaskFailed = True
+                        break
+                if isTaskFailed:
+                    break
+            except Exception as e:
+                print("Current task execution failed. Error: {}".format(str(e)))
+                break
+
+    async def arun(self, task, time_budget=None, token_budget=None):
+        """
+        Asynchronous variant of `run`, driving the planning, execution and refinement loop on an event loop.
+
+        LLM calls are awaited and code runs as asyncio subprocesses, so many tasks can share one event loop.
+        Concurrent tasks need separate agents (see `spawn_worker`), since an agent holds the state of one plan.
+        Subtasks are judged one at a time; `batch_judge_size` only applies to `run`.
+
+        Args:
+            task (object): The high-level task to be executed.
+            time_budget (float, optional): The wall-clock budget in seconds, see `run`.
+            token_budget (int, optional): The LLM token budget, see `run`.
+        """
+        self.task_status = TaskStatusCode.START
+        self.budget = TaskBudget(time_budget or self.config.time_budget, token_budget or self.config.token_budget)
+        budget_token = set_current_budget(self.budget)
+        if not is_replaying():
+            self.executor.prewarm(self.prewarm_languages)
+        try:
+            with recording_trace(task, self.trace_path):
+                await self.aplan_and_execute(task)
+        finally:
+            reset_current_budget(budget_token)
+            self.log_warmup_metrics()
+            self.executor.close_shell_session()
+            self.executor.release_kernel()
+        if self.budget.is_exhausted():
+            self.task_status = TaskStatusCode.BUDGET_EXHAUSTED
+
+    async def aplan_and_execute(self, task):
+        """
+        Asynchronous variant of `plan_and_execute`, the loop behind `arun`.
+
+        Args:
+            task (object): The high-level task to be executed.
+        """
+        self.planner.reset_plan()
+        self.reset_inner_monologue()
+        sub_tasks_list = await self.aplanning(task)
+        print("The task list obtained after planning is: {}".format(sub_tasks_list))
 
         while self.planner.sub_task_list:
+            if self.budget.is_exhausted():
+                print("The budget of the task is exhausted ({}), stopping with the partial result.".format(self.budget))
+                break
             try:
                 sub_task = self.planner.sub_task_list.pop(0)
-                execution_state = self.executing(sub_task, task)
-                isTaskCompleted, isReplan = self.self_refining(sub_task, execution_state)
+                execution_state = await self.aexecuting(sub_task, task)
+                isTaskCompleted, isReplan = await self.aself_refining(sub_task, execution_state)
                 if isReplan: continue
                 if isTaskCompleted:
                     print("The execution of the current sub task has been successfully completed.")
@@ -71,7 +227,187 @@ class FridayAgent(BaseAgent):
                 print("Current task execution failed. Error: {}".format(str(e)))
                 break
 
-    def self_refining(self, tool_name, execution_state: ExecutionState):
+    def run_many(self, tasks, concurrency=None):
+        """
+        Executes several tasks concurrently and yields their results as they finish.
+
+        The tasks are run by a pool of worker agents created once for the whole batch. The workers share the
+        LLM client, the loaded tool manager, the retriever and the execution environment of this agent, while
+        each of them has its own plan, inner monologue and executor. Every task gets its own scratch
+        directory for the temporary files of its executions, and with the `trace_path` setting its own trace
+        bundle, named after the index of the task (see `task_trace_path`). As the tasks share the working
+        directory, rollback on failure is disabled when more than one task runs at a time: restoring the
+        checkpoint of one task would revert the files the other tasks wrote since.
+
+        Args:
+            tasks (iterable): The high-level tasks to be executed.
+            concurrency (int, optional): The maximum number of tasks running at the same time. Defaults to the `concurrency` setting of the configuration.
+
+        Yields:
+            tuple: The index of the finished task in `tasks` and its result, an empty string if the task failed.
+        """
+        tasks = list(tasks)
+        concurrency = max(1, concurrency or self.config.concurrency or 1)
+        rollback_on_failure = self.executor.rollback_on_failure and concurrency == 1
+        if self.executor.rollback_on_failure and not rollback_on_failure:
+            print("Rollback on failure is disabled for concurrent tasks, as they share the working directory.")
+        idle_workers = queue.Queue()
+        for _ in range(min(concurrency, len(tasks))):
+            worker = self.spawn_worker()
+            worker.executor.rollback_on_failure = rollback_on_failure
+            idle_workers.put(worker)
+
+        def run_task(index, task):
+            worker = idle_workers.get()
+            try:
+                with tempfile.TemporaryDirectory(prefix='oscopilot_task_') as scratch_dir:
+                    worker.executor.scratch_dir = scratch_dir
+                    worker.trace_path = task_trace_path(self.trace_path, index)
+                    worker.run(task)
+                return index, worker.inner_monologue.result
+            except Exception as e:
+                print("Task {} failed. Error: {}".format(index, str(e)))
+                return index, ''
+            finally:
+                worker.executor.scratch_dir = None
+                idle_workers.put(worker)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(run_task, index, task) for index, task in enumerate(tasks)]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def log_warmup_metrics(self):
+        """
+        Logs how many steps of the task found a running kernel or shell and how many had to start one.
+        """
+        metrics = self.executor.warmup_metrics()
+        if metrics:
+            logging.info("Warm starts and cold starts by language: {}".format(json.dumps(metrics)))
+
+    def spawn_worker(self):
+        """
+        Creates a worker agent for `run_many` that reuses the loaded resources of this agent.
+
+        The configuration, LLM client, tool manager, retriever and environment are shared. The planner and
+        executor are shallow copies, so their per-task state is independent once the plan is reset.
+
+        Returns:
+            FridayAgent: The worker agent.
+        """
+        worker = copy.copy(self)
+        worker.planner = copy.copy(self.planner)
+        worker.planner.reset_plan()
+        worker.executor = copy.copy(self.executor)
+        worker.executor.shell_session = None
+        worker.task_status = TaskStatusCode.START
+        worker.inner_monologue = InnerMonologue()
+        return worker
+
+    def pop_judge_batch(self):
+        """
+        Pops the next subtask, together with the following subtasks that can be judged in the same LLM call.
+
+        Consecutive Shell subtasks are batched as long as none of them depends on another subtask of the
+        batch, up to `batch_judge_size` subtasks. With batching disabled only one subtask is returned.
+
+        Returns:
+            list[str]: The names of the popped subtasks, in execution order.
+        """
+        batch = [self.planner.sub_task_list.pop(0)]
+        if not self.is_judge_batchable(batch[0]):
+            return batch
+        while len(batch) < self.batch_judge_size and self.planner.sub_task_list:
+            candidate = self.planner.sub_task_list[0]
+            if not self.is_judge_batchable(candidate):
+                break
+            if any(dependency in batch for dependency in self.planner.tool_graph[candidate]):
+                break
+            batch.append(self.planner.sub_task_list.pop(0))
+        return batch
+
+    def run_judge_batch(self, sub_tasks, task):
+        """
+        Executes the subtasks of a judging batch and judges them with a single LLM call.
+
+        Subtasks that already ran in an earlier batch, and were scheduled again after a replan, are not executed
+        a second time: their execution state and judgement are reused as long as their dependencies are unchanged.
+
+        Args:
+            sub_tasks (list[str]): The names of the subtasks, as returned by `pop_judge_batch`.
+            task (object): The high-level task the subtasks belong to.
+
+        Returns:
+            tuple: The execution states and the judgements of the subtasks, in the same order. A judgement is None
+            if the subtask is to be judged on its own.
+        """
+        execution_states, judgements = [], []
+        for sub_task in sub_tasks:
+            dependencies, execution_state, judgement = self.pending_executions.pop(sub_task, (None, None, None))
+            if execution_state is None or dependencies != list(self.planner.tool_graph[sub_task]):
+                execution_state, judgement = self.executing(sub_task, task), None
+            execution_states.append(execution_state)
+            judgements.append(judgement)
+        unjudged = [index for index, judgement in enumerate(judgements) if judgement is None]
+        if len(unjudged) > 1:
+            batch_judgements = self.batch_judging([sub_tasks[index] for index in unjudged],
+                                                  [execution_states[index] for index in unjudged])
+            for index, judgement in zip(unjudged, batch_judgements):
+                judgements[index] = judgement
+        return execution_states, judgements
+
+    def defer_judge_batch(self, sub_tasks, execution_states, judgements):
+        """
+        Keeps the executions of batched subtasks that were not refined because of a replan, for `run_judge_batch`.
+
+        The subtasks are put back in front of the plan if the replan did not schedule them again.
+
+        Args:
+            sub_tasks (list[str]): The names of the subtasks left in the batch.
+            execution_states (list[ExecutionState]): Their execution states, in the same order.
+            judgements (list[JudgementResult]): Their judgements, in the same order.
+        """
+        for sub_task, execution_state, judgement in zip(sub_tasks, execution_states, judgements):
+            self.pending_executions[sub_task] = (list(self.planner.tool_graph[sub_task]), execution_state, judgement)
+        missing = [sub_task for sub_task in sub_tasks
+                   if sub_task not in self.planner.sub_task_list and not self.planner.tool_node[sub_task].status]
+        self.planner.sub_task_list[:0] = missing
+
+    def keep_judge_batch_results(self, sub_tasks, execution_states, judgements):
+        """
+        Records the results of batched subtasks that ran before another subtask of the batch failed the task.
+
+        Subtasks the batched judgement accepted are marked as completed, so their results are part of the
+        partial result; the others are reported as executed but not refined.
+
+        Args:
+            sub_tasks (list[str]): The names of the subtasks left in the batch.
+            execution_states (list[ExecutionState]): Their execution states, in the same order.
+            judgements (list[JudgementResult]): Their judgements, in the same order.
+        """
+        for sub_task, execution_state, judgement in zip(sub_tasks, execution_states, judgements):
+            if judgement is not None and judgement.status == 'Complete':
+                state, node_type, description, code, result, relevant_code = execution_state.get_all_state()
+                self.inner_monologue.result = result
+                self.planner.update_tool(sub_task, result, relevant_code, True, node_type)
+                print("{} was executed in the same batch and has been completed.".format(sub_task))
+            else:
+                print("{} was executed in the same batch but is left unrefined.".format(sub_task))
+
+    def is_judge_batchable(self, tool_name):
+        """
+        Checks whether a subtask is cheap enough to be executed before its judgement.
+
+        Args:
+            tool_name (str): The name of the subtask.
+
+        Returns:
+            bool: True if the subtask may join a judging batch.
+        """
+        tool_node = self.planner.tool_node[tool_name]
+        return tool_node.node_type == 'Shell' and not tool_node.code
+
+    def self_refining(self, tool_name, execution_state: ExecutionState, judgement=None):
         """
         Analyzes and potentially refines the execution of a tool based on its current execution state. 
         This can involve replanning or repairing the execution strategy based on the analysis of execution errors and outcomes.
@@ -79,6 +415,7 @@ class FridayAgent(BaseAgent):
         Args:
             tool_name (str): The name of the tool being executed.
             execution_state (ExecutionState): The current state of the tool's execution, encapsulating all relevant execution information including errors, results, and codes.
+            judgement (JudgementResult, optional): A judgement already obtained for this execution, e.g. from a batched judge call. If None, the execution is judged here.
 
         Returns:
             tuple:
@@ -91,18 +428,23 @@ class FridayAgent(BaseAgent):
         isReplan = False
         score = 0
         state, node_type, description, code, result, relevant_code = execution_state.get_all_state()
-        if node_type in ['Python', 'Shell', 'AppleScript']:
-            judgement = self.judging(tool_name, state, code, description)
+        invoke = execution_state.invoke
+        if node_type in ['Python', 'Shell', 'AppleScript', 'Map']:
+            if judgement is None:
+                judgement = self.static_check_judgement(state)
+            if judgement is None:
+                judgement = self.judging(tool_name, state, code, description)
             score = judgement.score
             # need_repair, critique, score, reasoning, error_type 
             if judgement.status == 'Replan':
                 # raise NotImplementedError
                 print("The current task requires replanning...")
+                self.executor.rollback_working_dir(state)
                 new_sub_task_list = self.replanning(tool_name, judgement.critique)
                 print("The new task list obtained after planning is: {}".format(new_sub_task_list))
                 isReplan = True
             elif judgement.status == 'Amend':
-                repairing_result = self.repairing(tool_name, code, description, state, judgement.critique, judgement.status)
+                repairing_result = self.repairing(tool_name, code, description, state, judgement.critique, judgement.status, invoke)
                 if repairing_result.status == 'Complete':
                     isTaskCompleted = True
                 elif repairing_result.status == 'Replan':
@@ -117,7 +459,7 @@ class FridayAgent(BaseAgent):
             else:
                 isTaskCompleted = True
             if node_type == 'Python' and isTaskCompleted and score >= self.score:
-                self.executor.store_tool(tool_name, code)
+                self.store_tool(tool_name, code)
                 print("{} has been stored in the tool repository.".format(tool_name))
         else: 
             isTaskCompleted = True
@@ -144,7 +486,10 @@ class FridayAgent(BaseAgent):
         # decompose task
         # Set up the generation format error handling mechanism
         try:
-            self.planner.decompose_task(task, retrieve_tool_description_pair)
+            if self.fast_path:
+                self.planner.decompose_task_fast(task, retrieve_tool_description_pair)
+            else:
+                self.planner.decompose_task(task, retrieve_tool_description_pair)
         except Exception as e:
             print("api call failed:", str(e))  
             return     
@@ -162,6 +507,8 @@ class FridayAgent(BaseAgent):
             ExecutionState: The state of execution for the sub-task, including the result, any errors encountered, and additional execution-related information.
 
         The method dynamically adapts the execution strategy based on the type of sub-task, utilizing the executor component for code execution, API interaction, or question-answering as appropriate.
+        With `direct_invoke` enabled, a stored tool named like the sub-task runs as it is with only its invocation generated; its code is generated again only if it fails.
+        With `native_api` enabled, an API is called directly with arguments generated as JSON; code calling it is generated only if the call fails.
         """
         tool_node = self.planner.tool_node[tool_name]
         description = tool_node.description
@@ -171,9 +518,14 @@ class FridayAgent(BaseAgent):
         # The return value of the current task
         result = ''
         relevant_code = {}
+        invoke = ''
+        # Whether a stored tool is run as it is, with only its invocation generated
+        stored_tool = False
+        # The arguments of an API called without generated code
+        api_args = None
         node_type = tool_node.node_type
         pre_tasks_info = self.planner.get_pre_tasks_info(tool_name)
-        if node_type == 'Python':
+        if node_type == 'Python' and not tool_node.code:
             # retrieve existing tool
             retrieve_name = self.retriever.retrieve_tool_name(description, 3)
             relevant_code = self.retriever.retrieve_tool_code_pair(retrieve_name)
@@ -186,19 +538,49 @@ class FridayAgent(BaseAgent):
             print(result)
             logging.info(result)
         else:
-            invoke = ''
             # Set up the generation format error handling mechanism
             try:
                 if node_type == 'API':
                     api_path = self.executor.extract_API_Path(description)
-                    code = self.executor.api_tool(description, api_path, pre_tasks_info)
+                    api_args = self.generate_api_args(description, api_path, pre_tasks_info)
+                    if api_args is None:
+                        code = self.executor.api_tool(description, api_path, pre_tasks_info)
+                elif tool_node.code:
+                    # The code was generated together with the plan (fast path)
+                    code, invoke = tool_node.code, tool_node.invoke
+                elif self.direct_invoke and tool_name in relevant_code:
+                    # A stored tool made for this subtask, only its invocation is generated
+                    stored_tool = True
+                    code = relevant_code[tool_name]
+                    invoke = self.executor.generate_invoke(tool_name, description, code, pre_tasks_info)
                 else:
                     code, invoke = self.executor.generate_tool(tool_name, description, node_type, pre_tasks_info, relevant_code)
             except Exception as e:
                 print("api call failed:", str(e))
                 return
-            # Execute python tool class code
-            state = self.executor.execute_tool(code, invoke, node_type)
+            if api_args is not None:
+                code = json.dumps(api_args, ensure_ascii=False)
+                state = self.executor.execute_api(api_path, api_args)
+                if state.error:
+                    print("The API call failed, generating code to call it.")
+                    try:
+                        code = self.executor.api_tool(description, api_path, pre_tasks_info)
+                    except Exception as e:
+                        print("api call failed:", str(e))
+                        return
+                    state = self.executor.execute_tool(code, invoke, node_type)
+            else:
+                # Execute python tool class code
+                state = self.executor.execute_tool(code, invoke, node_type, tool_name if stored_tool else None)
+            if stored_tool and state.error:
+                print("The stored tool {} failed, generating its code again.".format(tool_name))
+                self.executor.rollback_working_dir(state)
+                try:
+                    code, invoke = self.executor.generate_tool(tool_name, description, node_type, pre_tasks_info, relevant_code)
+                except Exception as e:
+                    print("api call failed:", str(e))
+                    return
+                state = self.executor.execute_tool(code, invoke, node_type)
             result = state.result
             logging.info(state)
             output = {
@@ -207,8 +589,40 @@ class FridayAgent(BaseAgent):
             }
             logging.info(f"The subtask result is: {json.dumps(output)}")
 
-        return ExecutionState(state, node_type, description, code, result, relevant_code)
+        return ExecutionState(state, node_type, description, code, result, relevant_code, invoke)
     
+    def generate_api_args(self, description, api_path, pre_tasks_info):
+        """
+        Generates the arguments of an API called without generated code, if `native_api` is enabled.
+
+        Args:
+            description (str): The description of the sub-task.
+            api_path (str): The path of the API.
+            pre_tasks_info (dict): Information about the prerequisite tasks.
+
+        Returns:
+            dict: The validated arguments, or None if the API is to be called through generated code instead.
+        """
+        if not self.native_api or not self.executor.can_call_api(api_path):
+            return None
+        try:
+            return self.executor.generate_api_args(description, api_path, pre_tasks_info)
+        except Exception as e:
+            print("No valid arguments for {}, generating code to call it: {}".format(api_path, e))
+            return None
+
+    async def agenerate_api_args(self, description, api_path, pre_tasks_info):
+        """
+        Asynchronous variant of `generate_api_args`.
+        """
+        if not self.native_api or not self.executor.can_call_api(api_path):
+            return None
+        try:
+            return await self.executor.agenerate_api_args(description, api_path, pre_tasks_info)
+        except Exception as e:
+            print("No valid arguments for {}, generating code to call it: {}".format(api_path, e))
+            return None
+
     def judging(self, tool_name, state, code, description):
         """
         Evaluates the execution of a tool based on its execution state and the provided code and description, determining whether the tool's execution was successful or requires amendment.
@@ -231,12 +645,116 @@ class FridayAgent(BaseAgent):
         score = 0
         # Set up the generation format error handling mechanism
         try:
-            critique, status, score = self.executor.judge_tool(code, description, state, next_action)
+            critique, status, score = self.judge_execution(code, description, state, next_action)
         except Exception as e:
             print("api call failed:", str(e))
             return
         return JudgementResult(status, critique, score)
     
+    def batch_judging(self, tool_names, execution_states):
+        """
+        Evaluates the executions of several independent tools with a single judge call.
+
+        Args:
+            tool_names (list[str]): The names of the tools being judged.
+            execution_states (list[ExecutionState]): The execution states of the tools, in the same order.
+
+        Returns:
+            list[JudgementResult]: One judgement per tool. Executions rejected by the static check are judged without the LLM. If the batched call fails, the remaining entries are None so that those tools are judged one by one instead.
+        """
+        judgements = [self.static_check_judgement(execution_state.state) for execution_state in execution_states]
+        if self.budget.is_low():
+            return [judgement or self.rule_based_judgement(execution_state.state)
+                    for judgement, execution_state in zip(judgements, execution_states)]
+        judge_items = []
+        for tool_name, execution_state, judgement in zip(tool_names, execution_states, judgements):
+            if judgement is not None:
+                continue
+            state, node_type, description, code, result, relevant_code = execution_state.get_all_state()
+            judge_items.append({
+                "code": code,
+                "task_description": description,
+                "state": state,
+                "next_action": self.planner.tool_node[tool_name].next_action
+            })
+        if not judge_items:
+            return judgements
+        # Set up the generation format error handling mechanism
+        try:
+            verdicts = iter(self.executor.judge_tools(judge_items))
+        except Exception as e:
+            print("api call failed:", str(e))
+            return judgements
+        for index, judgement in enumerate(judgements):
+            if judgement is None:
+                critique, status, score = next(verdicts)
+                judgements[index] = JudgementResult(status, critique, score)
+        return judgements
+
+    def static_check_judgement(self, state):
+        """
+        Judges an execution that was rejected by the executor's static check, without calling the LLM.
+
+        Args:
+            state: The execution state returned by the executor.
+
+        Returns:
+            JudgementResult: An 'Amend' judgement if the code never ran because of a static check failure, otherwise None. The critique is left empty so that the repair focuses on the reported error.
+        """
+        if getattr(state, 'static_check_failed', False):
+            return JudgementResult('Amend', '', 0)
+        return None
+
+    def judge_execution(self, code, description, state, next_action):
+        """
+        Judges an execution with the LLM, or by its errors alone once the budget of the task is low.
+
+        Returns:
+            tuple: The critique, status and score of the judgement.
+        """
+        if self.budget.is_low():
+            judgement = self.rule_based_judgement(state)
+            return judgement.critique, judgement.status, judgement.score
+        return self.executor.judge_tool(code, description, state, next_action)
+
+    async def ajudge_execution(self, code, description, state, next_action):
+        """
+        Asynchronous variant of `judge_execution`.
+        """
+        if self.budget.is_low():
+            judgement = self.rule_based_judgement(state)
+            return judgement.critique, judgement.status, judgement.score
+        return await self.executor.ajudge_tool(code, description, state, next_action)
+
+    def rule_based_judgement(self, state):
+        """
+        Judges an execution without the LLM: it is complete if it ran without errors.
+
+        The score is 0, so tools judged this way are never stored in the tool repository.
+
+        Args:
+            state: The execution state returned by the executor.
+
+        Returns:
+            JudgementResult: A 'Complete' judgement for a clean execution, 'Amend' otherwise.
+        """
+        if state is None or state.error:
+            return JudgementResult('Amend', '', 0)
+        return JudgementResult('Complete', '', 0)
+
+    def repair_limit(self):
+        """
+        Returns the maximum number of LLM repairs of a subtask under the current budget.
+
+        Returns:
+            int: The configured maximum, 1 once the budget is low and 0 once it is exhausted.
+        """
+        if self.budget.is_exhausted():
+            return 0
+        if self.budget.is_low():
+            return min(1, self.executor.max_iter)
+        return self.executor.max_iter
+
     def replanning(self, tool_name, reasoning):
         """
         Initiates the replanning process for a task based on new insights or failures encountered during execution, aiming to adjust the plan to better achieve the task goals.
@@ -249,7 +767,10 @@ class FridayAgent(BaseAgent):
             list: An updated list of sub-tasks after the replanning process, intended for sequential execution to complete the task.
 
         This method identifies alternative or additional tools and their descriptions based on the provided reasoning, updating the task plan accordingly.
+        No replanning is done once the budget of the task is exhausted.
         """
+        if self.budget.is_exhausted():
+            return self.planner.sub_task_list
         relevant_tool_name = self.retriever.retrieve_tool_name(reasoning)
         relevant_tool_description_pair = self.retriever.retrieve_tool_description_pair(relevant_tool_name)
         # Set up the generation format error handling mechanism
@@ -260,7 +781,7 @@ class FridayAgent(BaseAgent):
             return
         return self.planner.sub_task_list
 
-    def repairing(self, tool_name, code, description, state, critique, status):
+    def repairing(self, tool_name, code, description, state, critique, status, invoke=''):
         """
         Attempts to repair the execution of a tool by amending its code based on the critique received and the current execution state, iterating until the code executes successfully or reaches the maximum iteration limit.
 
@@ -271,18 +792,43 @@ class FridayAgent(BaseAgent):
             state (ExecutionState): The current execution state of the tool, including results and error information.
             critique (str): Feedback on the tool's last execution attempt, identifying issues to be addressed.
             status (str): Three status types: 'Amend', 'Complete', and 'Replan'.
+            invoke (str, optional): The invocation of the tool, used to repair mechanical errors locally before asking the LLM.
 
         Returns:
             RepairingResult: An object encapsulating the result of the repair attempt, including whether the task has been completed successfully, the amended code, critique, execution score, and the execution result.
 
         The method iterates, amending the tool's code based on feedback until the code executes correctly or the maximum number of iterations is reached. It leverages the executor component for amending the code and re-evaluating its execution.
+        Mechanical errors are first repaired locally; if the locally fixed code runs cleanly, it only needs to be judged and the LLM repair is skipped.
         """
         tool_node = self.planner.tool_node[tool_name]
         next_action = tool_node.next_action
         pre_tasks_info = self.planner.get_pre_tasks_info(tool_name)
         trial_times = 0
         score = 0
-        while (trial_times < self.executor.max_iter and status == 'Amend'):
+        result = state.result if state else ''
+        fixed_tool = self.executor.auto_repair_tool(code, invoke, tool_node.node_type, state) if status == 'Amend' else None
+        if fixed_tool:
+            print("Trying a local fix before asking the LLM to repair the code.")
+            code, invoke = fixed_tool
+            self.executor.rollback_working_dir(state)
+            state = self.executor.execute_tool(code, invoke, tool_node.node_type)
+            result = state.result
+            logging.info(state)
+            if not state.error:
+                # Set up the generation format error handling mechanism
+                try:
+                    critique, status, score = self.judge_execution(code, description, state, next_action)
+                except Exception as e:
+                    print("api call failed:", str(e))
+                    return
+                if status == 'Replan':
+                    self.executor.rollback_working_dir(state)
+                if status in ('Complete', 'Replan'):
+                    return RepairingResult(status, code, critique, score, result)
+            else:
+                # The local fix got past the original error, the LLM repairs the remaining ones
+                critique = ''
+        while (trial_times < self.repair_limit() and status == 'Amend'):
             trial_times += 1
             print("current amend times: {}".format(trial_times))
             # Set up the generation format error handling mechanism
@@ -294,13 +840,14 @@ class FridayAgent(BaseAgent):
             critique = ''
             code = new_code
             # Run the current code and check for errors
+            self.executor.rollback_working_dir(state)
             state = self.executor.execute_tool(code, invoke, tool_node.node_type)
             result = state.result
             logging.info(state) 
-            if state.error == None:
+            if not state.error:
             # Set up the generation format error handling mechanism
                 try:
-                    critique, status, score = self.executor.judge_tool(code, description, state, next_action)
+                    critique, status, score = self.judge_execution(code, description, state, next_action)
                 except Exception as e:
                     print("api call failed:", str(e))
                     return
@@ -315,6 +862,274 @@ class FridayAgent(BaseAgent):
                     raise NotImplementedError
             else: # The code still needs to be corrected
                 status = 'Amend'
+        if status == 'Replan':
+            self.executor.rollback_working_dir(state)
+        return RepairingResult(status, code, critique, score, result)
+
+    async def aself_refining(self, tool_name, execution_state: ExecutionState, judgement=None):
+        """
+        Asynchronous variant of `self_refining`.
+
+        Args:
+            tool_name (str): The name of the tool being executed.
+            execution_state (ExecutionState): The current state of the tool's execution.
+            judgement (JudgementResult, optional): A judgement already obtained for this execution. If None, the execution is judged here.
+
+        Returns:
+            tuple: isTaskCompleted and isReplan, as returned by `self_refining`.
+        """
+        isTaskCompleted = False
+        isReplan = False
+        score = 0
+        state, node_type, description, code, result, relevant_code = execution_state.get_all_state()
+        invoke = execution_state.invoke
+        if node_type in ['Python', 'Shell', 'AppleScript', 'Map']:
+            if judgement is None:
+                judgement = self.static_check_judgement(state)
+            if judgement is None:
+                judgement = await self.ajudging(tool_name, state, code, description)
+            score = judgement.score
+            if judgement.status == 'Replan':
+                print("The current task requires replanning...")
+                self.executor.rollback_working_dir(state)
+                new_sub_task_list = await self.areplanning(tool_name, judgement.critique)
+                print("The new task list obtained after planning is: {}".format(new_sub_task_list))
+                isReplan = True
+            elif judgement.status == 'Amend':
+                repairing_result = await self.arepairing(tool_name, code, description, state, judgement.critique, judgement.status, invoke)
+                if repairing_result.status == 'Complete':
+                    isTaskCompleted = True
+                elif repairing_result.status == 'Replan':
+                    print("The current task requires replanning...")
+                    new_sub_task_list = await self.areplanning(tool_name, repairing_result.critique)
+                    print("The new task list obtained after planning is: {}".format(new_sub_task_list))
+                    isReplan = True
+                else:
+                    isTaskCompleted = False
+                score = repairing_result.score
+                result = repairing_result.result
+            else:
+                isTaskCompleted = True
+            if node_type == 'Python' and isTaskCompleted and score >= self.score:
+                await asyncio.to_thread(self.store_tool, tool_name, code)
+                print("{} has been stored in the tool repository.".format(tool_name))
+        else: 
+            isTaskCompleted = True
+        if isTaskCompleted:
+            self.inner_monologue.result = result
+            self.planner.update_tool(tool_name, result, relevant_code, True, node_type)
+        return isTaskCompleted, isReplan
+
+    def store_tool(self, tool_name, code):
+        """
+        Stores a tool in the tool repository, serialized with the other agents sharing the repository.
+        """
+        with self.tool_store_lock:
+            self.executor.store_tool(tool_name, code)
+
+    async def aplanning(self, task):
+        """
+        Asynchronous variant of `planning`. Tool retrieval runs in a worker thread, the decomposition is awaited.
+
+        Args:
+            task (object): The high-level task to be planned and executed.
+
+        Returns:
+            list: The sub-tasks of the plan, in execution order.
+        """
+        retrieve_tool_name = await asyncio.to_thread(self.retriever.retrieve_tool_name, task)
+        retrieve_tool_description_pair = self.retriever.retrieve_tool_description_pair(retrieve_tool_name)
+        # Set up the generation format error handling mechanism
+        try:
+            if self.fast_path:
+                await self.planner.adecompose_task_fast(task, retrieve_tool_description_pair)
+            else:
+                await self.planner.adecompose_task(task, retrieve_tool_description_pair)
+        except Exception as e:
+            print("api call failed:", str(e))
+            return
+        return self.planner.sub_task_list
+
+    async def aexecuting(self, tool_name, original_task):
+        """
+        Asynchronous variant of `executing`.
+
+        Args:
+            tool_name (str): The name of the tool associated with the sub-task.
+            original_task (object): The original high-level task that has been decomposed into sub-tasks.
+
+        Returns:
+            ExecutionState: The state of execution for the sub-task.
+        """
+        tool_node = self.planner.tool_node[tool_name]
+        description = tool_node.description
+        logging.info("The current subtask is: {subtask}".format(subtask=description))
+        code = ''
+        state = None
+        result = ''
+        relevant_code = {}
+        invoke = ''
+        # Whether a stored tool is run as it is, with only its invocation generated
+        stored_tool = False
+        # The arguments of an API called without generated code
+        api_args = None
+        node_type = tool_node.node_type
+        pre_tasks_info = self.planner.get_pre_tasks_info(tool_name)
+        if node_type == 'Python' and not tool_node.code:
+            # retrieve existing tool
+            retrieve_name = await asyncio.to_thread(self.retriever.retrieve_tool_name, description, 3)
+            relevant_code = self.retriever.retrieve_tool_code_pair(retrieve_name)
+        if node_type == 'QA':
+            question = original_task if self.planner.tool_num == 1 else description
+            result = await asyncio.to_thread(self.executor.question_and_answer_tool, pre_tasks_info, original_task, question)
+            print(result)
+            logging.info(result)
+        else:
+            # Set up the generation format error handling mechanism
+            try:
+                if node_type == 'API':
+                    api_path = self.executor.extract_API_Path(description)
+                    api_args = await self.agenerate_api_args(description, api_path, pre_tasks_info)
+                    if api_args is None:
+                        code = await asyncio.to_thread(self.executor.api_tool, description, api_path, pre_tasks_info)
+                elif tool_node.code:
+                    # The code was generated together with the plan (fast path)
+                    code, invoke = tool_node.code, tool_node.invoke
+                elif self.direct_invoke and tool_name in relevant_code:
+                    # A stored tool made for this subtask, only its invocation is generated
+                    stored_tool = True
+                    code = relevant_code[tool_name]
+                    invoke = await self.executor.agenerate_invoke(tool_name, description, code, pre_tasks_info)
+                else:
+                    code, invoke = await self.executor.agenerate_tool(tool_name, description, node_type, pre_tasks_info, relevant_code)
+            except Exception as e:
+                print("api call failed:", str(e))
+                return
+            if api_args is not None:
+                code = json.dumps(api_args, ensure_ascii=False)
+                state = await self.executor.aexecute_api(api_path, api_args)
+                if state.error:
+                    print("The API call failed, generating code to call it.")
+                    try:
+                        code = await asyncio.to_thread(self.executor.api_tool, description, api_path, pre_tasks_info)
+                    except Exception as e:
+                        print("api call failed:", str(e))
+                        return
+                    state = await self.executor.aexecute_tool(code, invoke, node_type)
+            else:
+                state = await self.executor.aexecute_tool(code, invoke, node_type, tool_name if stored_tool else None)
+            if stored_tool and state.error:
+                print("The stored tool {} failed, generating its code again.".format(tool_name))
+                self.executor.rollback_working_dir(state)
+                try:
+                    code, invoke = await self.executor.agenerate_tool(tool_name, description, node_type, pre_tasks_info, relevant_code)
+                except Exception as e:
+                    print("api call failed:", str(e))
+                    return
+                state = await self.executor.aexecute_tool(code, invoke, node_type)
+            result = state.result
+            logging.info(state)
+            output = {
+                "result": state.result,
+                "error": state.error
+            }
+            logging.info(f"The subtask result is: {json.dumps(output)}")
+
+        return ExecutionState(state, node_type, description, code, result, relevant_code, invoke)
+
+    async def ajudging(self, tool_name, state, code, description):
+        """
+        Asynchronous variant of `judging`.
+
+        Returns:
+            JudgementResult: The judgement on the tool's execution.
+        """
+        next_action = self.planner.tool_node[tool_name].next_action
+        # Set up the generation format error handling mechanism
+        try:
+            critique, status, score = await self.ajudge_execution(code, description, state, next_action)
+        except Exception as e:
+            print("api call failed:", str(e))
+            return
+        return JudgementResult(status, critique, score)
+
+    async def areplanning(self, tool_name, reasoning):
+        """
+        Asynchronous variant of `replanning`.
+
+        Returns:
+            list: The updated list of sub-tasks.
+        """
+        if self.budget.is_exhausted():
+            return self.planner.sub_task_list
+        relevant_tool_name = await asyncio.to_thread(self.retriever.retrieve_tool_name, reasoning)
+        relevant_tool_description_pair = self.retriever.retrieve_tool_description_pair(relevant_tool_name)
+        # Set up the generation format error handling mechanism
+        try:
+            await self.planner.areplan_task(reasoning, tool_name, relevant_tool_description_pair)
+        except Exception as e:
+            print("api call failed:", str(e))
+            return
+        return self.planner.sub_task_list
+
+    async def arepairing(self, tool_name, code, description, state, critique, status, invoke=''):
+        """
+        Asynchronous variant of `repairing`.
+
+        Returns:
+            RepairingResult: The result of the repair attempt.
+        """
+        tool_node = self.planner.tool_node[tool_name]
+        next_action = tool_node.next_action
+        pre_tasks_info = self.planner.get_pre_tasks_info(tool_name)
+        trial_times = 0
+        score = 0
+        result = state.result if state else ''
+        fixed_tool = self.executor.auto_repair_tool(code, invoke, tool_node.node_type, state) if status == 'Amend' else None
+        if fixed_tool:
+            print("Trying a local fix before asking the LLM to repair the code.")
+            code, invoke = fixed_tool
+            self.executor.rollback_working_dir(state)
+            state = await self.executor.aexecute_tool(code, invoke, tool_node.node_type)
+            result = state.result
+            logging.info(state)
+            if not state.error:
+                try:
+                    critique, status, score = await self.ajudge_execution(code, description, state, next_action)
+                except Exception as e:
+                    print("api call failed:", str(e))
+                    return
+                if status == 'Replan':
+                    self.executor.rollback_working_dir(state)
+                if status in ('Complete', 'Replan'):
+                    return RepairingResult(status, code, critique, score, result)
+            else:
+                critique = ''
+        while (trial_times < self.repair_limit() and status == 'Amend'):
+            trial_times += 1
+            print("current amend times: {}".format(trial_times))
+            try:
+                code, invoke = await self.executor.arepair_tool(code, description, tool_node.node_type, state, critique, pre_tasks_info)
+            except Exception as e:
+                print("api call failed:", str(e))
+                return
+            critique = ''
+            self.executor.rollback_working_dir(state)
+            state = await self.executor.aexecute_tool(code, invoke, tool_node.node_type)
+            result = state.result
+            logging.info(state)
+            if not state.error:
+                try:
+                    critique, status, score = await self.ajudge_execution(code, description, state, next_action)
+                except Exception as e:
+                    print("api call failed:", str(e))
+                    return
+                if status not in ('Complete', 'Amend', 'Replan'):
+                    raise NotImplementedError
+            else: # The code still needs to be corrected
+                status = 'Amend'
+        if status == 'Replan':
+            self.executor.rollback_working_dir(state)
         return RepairingResult(status, code, critique, score, result)
 
     def reset_inner_monologue(self):
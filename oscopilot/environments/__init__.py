@@ -2,7 +2,10 @@ from .subprocess_env import *
 from .py_jupyter_env import *
 from .py_simple_env import *
 from .bash_env import *
+from .shell_session import *
 from .applescript_env import *
 from .powershell_env import *
 from .powershell_env import *
-from .env import *
\ No newline at end of file
+from .env import *
+from .python_worker_pool import *
+from .kernel_pool import *
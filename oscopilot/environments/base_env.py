@@ -1,7 +1,32 @@
 import os
+import time
+import uuid
+import shutil
+import atexit
+import asyncio
+import hashlib
+import tempfile
 from oscopilot.utils.config import Config
+from oscopilot.utils.limits import ExecutionLimits
 from typing import Optional, Union, List
 from oscopilot.utils.schema import EnvState
+from oscopilot.utils.artifact_store import get_artifact_store
+
+
+# Directory of the agent's own files, in the temporary directory (see `BaseEnv.internal_dir`).
+# A directory of this name inside the working directory is never listed or part of a snapshot.
+INTERNAL_DIR = '.oscopilot'
+
+try:
+    import fcntl
+    # The Linux ioctl cloning a file into another, sharing data blocks on copy-on-write filesystems (btrfs, XFS).
+    FICLONE = 0x40049409 if hasattr(fcntl, 'ioctl') and os.uname().sysname == 'Linux' else None
+except ImportError:
+    fcntl = None
+    FICLONE = None
+
+# The devices on which cloning failed, where files are copied instead.
+_devices_without_reflink = set()
 
 
 class BaseEnv:
@@ -17,11 +42,12 @@ class BaseEnv:
         """
         Initializes the environments with default settings.
 
-        Sets up the working directory, applying a default timeout and preparing the
-        environments state. If the working directory does not exist, it is created.
+        Sets up the working directory, applying a default timeout and the configured execution
+        limits and preparing the environments state. If the working directory does not exist, it is created.
         """
         self._name: str = self.__class__.__name__
         self.timeout: int = 300
+        self.limits = ExecutionLimits.from_config()
         working_dir = Config.get_parameter('working_dir')
         if os.path.isabs(working_dir):
             self.working_dir = working_dir
@@ -31,6 +57,9 @@ class BaseEnv:
             os.makedirs(self.working_dir)
 
         self.env_state: Union[EnvState, None] = None
+        # The snapshot of the working directory at the last checkpoint, and the folder mirroring its contents
+        self.checkpoint_manifest = None
+        self.checkpoint_dir = None
 
     def step(self, code):
         """
@@ -41,6 +70,25 @@ class BaseEnv:
         """
         return {"type": "console", "format": "output", "content": code}
 
+    async def astep(self, code):
+        """
+        Asynchronous variant of `step`, yielding the same dictionaries in LMC format.
+
+        The default implementation runs `step` in a worker thread, one message at a time, so that the event
+        loop is not blocked while the code runs. Environments that can execute code natively with asyncio
+        override it.
+        """
+        messages = self.step(code)
+        if isinstance(messages, dict):
+            yield messages
+            return
+        while True:
+            # None is never a message, it marks the end of the messages
+            message = await asyncio.to_thread(next, messages, None)
+            if message is None:
+                return
+            yield message
+
     def stop(self):
         """
         Halts code execution, but does not terminate state.
@@ -53,12 +101,18 @@ class BaseEnv:
         """
         pass
 
+    async def aterminate(self):
+        """
+        Asynchronous variant of `terminate`, to be awaited in the event loop that ran `astep`.
+        """
+        await asyncio.to_thread(self.terminate)
+
     def list_working_dir(self):
         """
         Lists the contents of the working directory in a detailed format.
 
         Returns a string representation similar to the output of the 'ls' command in Linux,
-        including file/directory names, sizes, and types.
+        including file/directory names, sizes, and types. The internal directory is not listed.
 
         Returns:
             str: Detailed listings of the working directory's contents, or an error message if the directory does not exist.
@@ -69,7 +123,7 @@ class BaseEnv:
             return f"Directory '{directory}' does not exist."
 
         # List files and directories
-        files_and_dirs = os.listdir(directory)
+        files_and_dirs = [name for name in os.listdir(directory) if name != INTERNAL_DIR]
 
         # Create a list to store the details
         details = []
@@ -90,7 +144,173 @@ class BaseEnv:
             details.append(f"{name}\t {size} bytes\t {doc_type}")
 
         return "\n".join(details)
-        
+
+    def snapshot_working_dir(self, with_hash=None, max_entries=None):
+        """
+        Records the metadata of every file and folder under the working directory.
+
+        By default only `stat` is called, so a snapshot stays cheap on large directories. With hashing
+        enabled the content of every file is hashed as well, which also detects modifications that keep
+        the size and the modification time.
+
+        Args:
+            with_hash (bool, optional): Whether to hash file contents. Defaults to the `fs_snapshot_hash` parameter.
+            max_entries (int, optional): The maximum number of entries to record. Defaults to the
+                                         `fs_snapshot_max_entries` parameter.
+
+        Returns:
+            dict: A mapping from the relative path of each entry to its (size, mtime_ns, hash) tuple, folder
+                  paths ending with a separator. None if the directory holds more than `max_entries` entries.
+        """
+        if with_hash is None:
+            with_hash = bool(Config.get_parameter('fs_snapshot_hash'))
+        if max_entries is None:
+            max_entries = Config.get_parameter('fs_snapshot_max_entries') or 5000
+        snapshot = {}
+        pending = ['']
+        while pending:
+            relative_dir = pending.pop()
+            try:
+                entries = list(os.scandir(os.path.join(self.working_dir, relative_dir)))
+            except OSError:
+                continue
+            for entry in entries:
+                relative_path = os.path.join(relative_dir, entry.name)
+                if relative_path == INTERNAL_DIR:
+                    continue
+                if len(snapshot) >= max_entries:
+                    return None
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        # The metadata of a folder changes with its contents, only its existence is compared
+                        snapshot[relative_path + os.sep] = (0, 0, None)
+                        pending.append(relative_path)
+                    else:
+                        stat = entry.stat(follow_symlinks=False)
+                        digest = hash_file(entry.path) if with_hash and entry.is_file(follow_symlinks=False) else None
+                        snapshot[relative_path] = (stat.st_size, stat.st_mtime_ns, digest)
+                except OSError:
+                    continue
+        return snapshot
+
+    def working_dir_changes(self, before):
+        """
+        Describes how the working directory changed since a snapshot was taken.
+
+        Args:
+            before (dict): The snapshot returned by `snapshot_working_dir` before the changes.
+
+        Returns:
+            str: The created, modified and deleted entries, one per line. If the directory is too large to
+                 be snapshotted, the listing of `list_working_dir` is returned instead.
+        """
+        after = self.snapshot_working_dir()
+        if before is None or after is None:
+            return self.list_working_dir()
+        return format_fs_diff(diff_snapshots(before, after))
+
+    def internal_dir(self, name):
+        """
+        Returns a folder for the agent's own files about the working directory, kept outside of it.
+
+        Code executed in the working directory, e.g. code cleaning it up, can then neither see nor delete these files.
+
+        Args:
+            name (str): The name of the folder, e.g. 'snapshots'.
+
+        Returns:
+            str: The path of the folder in the temporary directory, keyed by the working directory.
+        """
+        key = hashlib.sha1(os.path.abspath(self.working_dir).encode('utf-8')).hexdigest()[:12]
+        return os.path.join(tempfile.gettempdir(), INTERNAL_DIR, key, name)
+
+    def checkpoint_working_dir(self):
+        """
+        Saves the contents of the working directory, so that `restore_working_dir` can return to them.
+
+        The contents are kept in a mirror folder in the snapshots folder of the internal directory. Files are
+        cloned where the filesystem supports reflinks and copied otherwise; only the entries that changed since
+        the previous checkpoint are updated, so a checkpoint costs O(changed files) after the first one.
+        Hard links are not used because code rewriting a file in place would change the saved copy too.
+
+        Returns:
+            bool: True if the checkpoint was saved, False if the working directory has more entries than the
+                  snapshot limit or holds more than `rollback_max_mb` megabytes of files.
+        """
+        snapshot = self.snapshot_working_dir(with_hash=False)
+        max_bytes = (Config.get_parameter('rollback_max_mb') or 512) * 1024 * 1024
+        if snapshot is None or sum(size for size, _, _ in snapshot.values()) > max_bytes:
+            self.checkpoint_manifest = None
+            return False
+        if self.checkpoint_dir is None:
+            self.checkpoint_dir = os.path.join(self.internal_dir('snapshots'), uuid.uuid4().hex[:12])
+            atexit.register(shutil.rmtree, self.checkpoint_dir, True)
+        diff = diff_snapshots(self.checkpoint_manifest or {}, snapshot)
+        if self.checkpoint_manifest is None:
+            shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        for path in sorted(diff['deleted'], reverse=True):
+            remove_entry(os.path.join(self.checkpoint_dir, path))
+        for path in diff['created'] + diff['modified']:
+            copy_entry(os.path.join(self.working_dir, path), os.path.join(self.checkpoint_dir, path))
+        self.checkpoint_manifest = snapshot
+        return True
+
+    def restore_working_dir(self):
+        """
+        Returns the working directory to its contents at the last checkpoint.
+
+        Only the entries that differ from the checkpoint are touched: entries created since are removed, and
+        modified or deleted ones are restored from the mirror folder.
+
+        Returns:
+            int: The number of entries removed or restored, or None if there is no checkpoint to restore or its
+                 mirror folder is gone.
+        """
+        if self.checkpoint_manifest is None:
+            return None
+        if not os.path.isdir(self.checkpoint_dir):
+            print("The checkpoint of the working directory is gone, it cannot be rolled back.")
+            self.checkpoint_manifest = None
+            return None
+        current = self.snapshot_working_dir(with_hash=False)
+        if current is None:
+            # Too many entries to compare, compare against an empty directory to restore every saved entry
+            current = {}
+        diff = diff_snapshots(self.checkpoint_manifest, current)
+        # Entries created since the checkpoint, deepest first so folders are empty when they are removed
+        for path in sorted(diff['created'], reverse=True):
+            remove_entry(os.path.join(self.working_dir, path))
+        for path in sorted(diff['deleted'] + diff['modified']):
+            copy_entry(os.path.join(self.checkpoint_dir, path), os.path.join(self.working_dir, path))
+        return len(diff['created']) + len(diff['deleted']) + len(diff['modified'])
+
+    def output_log_prefix(self):
+        """
+        Returns the path prefix of the log files for the full output of one execution, if output spilling is
+        enabled with the `spill_output` parameter.
+
+        Returns:
+            str: A new path prefix in the logs folder of the internal directory, or None.
+        """
+        if not Config.get_parameter('spill_output'):
+            return None
+        name = '{}-{}'.format(time.strftime('%Y%m%d-%H%M%S'), uuid.uuid4().hex[:8])
+        return os.path.join(self.internal_dir('logs'), name)
+
+    def artifact_store(self):
+        """
+        Returns the store of the large outputs of executions, if it is enabled with the `artifact_threshold`
+        parameter.
+
+        Returns:
+            ArtifactStore: The store in the artifacts folder of the internal directory, or None.
+        """
+        threshold = Config.get_parameter('artifact_threshold')
+        if not threshold:
+            return None
+        return get_artifact_store(self.internal_dir('artifacts'), threshold)
+
     def step(self, _command) -> EnvState:
         """
         Executes a command within the environments.
@@ -151,6 +371,118 @@ class BaseEnv:
         return self.__repr__()
 
 
+def hash_file(path, chunk_size=1 << 20):
+    """
+    Computes a short content hash of a file.
+
+    Args:
+        path (str): The path of the file.
+        chunk_size (int): The number of bytes read at a time.
+
+    Returns:
+        str: The hex digest of the file content, or None if the file cannot be read.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def diff_snapshots(before, after):
+    """
+    Compares two snapshots of the working directory.
+
+    Args:
+        before (dict): The snapshot taken before the changes.
+        after (dict): The snapshot taken after the changes.
+
+    Returns:
+        dict: The sorted relative paths of the 'created', 'modified' and 'deleted' entries.
+    """
+    return {
+        'created': sorted(path for path in after if path not in before),
+        'modified': sorted(path for path in after if path in before and after[path] != before[path]),
+        'deleted': sorted(path for path in before if path not in after),
+    }
+
+
+def format_fs_diff(diff, max_lines=50):
+    """
+    Formats a snapshot diff compactly for a prompt.
+
+    Args:
+        diff (dict): The diff returned by `diff_snapshots`.
+        max_lines (int): The maximum number of entries listed, the rest are only counted.
+
+    Returns:
+        str: One line per changed entry, such as 'created: report.txt', or a note that nothing changed.
+    """
+    lines = [f"{change}: {path}" for change in ('created', 'modified', 'deleted') for path in diff[change]]
+    if not lines:
+        return "No files or folders were created, modified or deleted."
+    if len(lines) > max_lines:
+        lines = lines[:max_lines] + [f"... and {len(lines) - max_lines} more changes"]
+    return "\n".join(lines)
+
+
+
+def copy_entry(source, destination):
+    """
+    Copies a file, symbolic link or (empty) folder of a snapshot, keeping its modification time.
+
+    An existing destination file is replaced rather than overwritten, so that a clone sharing its data is
+    never written through.
+    """
+    if source.endswith(os.sep):
+        os.makedirs(destination, exist_ok=True)
+        return
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    if os.path.lexists(destination):
+        remove_entry(destination)
+    if os.path.islink(source):
+        os.symlink(os.readlink(source), destination)
+        return
+    if not clone_file(source, destination):
+        shutil.copyfile(source, destination)
+    shutil.copystat(source, destination)
+
+
+def clone_file(source, destination):
+    """
+    Clones a file with a reflink, sharing its data blocks until either copy is modified.
+
+    Returns:
+        bool: True if the file was cloned, False if the filesystem does not support reflinks.
+    """
+    if FICLONE is None:
+        return False
+    device = os.stat(source).st_dev
+    if device in _devices_without_reflink:
+        return False
+    try:
+        with open(source, 'rb') as src, open(destination, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except OSError:
+        _devices_without_reflink.add(device)
+        return False
+
+
+def remove_entry(path):
+    """
+    Removes a file, symbolic link or folder tree, ignoring entries that are already gone.
+    """
+    path = path.rstrip(os.sep)
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
 if __name__ == '__main__':
     env = BaseEnv()
     env.env_state = EnvState()
@@ -38,6 +38,8 @@ class Shell(SubprocessEnv):
         else:
             # On Unix-like systems, use the default shell or bash
             self.start_cmd = [os.environ.get("SHELL", "bash")]
+            # The end marker is echoed to stderr as well, so the step ends once both streams are drained
+            self.end_marker_streams = 2
 
     def preprocess_code(self, code):
         """
@@ -49,7 +51,7 @@ class Shell(SubprocessEnv):
         Returns:
             str: The preprocessed shell script code.
         """        
-        return preprocess_shell(code)
+        return preprocess_shell(code, stderr_marker=self.end_marker_streams == 2)
 
     def line_postprocessor(self, line):
         """
@@ -90,7 +92,7 @@ class Shell(SubprocessEnv):
         return "##end_of_execution##" in line
 
 
-def preprocess_shell(code):
+def preprocess_shell(code, stderr_marker=False):
     """
     Preprocesses the shell script code before execution.
 
@@ -98,6 +100,7 @@ def preprocess_shell(code):
 
     Args:
         code (str): The shell script code to preprocess.
+        stderr_marker (bool): Whether the end of execution marker is echoed to stderr too.
 
     Returns:
         str: The preprocessed shell script code.
@@ -110,6 +113,8 @@ def preprocess_shell(code):
 
     # Add end command (we'll be listening for this so we know when it ends)
     code += '\necho "##end_of_execution##"'
+    if stderr_marker:
+        code += '\necho "##end_of_execution##" >&2'
 
     return code
 
@@ -4,11 +4,23 @@ from oscopilot.environments import BaseEnv
 from oscopilot.environments import AppleScript
 from oscopilot.environments import PythonJupyterEnv
 from oscopilot.environments import Shell
+from oscopilot.environments import ShellSession
 from oscopilot.environments import PowerShell
+from oscopilot.environments.kernel_pool import KernelPool
 from oscopilot.utils.schema import EnvState
+from oscopilot.utils.config import Config
+from oscopilot.utils.limits import LIMIT_ERROR_PREFIX
+from oscopilot.utils.output_capture import OutputCapture
+import base64
+import binascii
 import subprocess
 import platform
 import platform
+import asyncio
+import atexit
+import contextlib
+import os
+import threading
 
 # Should this be renamed to OS or System?
 
@@ -72,6 +84,14 @@ class Env(BaseEnv):
             self.languages.append(PowerShell)
             
         self._active_languages = {}
+        # With the shell_session setting, Shell steps run one after another in one bash session
+        self.use_shell_session = bool(Config.get_parameter('shell_session')) and os.name == 'posix'
+        self.shell_session_lock = threading.Lock()
+        # With the kernel_pool_size setting, Python steps reuse running Jupyter kernels
+        self.kernel_pool = None
+        if Config.get_parameter('kernel_pool_size'):
+            self.kernel_pool = KernelPool(PythonJupyterEnv, Config.get_parameter('kernel_pool_size'),
+                                          bool(Config.get_parameter('kernel_reset')))
 
     def get_language(self, language):
         """
@@ -91,32 +111,119 @@ class Env(BaseEnv):
                 return lang
         return None
 
-    def step(self, language, code, stream=False, display=False):
+    def get_shell_session(self):
+        """
+        Returns the bash session shared by the Shell steps of the environment, creating it on first use.
+        """
+        with self.shell_session_lock:
+            if "Shell" not in self._active_languages:
+                self._active_languages["Shell"] = ShellSession()
+                atexit.register(self._active_languages["Shell"].close)
+            return self._active_languages["Shell"]
+
+    def store_image(self, store, message):
+        """
+        Stores an image output message in the artifact store and returns the reference to the image.
+
+        Args:
+            store (ArtifactStore): The artifact store.
+            message (dict): The LMC message, with base64 content and a format such as 'base64.png'.
+
+        Returns:
+            str: The reference, or the content as it is if it is not valid base64.
+        """
+        try:
+            data = base64.b64decode(message['content'], validate=True)
+        except (binascii.Error, ValueError, TypeError):
+            return message['content']
+        media_type = 'image/' + message['format'].split('.')[-1] if '.' in message['format'] else 'image'
+        return store.reference(store.put(data), len(data), media_type)
+
+    def release_kernel(self, kernel_key):
+        """
+        Returns the kernel reserved for an affinity key to the kernel pool, e.g. at the end of a task.
+        """
+        if self.kernel_pool is not None:
+            self.kernel_pool.release(kernel_key)
+
+    def record_output(self, state, output, store, output_line_dic):
+        """
+        Adds an output message of a language environment to the state of a step.
+
+        Args:
+            state (EnvState): The state of the step, whose error collects tracebacks and limit errors.
+            output (OutputCapture): The capture of the rest of the output.
+            store (ArtifactStore): The artifact store images are written to, or None.
+            output_line_dic (dict): The output message in LMC format.
+        """
+        if output_line_dic['format'] == 'active_line' or output_line_dic['content'] in ['', '\n']:
+            return
+        content = output_line_dic['content']
+        if output_line_dic.get('type') == 'image' and store is not None:
+            # Keep the image out of the output, only its reference is part of the result
+            content = self.store_image(store, output_line_dic) + '\n'
+        if 'Traceback' in content or content.startswith(LIMIT_ERROR_PREFIX):
+            state.error = (state.error or '') + content
+        else:
+            output.write(content.encode())
+
+    def finish_state(self, state, output):
+        """
+        Completes the state of a step with its output and the contents of the working directory.
+        """
+        state.result = output.getvalue()
+        state.pwd = self.working_dir
+        state.ls = subprocess.run(['ls'], cwd=self.working_dir, capture_output=True, text=True).stdout
+
+    def step(self, language, code, stream=False, display=False, kernel_key=None):
         """
         Executes a step of code in the specified language.
 
+        Python steps run on a new kernel, shut down afterwards, or on a kernel of the kernel pool if it is
+        enabled.
+
         Args:
             language (str): The name or alias of the language to execute the code in.
             code (str): The code to execute.
             stream (bool): Whether to stream the output as it becomes available.
             display (bool): Whether to display the output.
+            kernel_key: The affinity key of a pooled kernel, so that steps with the same key run on the same
+                        kernel and share its state, or None for no affinity.
 
         Returns:
             EnvState: The state after executing the code.
         """        
         # 不用流式的话很简单，就是调一下lang的step就行了
         state = EnvState(command=code)
-        lang = self.get_language(language)()  # 输入planner的节点类型即可
-        for output_line_dic in lang.step(code):
-            if output_line_dic['format'] == 'active_line' or output_line_dic['content'] in ['', '\n']:
-                continue
-            content = output_line_dic['content']
-            if 'Traceback' in content:
-                state.error = (state.error or '') + content
-            else:
-                state.result += content
-        if lang.name == 'Python':
-            lang.terminate()
+        # Bounded capture of the output, instead of building the whole result string
+        log_prefix = self.output_log_prefix()
+        output = OutputCapture(self.limits.max_output_bytes, None if log_prefix is None else log_prefix + '.stdout.log')
+        store = self.artifact_store()
+        lang = self.get_language(language)  # 输入planner的节点类型即可
+        pool = self.kernel_pool if lang is PythonJupyterEnv else None
+        if lang is Shell and self.use_shell_session:
+            lang = self.get_shell_session()
+            lock = self.shell_session_lock
+        elif pool is not None:
+            lang = pool.checkout(kernel_key)
+            lock = contextlib.nullcontext()
+        else:
+            lang = lang()
+            lock = contextlib.nullcontext()
+        # Whether the step was stopped by the execution limits, leaving a pooled kernel in an unknown state
+        interrupted = True
+        try:
+            with lock:
+                for output_line_dic in lang.step(code):
+                    self.record_output(state, output, store, output_line_dic)
+            interrupted = bool(state.error) and LIMIT_ERROR_PREFIX in state.error
+        finally:
+            if pool is not None:
+                pool.checkin(lang, kernel_key, discard=interrupted)
+            elif lang.name == 'Python':
+                lang.terminate()
+        self.finish_state(state, output)
+        return state
         # for output_line_dic in lang.step(code):
         #     if output_line_dic['format'] == 'active_line':
         #         continue
@@ -126,9 +233,6 @@ class Env(BaseEnv):
         #             state.error = (state.error or '') + content
         #         else:
         #             state.result += content
-        state.pwd = self.working_dir
-        state.ls = subprocess.run(['ls'], cwd=self.working_dir, capture_output=True, text=True).stdout
-        return state
         
         # if (
         #     language == "python"
@@ -164,6 +268,50 @@ class Env(BaseEnv):
             # If stream == True, replace this with _streaming_run.
             return self._streaming_run(language, code, display=display)
 
+    async def astep(self, language, code, stream=False, display=False, kernel_key=None):
+        """
+        Asynchronous variant of `step`, returning the state after executing the code.
+
+        The code runs through the `astep` of the language environment on the event loop when the language
+        has a native one, such as Python on a Jupyter kernel and Shell. Kernels are started, checked out and
+        shut down in worker threads. Steps of the shell session and of the other languages run `step` in a
+        worker thread.
+
+        Args:
+            language (str): The name or alias of the language to execute the code in.
+            code (str): The code to execute.
+            stream (bool): Whether to stream the output as it becomes available.
+            display (bool): Whether to display the output.
+            kernel_key: The affinity key of a pooled kernel, see `step`.
+
+        Returns:
+            EnvState: The state after executing the code.
+        """
+        lang_class = self.get_language(language)
+        if (lang_class is Shell and self.use_shell_session) or lang_class.astep is BaseEnv.astep:
+            return await asyncio.to_thread(self.step, language, code, stream, display, kernel_key)
+        state = EnvState(command=code)
+        log_prefix = self.output_log_prefix()
+        output = OutputCapture(self.limits.max_output_bytes, None if log_prefix is None else log_prefix + '.stdout.log')
+        store = self.artifact_store()
+        pool = self.kernel_pool if lang_class is PythonJupyterEnv else None
+        if pool is not None:
+            lang = await asyncio.to_thread(pool.checkout, kernel_key)
+        else:
+            lang = await asyncio.to_thread(lang_class)
+        interrupted = True
+        try:
+            async for output_line_dic in lang.astep(code):
+                self.record_output(state, output, store, output_line_dic)
+            interrupted = bool(state.error) and LIMIT_ERROR_PREFIX in state.error
+        finally:
+            if pool is not None:
+                await asyncio.to_thread(pool.checkin, lang, kernel_key, interrupted)
+            else:
+                await lang.aterminate()
+        self.finish_state(state, output)
+        return state
+
     def _streaming_run(self, language, code, display=False):
         """
         Executes code in the specified language and streams the output.
@@ -0,0 +1,174 @@
+import atexit
+import threading
+
+
+class KernelPool:
+    """
+    A pool of running Python kernels, checked out for a step of code and checked in afterwards.
+
+    Starting a Jupyter kernel takes one to three seconds, more than most steps take to run. The pool keeps up
+    to `size` idle kernels and hands one out per step, starting a new kernel only when none is idle. A kernel
+    checked out with an affinity key stays reserved for that key until it is released, so the steps of one task
+    share their variables and imports. Otherwise, with `reset` enabled, the namespace of a kernel is cleared
+    with `%reset -f` before the kernel is reused, so steps do not see each other's variables; the modules the
+    kernel imported stay loaded. A kernel that died, or whose step was interrupted, is shut down instead of
+    being reused.
+
+    Kernels can be started ahead of time in the background with `prewarm`, e.g. while the task is being planned;
+    a checkout waits for a kernel that is starting rather than starting another one.
+
+    Attributes:
+        factory (callable): Creates a kernel environment, such as `PythonJupyterEnv`.
+        size (int): The maximum number of idle kernels kept.
+        reset (bool): Whether the namespace of a kernel is cleared before it is reused by another step.
+        warm_hits (int): The number of checkouts served by a running kernel.
+        cold_starts (int): The number of checkouts that had to start a kernel.
+    """
+
+    def __init__(self, factory, size, reset=False):
+        self.factory = factory
+        self.size = size
+        self.reset = reset
+        self.idle_kernels = []
+        # The kernels reserved for an affinity key
+        self.reserved = {}
+        # The number of kernels being started by `prewarm`
+        self.starting = 0
+        self.warm_hits = 0
+        self.cold_starts = 0
+        self.lock = threading.Lock()
+        self.kernel_started = threading.Condition(self.lock)
+        atexit.register(self.close)
+
+    def prewarm(self, count=None):
+        """
+        Starts kernels in the background until `count` kernels are idle or starting, without waiting for them.
+
+        Args:
+            count (int): The number of kernels to have ready, at most `size`, or None for `size`.
+
+        Returns:
+            int: The number of kernels started.
+        """
+        with self.lock:
+            target = self.size if count is None else min(count, self.size)
+            missing = max(target - len(self.idle_kernels) - self.starting, 0)
+            self.starting += missing
+        for _ in range(missing):
+            threading.Thread(target=self.start_kernel, daemon=True).start()
+        return missing
+
+    def start_kernel(self):
+        """
+        Starts a kernel for `prewarm` and adds it to the idle kernels.
+        """
+        try:
+            kernel = self.factory()
+        except Exception as e:
+            print("Could not prewarm a kernel: {}".format(e))
+            kernel = None
+        with self.lock:
+            self.starting -= 1
+            if kernel is not None:
+                self.idle_kernels.append(kernel)
+            self.kernel_started.notify_all()
+
+    def checkout(self, key=None):
+        """
+        Returns a running kernel for a step: the kernel reserved for the key, an idle kernel or a new one.
+
+        Args:
+            key: The affinity key, such as the identity of a task, or None for no affinity.
+
+        Returns:
+            The kernel environment, to be returned with `checkin`.
+        """
+        with self.lock:
+            kernel = self.reserved.pop(key, None) if key is not None else None
+            if kernel is None:
+                # A kernel being prewarmed is ready sooner than a new one
+                while not self.idle_kernels and self.starting:
+                    self.kernel_started.wait()
+                if self.idle_kernels:
+                    kernel = self.idle_kernels.pop()
+        if kernel is not None and not kernel.is_alive():
+            kernel.terminate()
+            kernel = None
+        with self.lock:
+            if kernel is None:
+                self.cold_starts += 1
+            else:
+                self.warm_hits += 1
+        if kernel is None:
+            kernel = self.factory()
+        return kernel
+
+    def metrics(self):
+        """
+        Returns the number of checkouts served by a running kernel and of those that started one.
+        """
+        return {"warm_hits": self.warm_hits, "cold_starts": self.cold_starts}
+
+    def checkin(self, kernel, key=None, discard=False):
+        """
+        Returns a kernel after a step.
+
+        Args:
+            kernel: The kernel environment returned by `checkout`.
+            key: The affinity key the kernel was checked out with. The kernel stays reserved for it.
+            discard (bool): Whether the kernel must not be reused, e.g. because its step was interrupted.
+        """
+        if discard or not kernel.is_alive():
+            kernel.terminate()
+            return
+        if key is not None:
+            with self.lock:
+                previous = self.reserved.get(key)
+                self.reserved[key] = kernel
+            if previous is not None and previous is not kernel:
+                self.put_idle(previous)
+            return
+        self.put_idle(kernel)
+
+    def release(self, key):
+        """
+        Ends the affinity of a key, returning its kernel to the idle kernels.
+        """
+        with self.lock:
+            kernel = self.reserved.pop(key, None)
+        if kernel is not None:
+            if kernel.is_alive():
+                self.put_idle(kernel)
+            else:
+                kernel.terminate()
+
+    def put_idle(self, kernel):
+        """
+        Adds a kernel to the idle kernels, cleared first if `reset` is enabled, or shuts it down if the pool is full.
+        """
+        if self.reset:
+            try:
+                kernel.reset()
+            except Exception as e:
+                print("Could not reset a pooled kernel: {}".format(e))
+                kernel.terminate()
+                return
+        with self.lock:
+            if len(self.idle_kernels) < self.size:
+                self.idle_kernels.append(kernel)
+                return
+        kernel.terminate()
+
+    def close(self):
+        """
+        Shuts down the idle and reserved kernels of the pool.
+        """
+        with self.lock:
+            kernels = self.idle_kernels + list(self.reserved.values())
+            self.idle_kernels = []
+            self.reserved = {}
+        for kernel in kernels:
+            try:
+                kernel.terminate()
+            except Exception:
+                pass
@@ -1,6 +1,7 @@
 # This code is based on Open Interpreter. Original source: https://github.com/OpenInterpreter/open-interpreter
 
 import ast
+import asyncio
 import os
 import sys
 import queue
@@ -11,9 +12,16 @@ import traceback
 import logging
 
 from jupyter_client import KernelManager
+from jupyter_client.asynchronous import AsyncKernelClient
 from oscopilot.environments.base_env import BaseEnv
 
 
+# Seconds a new kernel may take to answer its first request
+KERNEL_READY_TIMEOUT = 60
+# Seconds the iopub listener blocks for a message before checking that the step was not stopped and that the
+# kernel is alive. Messages are handled as soon as they arrive, this only bounds how long a stop takes.
+IOPUB_WAIT_TIMEOUT = 1
+
 # turn off colors in "terminal"
 # os.environ["ANSI_COLORS_DISABLED"] = "1"
 
@@ -53,13 +61,19 @@ class PythonJupyterEnv(BaseEnv):
         
         # Ensure only one KernelManager instance is configured and started
         self.km = KernelManager(kernel_name='python3', kernel_cmd=[python_executable, '-m', 'ipykernel_launcher', '-f', '{connection_file}'])
-        self.km.start_kernel(env=os.environ.copy())
+        kernel_kwargs = {}
+        if self.limits.preexec_fn() is not None:
+            # Apply the resource limits to the kernel process, which runs all the code of this environment
+            kernel_kwargs['preexec_fn'] = self.limits.preexec_fn()
+        self.km.start_kernel(env=os.environ.copy(), **kernel_kwargs)
+        # Where prlimit is available, the limits are applied to the started kernel process instead
+        self.limits.limit_process(getattr(self.km.provisioner, 'pid', None))
+        self.start_dir = os.getcwd()
         # self.km.start_kernel()
         self.kc = self.km.client()
         self.kc.start_channels()
-        while not self.kc.is_alive():
-            time.sleep(0.1)
-        time.sleep(0.5)
+        # Returns as soon as the kernel answers a kernel_info request, raises RuntimeError if it dies or times out
+        self.kc.wait_for_ready(timeout=KERNEL_READY_TIMEOUT)
         '''
         ipkernel_logger = logging.getLogger('IPKernelApp')
         # Create a filter using a lambda function
@@ -89,6 +103,9 @@ class PythonJupyterEnv(BaseEnv):
         '''
         self.listener_thread = None
         self.finish_flag = False
+        # The client of `astep`, whose channels belong to the event loop it was created in
+        self.async_kc = None
+        self.async_loop = None
 
         # DISABLED because sometimes this bypasses sending it up to us for some reason!
         # Give it our same matplotlib backend
@@ -118,8 +135,24 @@ class PythonJupyterEnv(BaseEnv):
         Terminates the IPython kernel and stops its channels.
         """
         self.kc.stop_channels()
+        if self.async_kc is not None:
+            self.async_kc.stop_channels()
         self.km.shutdown_kernel()
 
+    def is_alive(self):
+        """
+        Returns whether the kernel process is still running.
+        """
+        return self.km.is_alive()
+
+    def reset(self):
+        """
+        Clears the namespace of the kernel with `%reset -f` and returns to the directory the kernel started in,
+        so that the kernel can run unrelated code. Imported modules stay loaded.
+        """
+        for _ in self.step("%reset -f\n__import__('os').chdir({!r})".format(self.start_dir)):
+            pass
+
     def step(self, code):
         """
         Executes a step of Python code.
@@ -164,6 +197,75 @@ class PythonJupyterEnv(BaseEnv):
             content = traceback.format_exc()
             yield {"type": "console", "format": "output", "content": content}
 
+    async def astep(self, code):
+        """
+        Executes a step of Python code without a listener thread, yielding the same output messages as `step`.
+
+        The IOPub messages of the execution are awaited with the asynchronous client of `jupyter_client`, so
+        one event loop can run the steps of many kernels at once. If the code is still running when the
+        timeout of the execution limits expires, the kernel is interrupted and an execution limit error is
+        yielded as the last message.
+
+        Args:
+            code (str): The Python code to execute.
+
+        Yields:
+            dict: Output messages generated during execution.
+        """
+        self.finish_flag = False
+        try:
+            try:
+                preprocessed_code = self.preprocess_code(code)
+            except:
+                preprocessed_code = code
+            kc = self.get_async_client()
+            msg_id = kc.execute(preprocessed_code)
+            deadline = time.monotonic() + self.limits.timeout if self.limits.timeout else None
+            while True:
+                timeout = IOPUB_WAIT_TIMEOUT
+                if deadline is not None:
+                    timeout = min(timeout, max(deadline - time.monotonic(), 0))
+                try:
+                    msg = await kc.get_iopub_msg(timeout=timeout)
+                except queue.Empty:
+                    if deadline is not None and time.monotonic() >= deadline and not self.finish_flag:
+                        self.stop()
+                        yield {"type": "console", "format": "output", "content": self.limits.timeout_error()}
+                        return
+                    if self.finish_flag:
+                        # Stopped with `stop`
+                        return
+                    if not self.km.is_alive():
+                        yield {"type": "console", "format": "output", "content": "The kernel died while running the code."}
+                        return
+                    continue
+                if msg["parent_header"].get("msg_id") != msg_id:
+                    # Left over from an earlier, interrupted execution
+                    continue
+                if msg["header"]["msg_type"] == "status" and msg["content"]["execution_state"] == "idle":
+                    self.finish_flag = True
+                    return
+                for message in self.iopub_message_to_lmc(msg):
+                    yield message
+        except (GeneratorExit, asyncio.CancelledError):
+            raise
+        except:
+            content = traceback.format_exc()
+            yield {"type": "console", "format": "output", "content": content}
+
+    def get_async_client(self):
+        """
+        Returns the asynchronous client of the kernel for the running event loop, creating it on first use.
+        """
+        loop = asyncio.get_running_loop()
+        if self.async_kc is None or self.async_loop is not loop:
+            if self.async_kc is not None:
+                self.async_kc.stop_channels()
+            self.async_kc = AsyncKernelClient(**self.km.get_connection_info(session=True))
+            self.async_kc.start_channels()
+            self.async_loop = loop
+        return self.async_kc
+
     def _execute_code(self, code, message_queue):
         """
         Executes Python code using the IPython kernel and captures the output messages.
@@ -172,20 +274,36 @@ class PythonJupyterEnv(BaseEnv):
             code (str): The Python code to execute.
             message_queue (queue.Queue): The message queue for storing output messages.
         """        
-        def iopub_message_listener():
+        def iopub_message_listener(msg_id):
             '''
             The main function of this function is to monitor the messages on the IOPub message channel of the IPython kernel and 
             process them accordingly according to the type of the message. The IOPub message channel is a channel in the Jupyter/IPython 
             system used to broadcast execution results, logs, errors, status updates and other information.            
+
+            The listener blocks until a message arrives and puts None in the message queue when it returns.
             '''
+            try:
+                listen(msg_id)
+            finally:
+                message_queue.put(None)
+
+        def listen(msg_id):
             while True:
                 # If self.finish_flag = True, and we didn't set it (we do below), we need to stop. That's our "stop"
                 if self.finish_flag == True:
-                    self.km.interrupt_kernel()
                     return
                 try:
-                    msg = self.kc.iopub_channel.get_msg(timeout=0.05)
+                    msg = self.kc.iopub_channel.get_msg(timeout=IOPUB_WAIT_TIMEOUT)
                 except queue.Empty:
+                    if not self.km.is_alive():
+                        message_queue.put(
+                            {"type": "console", "format": "output", "content": "The kernel died while running the code."}
+                        )
+                        return
+                    continue
+
+                if msg["parent_header"].get("msg_id") != msg_id:
+                    # Left over from an earlier, interrupted execution
                     continue
 
                 if (
@@ -197,81 +315,58 @@ class PythonJupyterEnv(BaseEnv):
                     self.finish_flag = True
                     return
 
-                content = msg["content"]
-
-                if msg["msg_type"] == "stream":
-                    line, active_line = self.detect_active_line(content["text"])
-                    if active_line:
-                        message_queue.put(
-                            {
-                                "type": "console",
-                                "format": "active_line",
-                                "content": active_line,
-                            }
-                        )
-                    message_queue.put(
-                        {"type": "console", "format": "output", "content": line}
-                    )
-                elif msg["msg_type"] == "error":
-                    content = "\n".join(content["traceback"])
-                    # Remove color codes
-                    ansi_escape = re.compile(r"\x1B\[[0-?]*[ -/]*[@-~]")
-                    content = ansi_escape.sub("", content)
-                    message_queue.put(
-                        {
-                            "type": "console",
-                            "format": "output",
-                            "content": content,
-                        }
-                    )
-                elif msg["msg_type"] in ["display_data", "execute_result"]:
-                    data = content["data"]
-                    if "image/png" in data:
-                        message_queue.put(
-                            {
-                                "type": "image",
-                                "format": "base64.png",
-                                "content": data["image/png"],
-                            }
-                        )
-                    elif "image/jpeg" in data:
-                        message_queue.put(
-                            {
-                                "type": "image",
-                                "format": "base64.jpeg",
-                                "content": data["image/jpeg"],
-                            }
-                        )
-                    elif "text/html" in data:
-                        message_queue.put(
-                            {
-                                "type": "code",
-                                "format": "html",
-                                "content": data["text/html"],
-                            }
-                        )
-                    elif "text/plain" in data:
-                        message_queue.put(
-                            {
-                                "type": "console",
-                                "format": "output",
-                                "content": data["text/plain"],
-                            }
-                        )
-                    elif "application/javascript" in data:
-                        message_queue.put(
-                            {
-                                "type": "code",
-                                "format": "javascript",
-                                "content": data["application/javascript"],
-                            }
-                        )
+                for message in self.iopub_message_to_lmc(msg):
+                    message_queue.put(message)
 
-        self.listener_thread = threading.Thread(target=iopub_message_listener)
-        # self.listener_thread.daemon = True
+        # The messages of the execution wait in the channel until the listener reads them
+        msg_id = self.kc.execute(code)
+        self.listener_thread = threading.Thread(target=iopub_message_listener, args=(msg_id,), daemon=True)
         self.listener_thread.start()
 
-        self.kc.execute(code)
+    def iopub_message_to_lmc(self, msg):
+        """
+        Turns a message of the IOPub channel of the kernel into output messages in LMC format.
+
+        Args:
+            msg (dict): The Jupyter message.
+
+        Returns:
+            list[dict]: The output messages, empty for messages without output.
+        """
+        content = msg["content"]
+
+        if msg["msg_type"] == "stream":
+            line, active_line = self.detect_active_line(content["text"])
+            outputs = []
+            if active_line:
+                outputs.append(
+                    {
+                        "type": "console",
+                        "format": "active_line",
+                        "content": active_line,
+                    }
+                )
+            outputs.append({"type": "console", "format": "output", "content": line})
+            return outputs
+        if msg["msg_type"] == "error":
+            content = "\n".join(content["traceback"])
+            # Remove color codes
+            ansi_escape = re.compile(r"\x1B\[[0-?]*[ -/]*[@-~]")
+            content = ansi_escape.sub("", content)
+            return [{"type": "console", "format": "output", "content": content}]
+        if msg["msg_type"] in ["display_data", "execute_result"]:
+            data = content["data"]
+            if "image/png" in data:
+                return [{"type": "image", "format": "base64.png", "content": data["image/png"]}]
+            if "image/jpeg" in data:
+                return [{"type": "image", "format": "base64.jpeg", "content": data["image/jpeg"]}]
+            if "text/html" in data:
+                return [{"type": "code", "format": "html", "content": data["text/html"]}]
+            if "text/plain" in data:
+                return [{"type": "console", "format": "output", "content": data["text/plain"]}]
+            if "application/javascript" in data:
+                return [{"type": "code", "format": "javascript", "content": data["application/javascript"]}]
+        return []
 
     def detect_active_line(self, line):
         """
@@ -297,27 +392,36 @@ class PythonJupyterEnv(BaseEnv):
         """
         Captures output messages from the message queue.
 
+        Every message is yielded as soon as the listener puts it in the queue, and the capture ends when the
+        listener puts None after the kernel became idle. If the code is still running when the timeout of the
+        execution limits expires, the kernel is interrupted and an execution limit error is yielded as the
+        last message.
+
         Args:
             message_queue (queue.Queue): The message queue.
 
         Yields:
             dict: Output messages.
         """        
+        deadline = time.monotonic() + self.limits.timeout if self.limits.timeout else None
         while True:
-            if self.listener_thread:
-                try:
-                    output = message_queue.get(timeout=0.1)
-                    yield output
-                except queue.Empty:
-                    if self.finish_flag:
-                        break
-            time.sleep(0.1)
+            try:
+                output = message_queue.get(timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                self.stop()
+                yield {"type": "console", "format": "output", "content": self.limits.timeout_error()}
+                break
+            if output is None:
+                break
+            yield output
 
     def stop(self):
         """
-        Stops the execution of code by setting the finish flag.
+        Stops the execution of code by setting the finish flag and interrupting the kernel.
         """        
-        self.finish_flag = True
+        if not self.finish_flag:
+            self.finish_flag = True
+            self.km.interrupt_kernel()
 
     def preprocess_code(self, code):
         """
@@ -0,0 +1,188 @@
+"""
+The worker process of `PythonWorkerPool`.
+
+The worker is started with the names of the modules to pre-import as arguments, then reads one JSON request
+per line from stdin and writes one JSON response per line to stdout. Each request runs a piece of code in a
+fresh namespace, with file descriptors 1 and 2 redirected to the output files named in the request, so that
+the output of the code and of any subprocess it starts is captured and never mixes with the protocol. The
+pool reads these files through a bounded capture and deletes them.
+
+This script is run directly by path and must not import anything from `oscopilot`.
+"""
+import builtins
+import json
+import os
+import sys
+import traceback
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def main():
+    for module in sys.argv[1:]:
+        try:
+            __import__(module)
+        except Exception:
+            pass
+
+    # Keep private copies of the protocol pipes, so the code being run cannot read from or write into them.
+    protocol_in = os.fdopen(os.dup(0), 'r', encoding='utf-8')
+    protocol_out = os.fdopen(os.dup(1), 'w', encoding='utf-8')
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+
+    send(protocol_out, {'ready': True, 'rss': rss_bytes()})
+    for line in protocol_in:
+        request = json.loads(line)
+        response = run(
+            request['code'],
+            request['filename'],
+            request['stdout_path'],
+            request['stderr_path'],
+            request.get('cpu_seconds'),
+            request.get('memory_mb'),
+        )
+        response['rss'] = rss_bytes()
+        send(protocol_out, response)
+
+
+def send(stream, message):
+    stream.write(json.dumps(message) + '\n')
+    stream.flush()
+
+
+def run(code, filename, stdout_path, stderr_path, cpu_seconds=None, memory_mb=None):
+    """
+    Runs code in a fresh namespace and captures its output.
+
+    The working directory, `sys.path`, `sys.argv`, the environment variables and the resource limits are
+    restored afterwards, so that one run cannot change the conditions of the next.
+
+    Args:
+        code (str): The Python code to run.
+        filename (str): The file name reported in tracebacks and bound to `__file__`.
+        stdout_path (str): The file the standard output of the run is written to.
+        stderr_path (str): The file the standard error of the run is written to.
+        cpu_seconds (int): The CPU seconds the run may use. The worker is killed by SIGXCPU beyond them.
+        memory_mb (int): The address space of the worker in megabytes during the run, preloaded modules included.
+
+    Returns:
+        dict: The 'returncode' of the run, like that of a separate interpreter.
+    """
+    cwd = os.getcwd()
+    path = list(sys.path)
+    argv = list(sys.argv)
+    environ = dict(os.environ)
+    with open(stdout_path, 'wb') as stdout, open(stderr_path, 'wb') as stderr:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        saved_fds = os.dup(1), os.dup(2)
+        os.dup2(stdout.fileno(), 1)
+        os.dup2(stderr.fileno(), 2)
+        returncode = 0
+        saved_limits = set_run_limits(cpu_seconds, memory_mb)
+        try:
+            sys.argv = [filename]
+            namespace = {'__name__': '__main__', '__file__': filename, '__builtins__': builtins}
+            exec(compile(code, filename, 'exec'), namespace)
+        except SystemExit as e:
+            returncode = exit_code(e)
+        except BaseException:
+            exc_type, exc, tb = sys.exc_info()
+            # Leave this module's frame out of the traceback, as if the code had run as a script.
+            sys.stderr.write(''.join(traceback.format_exception(exc_type, exc, tb.tb_next)))
+            returncode = 1
+        finally:
+            sys.stdout = sys.__stdout__
+            sys.stderr = sys.__stderr__
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved_fds[0], 1)
+            os.dup2(saved_fds[1], 2)
+            os.close(saved_fds[0])
+            os.close(saved_fds[1])
+            os.chdir(cwd)
+            sys.path[:] = path
+            sys.argv = argv
+            os.environ.clear()
+            os.environ.update(environ)
+            restore_limits(saved_limits)
+    return {'returncode': returncode}
+
+
+def set_run_limits(cpu_seconds, memory_mb):
+    """
+    Lowers the soft CPU time and address space limits of the worker for one run.
+
+    Only soft limits are changed, as a lowered hard limit could not be raised again after the run.
+
+    Returns:
+        list: The previous limits, for `restore_limits`.
+    """
+    if resource is None:
+        return []
+    saved_limits = []
+    if cpu_seconds:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = int(usage.ru_utime + usage.ru_stime) + 1
+        saved_limits.append(set_soft_limit(resource.RLIMIT_CPU, used + int(cpu_seconds)))
+    if memory_mb:
+        saved_limits.append(set_soft_limit(resource.RLIMIT_AS, int(memory_mb) * 1024 * 1024))
+    return [limit for limit in saved_limits if limit is not None]
+
+
+def set_soft_limit(kind, soft):
+    try:
+        previous = resource.getrlimit(kind)
+        hard = previous[1]
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(kind, (soft, hard))
+        return kind, previous
+    except (ValueError, OSError):
+        return None
+
+
+def restore_limits(saved_limits):
+    for kind, previous in saved_limits:
+        try:
+            resource.setrlimit(kind, previous)
+        except (ValueError, OSError):
+            pass
+
+
+def exit_code(exit):
+    """
+    Converts a SystemExit into the exit status an interpreter would return for it.
+    """
+    if exit.code is None:
+        return 0
+    if isinstance(exit.code, int):
+        return exit.code
+    sys.stderr.write(str(exit.code) + '\n')
+    return 1
+
+
+def rss_bytes():
+    """
+    Returns the resident memory of the worker in bytes, or its peak resident memory where that is all that is available.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        return 0
+
+
+if __name__ == '__main__':
+    main()
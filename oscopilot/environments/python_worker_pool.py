@@ -0,0 +1,238 @@
+import os
+import sys
+import json
+import queue
+import tempfile
+import atexit
+import signal
+import select
+import subprocess
+from oscopilot.utils.output_capture import OutputCapture
+
+
+# The worker script, run directly by path so that workers do not import the oscopilot package.
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python_worker.py')
+
+
+class PythonWorkerError(Exception):
+    """
+    Raised when a worker process exits or breaks the protocol while running code.
+    """
+
+
+class PythonWorkerTimeout(PythonWorkerError):
+    """
+    Raised when a worker does not finish running code within the wall-clock timeout.
+    """
+
+
+class PythonWorker:
+    """
+    A warm Python interpreter that runs code sent to it, one request at a time.
+
+    The process is started immediately, with the preloaded modules imported in the background; the first
+    `run` waits until the worker is ready.
+
+    Attributes:
+        process (subprocess.Popen): The worker process.
+        runs (int): The number of runs executed by the worker.
+        rss (int): The resident memory of the worker in bytes, as reported after its last run.
+    """
+
+    def __init__(self, preload_modules=()):
+        self.process = subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT, *preload_modules],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding='utf-8',
+            bufsize=1,
+            # A group of its own, so the processes started by the code are killed with the worker
+            start_new_session=os.name == 'posix',
+        )
+        self.ready = False
+        self.runs = 0
+        self.rss = 0
+
+    def run(self, code, filename='temp_code.py', limits=None, log_prefix=None):
+        """
+        Runs code in a fresh namespace of the worker.
+
+        Args:
+            code (str): The Python code to run.
+            filename (str): The file name reported in tracebacks.
+            limits (ExecutionLimits): The limits of the run, or None for no limits.
+            log_prefix (str): The path prefix of the log files the full output is written to, or None.
+
+        Returns:
+            tuple: The returncode, stdout and stderr of the run.
+
+        Raises:
+            PythonWorkerTimeout: If the run did not finish within the timeout of the limits.
+            PythonWorkerError: If the worker exited or sent an invalid response.
+        """
+        if not self.ready:
+            self.receive()
+            self.ready = True
+        output_paths = {}
+        for name in ('stdout', 'stderr'):
+            fd, output_paths[name] = tempfile.mkstemp(prefix='oscopilot-{}-'.format(name))
+            os.close(fd)
+        request = {'code': code, 'filename': filename, 'stdout_path': output_paths['stdout'], 'stderr_path': output_paths['stderr']}
+        if limits is not None:
+            request.update(cpu_seconds=limits.cpu_seconds, memory_mb=limits.memory_mb)
+        try:
+            try:
+                self.process.stdin.write(json.dumps(request) + '\n')
+                self.process.stdin.flush()
+            except (BrokenPipeError, OSError) as e:
+                raise PythonWorkerError("The Python worker exited: {}".format(e))
+            response = self.receive(limits.timeout if limits is not None else None)
+            self.runs += 1
+            max_output_bytes = limits.max_output_bytes if limits is not None else None
+            outputs = [
+                read_output(output_paths[name], max_output_bytes, None if log_prefix is None else '{}.{}.log'.format(log_prefix, name))
+                for name in ('stdout', 'stderr')
+            ]
+            return response['returncode'], outputs[0], outputs[1]
+        finally:
+            for path in output_paths.values():
+                os.remove(path)
+
+    def receive(self, timeout=None):
+        """
+        Reads the next response of the worker and updates its memory usage.
+
+        Args:
+            timeout (float): The seconds to wait for the response, or None to wait indefinitely. Only
+                             supported on POSIX systems, where pipes can be polled.
+        """
+        if timeout is not None and os.name == 'posix':
+            readable, _, _ = select.select([self.process.stdout], [], [], timeout)
+            if not readable:
+                raise PythonWorkerTimeout("The Python worker did not respond within {} seconds.".format(timeout))
+        line = self.process.stdout.readline()
+        if not line:
+            try:
+                self.process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                pass
+            raise PythonWorkerError("The Python worker exited with status {}.".format(self.process.poll()))
+        try:
+            response = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise PythonWorkerError("Invalid response from the Python worker: {}".format(e))
+        self.rss = response.get('rss', 0)
+        return response
+
+    def close(self):
+        """
+        Stops the worker process.
+        """
+        if self.process.poll() is None:
+            if os.name == 'posix':
+                try:
+                    os.killpg(self.process.pid, signal.SIGKILL)
+                except (ProcessLookupError, PermissionError):
+                    self.process.kill()
+            else:
+                self.process.kill()
+        self.process.wait()
+        self.process.stdin.close()
+        self.process.stdout.close()
+
+
+class PythonWorkerPool:
+    """
+    A pool of warm Python worker processes for executing generated tools.
+
+    Starting an interpreter and importing heavy modules such as pandas takes a large part of a short tool
+    execution. The workers of the pool start once with these modules preloaded and then run one piece of code
+    after another, each in a fresh namespace with its own captured output. A worker is replaced after
+    `max_runs` runs, or once its memory exceeds `max_rss_mb`, so state leaking between runs (imported modules,
+    threads, memory) stays bounded.
+
+    Attributes:
+        size (int): The number of workers.
+        preload_modules (list[str]): The modules imported by every worker at startup.
+        max_runs (int): The number of runs after which a worker is replaced.
+        max_rss_mb (int): The resident memory in megabytes above which a worker is replaced.
+    """
+
+    def __init__(self, size, preload_modules=(), max_runs=50, max_rss_mb=1024):
+        self.size = size
+        self.preload_modules = list(preload_modules)
+        self.max_runs = max_runs
+        self.max_rss_mb = max_rss_mb
+        self.idle_workers = queue.Queue()
+        for _ in range(size):
+            self.idle_workers.put(PythonWorker(self.preload_modules))
+        atexit.register(self.close)
+
+    def run(self, code, filename='temp_code.py', limits=None, log_prefix=None):
+        """
+        Runs code on an idle worker, waiting for one if all are busy.
+
+        A worker that exceeds the timeout or CPU limit of the run is killed and replaced.
+
+        Args:
+            code (str): The Python code to run.
+            filename (str): The file name reported in tracebacks.
+            limits (ExecutionLimits): The limits of the run, or None for no limits.
+            log_prefix (str): The path prefix of the log files the full output is written to, or None.
+
+        Returns:
+            tuple: The returncode, stdout and stderr of the run, as a separate interpreter would return them.
+        """
+        worker = self.idle_workers.get()
+        try:
+            return worker.run(code, filename, limits, log_prefix)
+        except PythonWorkerTimeout:
+            worker.close()
+            worker = PythonWorker(self.preload_modules)
+            return 1, '', limits.timeout_error() + '\n'
+        except PythonWorkerError as e:
+            worker.close()
+            error = limits.exit_error(worker.process.returncode) if limits is not None else None
+            worker = PythonWorker(self.preload_modules)
+            return 1, '', error + '\n' if error else str(e)
+        finally:
+            if self.needs_recycling(worker):
+                worker.close()
+                worker = PythonWorker(self.preload_modules)
+            self.idle_workers.put(worker)
+
+    def needs_recycling(self, worker):
+        return worker.runs >= self.max_runs or worker.rss > self.max_rss_mb * 1024 * 1024
+
+    def close(self):
+        """
+        Stops the idle workers of the pool.
+        """
+        while True:
+            try:
+                worker = self.idle_workers.get_nowait()
+            except queue.Empty:
+                break
+            worker.close()
+
+
+
+def read_output(path, max_bytes, spill_path=None):
+    """
+    Reads an output file of a worker run through a bounded capture.
+
+    Args:
+        path (str): The output file.
+        max_bytes (int): The number of bytes kept of the output, or None.
+        spill_path (str): The log file the full output is written to, or None.
+
+    Returns:
+        str: The captured output.
+    """
+    capture = OutputCapture(max_bytes, spill_path)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            capture.write(chunk)
+    return capture.getvalue()
@@ -0,0 +1,154 @@
+import os
+import re
+import shlex
+import shutil
+import tempfile
+from oscopilot.environments.bash_env import Shell
+from oscopilot.utils.output_capture import OutputCapture
+
+
+class ShellSession(Shell):
+    """
+    A long-lived bash session running the Shell code of one task, step after step.
+
+    Every step is sourced by the same shell process, so the working directory, exported variables and
+    functions set by one step are still set in the next, and no shell is started per step. The end of a step
+    is detected by the end-of-execution marker of `SubprocessEnv` on both streams, preceded on stdout by the
+    exit status of the step and the working directory of the shell. If the shell dies, because the code called
+    `exit` or exceeded the timeout, the next step starts a new shell in the last known working directory;
+    exported variables are lost then.
+
+    The code of a step reads its standard input from /dev/null, so that it cannot consume the commands of the
+    session. Only POSIX systems are supported.
+
+    Attributes:
+        cwd (str): The working directory of the shell after the last step, or None before the first one.
+        exit_status (int): The exit status of the last step, or None if the shell died during it.
+        script_dir (str): The directory of the scripts sourced by the steps.
+        warm_hits (int): The number of steps run by an already started shell.
+        cold_starts (int): The number of steps that had to start the shell.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.start_cmd = ["bash", "--noprofile", "--norc"]
+        self.cwd = None
+        self.exit_status = None
+        self.script_dir = None
+        self.warm_hits = 0
+        self.cold_starts = 0
+
+    def prewarm(self):
+        """
+        Starts the shell ahead of the first step, if it is not running.
+        """
+        if self.process is None:
+            self.start_process()
+
+    def detect_active_line(self, line):
+        """
+        Returns None, as the steps are sourced from a script without active line markers.
+        """
+        return None
+
+    def start_process(self):
+        """
+        Starts the shell, in the last known working directory if the session is restarted.
+        """
+        super().start_process()
+        if self.cwd is not None:
+            self.process.stdin.write("cd {} 2>/dev/null\n".format(shlex.quote(self.cwd)))
+            self.process.stdin.flush()
+
+    def preprocess_code(self, code):
+        """
+        Writes the code into a script and returns the commands sourcing it and reporting its outcome.
+
+        Args:
+            code (str): The shell script code of the step.
+
+        Returns:
+            str: The commands sent to the shell.
+        """
+        if self.script_dir is None:
+            self.script_dir = tempfile.mkdtemp(prefix='oscopilot-shell-')
+        script_path = os.path.join(self.script_dir, 'step.sh')
+        with open(script_path, 'w') as f:
+            f.write(code + '\n')
+        return ('. {} < /dev/null\necho "##exit_status$?##"\necho "##cwd$PWD##"\necho "##end_of_execution##"\n'
+                'echo "##end_of_execution##" >&2').format(shlex.quote(script_path))
+
+    def line_postprocessor(self, line):
+        """
+        Records the exit status and working directory reported at the end of a step and discards their lines.
+        """
+        # The output of the step may not end with a newline, so the markers can follow it on the same line
+        match = re.fullmatch(r"(.*)##exit_status(\d+)##\s*", line, re.DOTALL)
+        if match:
+            self.exit_status = int(match.group(2))
+            return match.group(1) or None
+        match = re.fullmatch(r"##cwd(.*)##\s*", line, re.DOTALL)
+        if match:
+            self.cwd = match.group(1)
+            return None
+        return line
+
+    def run(self, code, log_prefix=None):
+        """
+        Runs shell code in the session, like `run_with_limits` runs it in a new shell.
+
+        Args:
+            code (str): The shell script code to run.
+            log_prefix (str): The path prefix of the log files the full output is written to, or None.
+
+        Returns:
+            tuple: The returncode, stdout and stderr of the code. If the execution timed out or the shell
+                   died, the shell is restarted by the next step.
+        """
+        stdout, stderr = (
+            OutputCapture(self.limits.max_output_bytes, None if log_prefix is None else '{}.{}.log'.format(log_prefix, name))
+            for name in ('stdout', 'stderr')
+        )
+        self.exit_status = None
+        if self.process is None:
+            self.cold_starts += 1
+        else:
+            self.warm_hits += 1
+        # Messages of the session itself, such as the timeout error, name no stream
+        failed = False
+        for output in self.step(code):
+            if output['format'] != 'output':
+                continue
+            content = output['content']
+            if 'stream' not in output:
+                failed = True
+                stderr.write((content.rstrip('\n') + '\n').encode())
+            elif output['stream'] == 'stderr':
+                stderr.write(content.encode())
+            else:
+                stdout.write(content.encode())
+        if failed:
+            returncode = 1
+        elif self.process is not None and self.process.poll() is not None:
+            # The code exited the shell
+            returncode = self.process.returncode
+            self.terminate()
+            self.process = None
+        else:
+            returncode = self.exit_status if self.exit_status is not None else 1
+        error = self.limits.exit_error(returncode)
+        if error:
+            stderr.write((error + '\n').encode())
+        return returncode, stdout.getvalue(), stderr.getvalue()
+
+    def close(self):
+        """
+        Stops the shell and removes the scripts of the session.
+        """
+        if self.process is not None:
+            self.terminate()
+            self.process.wait()
+            self.process = None
+        if self.script_dir is not None:
+            shutil.rmtree(self.script_dir, ignore_errors=True)
+            self.script_dir = None
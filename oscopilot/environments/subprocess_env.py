@@ -1,4 +1,5 @@
 import os
+import asyncio
 import queue
 import re
 import subprocess
@@ -6,6 +7,13 @@ import threading
 import time
 import traceback
 from oscopilot.environments.base_env import BaseEnv
+from oscopilot.utils.limits import ExecutionLimits, kill_process_tree
+
+
+# Put in the output queue by the readers after the messages of a step or of a stream
+END_OF_EXECUTION = "end_of_execution"
+END_OF_STREAM = "end_of_stream"
+
 
 class SubprocessEnv(BaseEnv):
     """
@@ -15,7 +23,13 @@ class SubprocessEnv(BaseEnv):
     starting and terminating processes, handling output streams, and executing code steps.
 
     It inherits from BaseEnv, which provides basic environment functionality.
+
+    Attributes:
+        end_marker_streams (int): The number of streams the end-of-execution marker is written to. A step
+                                  ends as soon as the reader of every such stream has read the marker, so the
+                                  output written before it on those streams has been read.
     """    
+    end_marker_streams = 1
 
     def __init__(self):
         """
@@ -25,14 +39,22 @@ class SubprocessEnv(BaseEnv):
             start_cmd (list): The command used to start the subprocess.
             process (subprocess.Popen or None): The subprocess object.
             verbose (bool): Whether to print verbose output.
-            output_queue (queue.Queue): A queue for storing output messages.
+            output_queue (queue.Queue): A queue for storing output messages, and the end markers of the readers.
             done (threading.Event): An event to signal completion of execution.
+            limits (ExecutionLimits): The limits applied to the subprocess and to each step.
+            readers (list[threading.Thread]): The threads reading the output streams of the subprocess.
+            async_process (asyncio.subprocess.Process or None): The subprocess running the code of `astep`.
+            async_loop (asyncio.AbstractEventLoop or None): The event loop `async_process` belongs to.
         """        
         self.start_cmd = []
         self.process = None
         self.verbose = False
         self.output_queue = queue.Queue()
         self.done = threading.Event()
+        self.limits = ExecutionLimits.from_config()
+        self.readers = []
+        self.async_process = None
+        self.async_loop = None
 
     def detect_active_line(self, line):
         """
@@ -92,6 +114,18 @@ class SubprocessEnv(BaseEnv):
             self.process.terminate()
             self.process.stdin.close()
             self.process.stdout.close()
+        if self.async_process and self.async_process.returncode is None:
+            self.async_process.terminate()
+
+    async def aterminate(self):
+        """
+        Terminates the subprocesses and waits for the one of `astep`, whose pipes belong to the running event loop.
+        """
+        async_process = self.async_process
+        self.terminate()
+        self.async_process = None
+        if async_process is not None:
+            await async_process.wait()
 
     def start_process(self):
         """
@@ -102,6 +136,8 @@ class SubprocessEnv(BaseEnv):
 
         my_env = os.environ.copy()
         my_env["PYTHONIOENCODING"] = "utf-8"
+        # A queue of its own, so that the readers of a killed process cannot end the steps of the new one
+        self.output_queue = queue.Queue()
         self.process = subprocess.Popen(
             self.start_cmd,
             stdin=subprocess.PIPE,
@@ -113,17 +149,25 @@ class SubprocessEnv(BaseEnv):
             env=my_env,
             encoding="utf-8",
             errors="replace",
+            preexec_fn=self.limits.preexec_fn(),
+            # A group of its own, so the commands still running can be killed on timeout
+            start_new_session=os.name == "posix",
         )
-        threading.Thread(
-            target=self.handle_stream_output,
-            args=(self.process.stdout, False),
-            daemon=True,
-        ).start()
-        threading.Thread(
-            target=self.handle_stream_output,
-            args=(self.process.stderr, True),
-            daemon=True,
-        ).start()
+        self.limits.limit_process(self.process.pid)
+        self.readers = [
+            threading.Thread(
+                target=self.handle_stream_output,
+                args=(self.process.stdout, False, self.output_queue),
+                daemon=True,
+            ),
+            threading.Thread(
+                target=self.handle_stream_output,
+                args=(self.process.stderr, True, self.output_queue),
+                daemon=True,
+            ),
+        ]
+        for reader in self.readers:
+            reader.start()
 
     def step(self, code):
         """
@@ -183,84 +227,221 @@ class SubprocessEnv(BaseEnv):
                     }
                     return
 
-        while True:
-            if not self.output_queue.empty():
-                yield self.output_queue.get()
-            else:
-                time.sleep(0.1)
+        # Every message is yielded as soon as a reader puts it in the queue. The step ends when the end marker
+        # was read from every stream it is written to, or when both streams are closed because the process exited.
+        output_queue = self.output_queue
+        deadline = time.monotonic() + self.limits.timeout if self.limits.timeout else None
+        markers = closed_streams = 0
+        while markers < self.end_marker_streams and closed_streams < 2:
             try:
-                output = self.output_queue.get(timeout=0.3)  # Waits for 0.3 seconds
-                yield output
+                output = output_queue.get(timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
             except queue.Empty:
-                if self.done.is_set():
-                    # Try to yank 3 more times from it... maybe there's something in there...
-                    # (I don't know if this actually helps. Maybe we just need to yank 1 more time)
-                    for _ in range(3):
-                        if not self.output_queue.empty():
-                            yield self.output_queue.get()
-                        time.sleep(0.2)
-                    break
-
-    def handle_stream_output(self, stream, is_error_stream):
+                # Kill the process with everything it started, the next step starts a fresh one
+                kill_process_tree(self.process)
+                self.terminate()
+                self.process = None
+                yield {
+                    "type": "console",
+                    "format": "output",
+                    "content": self.limits.timeout_error(),
+                }
+                return
+            if output == END_OF_EXECUTION:
+                markers += 1
+            elif output == END_OF_STREAM:
+                closed_streams += 1
+            else:
+                yield output
+        if closed_streams == 2:
+            # The process closed its streams to exit, its exit status follows
+            try:
+                self.process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                pass
+        self.done.set()
+
+    def handle_stream_output(self, stream, is_error_stream, output_queue=None):
         """
         Handles the streaming output from the subprocess.
 
         Args:
             stream: The output stream to handle.
             is_error_stream (bool): Indicates if the stream is the error stream.
+            output_queue (queue.Queue): The queue the messages are put in, `output_queue` by default.
+
+        Output messages name the stream they were read from in their "stream" key, "stdout" or "stderr".
+        After the messages of a step, `END_OF_EXECUTION` is put in the queue, and `END_OF_STREAM` once the
+        stream is closed.
         """        
+        if output_queue is None:
+            output_queue = self.output_queue
         try:
             for line in iter(stream.readline, ""):
                 if self.verbose:
                     print(f"Received output line:\n{line}\n---")
 
-                line = self.line_postprocessor(line)
-
-                if line is None:
-                    continue  # `line = None` is the postprocessor's signal to discard completely
-
-                if self.detect_active_line(line):
-                    active_line = self.detect_active_line(line)
-                    self.output_queue.put(
-                        {
-                            "type": "console",
-                            "format": "active_line",
-                            "content": active_line,
-                        }
-                    )
-                    # Sometimes there's a little extra on the same line, so be sure to send that out
-                    line = re.sub(r"##active_line\d+##", "", line)
-                    if line:
-                        self.output_queue.put(
-                            {"type": "console", "format": "output", "content": line}
-                        )
-                elif self.detect_end_of_execution(line):
-                    # Sometimes there's a little extra on the same line, so be sure to send that out
-                    line = line.replace("##end_of_execution##", "").strip()
-                    if line:
-                        self.output_queue.put(
-                            {"type": "console", "format": "output", "content": line}
-                        )
-                    self.done.set()
-                elif is_error_stream and "KeyboardInterrupt" in line:
-                    self.output_queue.put(
-                        {
-                            "type": "console",
-                            "format": "output",
-                            "content": "KeyboardInterrupt",
-                        }
-                    )
-                    time.sleep(0.1)
-                    self.done.set()
-                else:
-                    self.output_queue.put(
-                        {"type": "console", "format": "output", "content": line}
-                    )
+                for output in self.parse_output_line(line, is_error_stream):
+                    output_queue.put(output)
         except ValueError as e:
             if "operation on closed file" in str(e):
                 if self.verbose:
                     print("Stream closed while reading.")
             else:
                 raise e
+        finally:
+            output_queue.put(END_OF_STREAM)
+
+    def parse_output_line(self, line, is_error_stream):
+        """
+        Turns an output line of the subprocess into output messages.
+
+        Args:
+            line (str): The output line.
+            is_error_stream (bool): Indicates if the line was read from the error stream.
+
+        Returns:
+            list: The output messages, followed by `END_OF_EXECUTION` if the line ends the step.
+        """
+        stream_name = "stderr" if is_error_stream else "stdout"
+        line = self.line_postprocessor(line)
+
+        if line is None:
+            return []  # `line = None` is the postprocessor's signal to discard completely
+
+        if self.detect_active_line(line):
+            active_line = self.detect_active_line(line)
+            outputs = [{"type": "console", "format": "active_line", "content": active_line}]
+            # Sometimes there's a little extra on the same line, so be sure to send that out
+            line = re.sub(r"##active_line\d+##", "", line)
+            if line:
+                outputs.append({"type": "console", "format": "output", "content": line, "stream": stream_name})
+            return outputs
+        if self.detect_end_of_execution(line):
+            # Sometimes there's a little extra on the same line, so be sure to send that out
+            line = line.replace("##end_of_execution##", "").strip()
+            if line:
+                return [{"type": "console", "format": "output", "content": line, "stream": stream_name}, END_OF_EXECUTION]
+            return [END_OF_EXECUTION]
+        if is_error_stream and "KeyboardInterrupt" in line:
+            # The step goes on until its end markers, so that its remaining output is not left to the next step
+            return [{"type": "console", "format": "output", "content": "KeyboardInterrupt"}]
+        return [{"type": "console", "format": "output", "content": line, "stream": stream_name}]
+
+    async def astart_process(self):
+        """
+        Starts the subprocess running the code of `astep`, as an asyncio subprocess of the running event loop.
+        """
+        if self.async_process and self.async_process.returncode is None:
+            self.async_process.terminate()
+
+        my_env = os.environ.copy()
+        my_env["PYTHONIOENCODING"] = "utf-8"
+        self.async_process = await asyncio.create_subprocess_exec(
+            *self.start_cmd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=my_env,
+            preexec_fn=self.limits.preexec_fn(),
+            start_new_session=os.name == "posix",
+        )
+        self.limits.limit_process(self.async_process.pid)
+        self.async_loop = asyncio.get_running_loop()
+
+    async def astep(self, code):
+        """
+        Executes a step of code without threads, yielding the same output messages as `step`.
+
+        The code runs in a subprocess of its own, started with asyncio on first use and kept for the next
+        steps run by the same event loop. Its output streams are read by tasks of the event loop, so one loop
+        can run the steps of many environments at once.
+
+        Args:
+            code (str): The code to execute.
 
+        Yields:
+            dict: Output messages generated during execution.
+        """
+        max_retries = 3
+        try:
+            code = self.preprocess_code(code)
+            if (self.async_process is None or self.async_process.returncode is not None
+                    or self.async_loop is not asyncio.get_running_loop()):
+                await self.astart_process()
+        except Exception:
+            yield {"type": "console", "format": "output", "content": traceback.format_exc()}
+            return
 
+        for retry_count in range(max_retries + 1):
+            if self.verbose:
+                print(f"(after processing) Running processed code:\n{code}\n---")
+            try:
+                self.async_process.stdin.write((code + "\n").encode("utf-8"))
+                await self.async_process.stdin.drain()
+                break
+            except (BrokenPipeError, ConnectionResetError):
+                if retry_count == max_retries:
+                    yield {
+                        "type": "console",
+                        "format": "output",
+                        "content": "Maximum retries reached. Could not execute code.",
+                    }
+                    return
+                await self.astart_process()
+
+        output_queue = asyncio.Queue()
+        readers = [
+            asyncio.ensure_future(self.aread_stream(self.async_process.stdout, False, output_queue)),
+            asyncio.ensure_future(self.aread_stream(self.async_process.stderr, True, output_queue)),
+        ]
+        deadline = time.monotonic() + self.limits.timeout if self.limits.timeout else None
+        markers = closed_streams = 0
+        try:
+            while markers < self.end_marker_streams and closed_streams < 2:
+                try:
+                    output = await asyncio.wait_for(
+                        output_queue.get(), None if deadline is None else max(deadline - time.monotonic(), 0))
+                except asyncio.TimeoutError:
+                    # Kill the process with everything it started, the next step starts a fresh one
+                    kill_process_tree(self.async_process)
+                    await self.async_process.wait()
+                    self.async_process = None
+                    yield {
+                        "type": "console",
+                        "format": "output",
+                        "content": self.limits.timeout_error(),
+                    }
+                    return
+                if output == END_OF_EXECUTION:
+                    markers += 1
+                elif output == END_OF_STREAM:
+                    closed_streams += 1
+                else:
+                    yield output
+        finally:
+            # A stream without the end marker is still being read
+            for reader in readers:
+                reader.cancel()
+
+    async def aread_stream(self, stream, is_error_stream, output_queue):
+        """
+        Reads an output stream of the asyncio subprocess until the end of the step, like `handle_stream_output`.
+
+        Args:
+            stream (asyncio.StreamReader): The output stream to read.
+            is_error_stream (bool): Indicates if the stream is the error stream.
+            output_queue (asyncio.Queue): The queue the messages are put in.
+        """
+        while True:
+            line = await stream.readline()
+            if not line:
+                output_queue.put_nowait(END_OF_STREAM)
+                return
+            line = line.decode("utf-8", errors="replace")
+            if self.verbose:
+                print(f"Received output line:\n{line}\n---")
+            for output in self.parse_output_line(line, is_error_stream):
+                output_queue.put_nowait(output)
+                if output == END_OF_EXECUTION:
+                    # The lines after the marker belong to the next step
+                    return
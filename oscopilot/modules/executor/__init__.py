@@ -1 +1,5 @@
-from .friday_executor import *
\ No newline at end of file
+from .friday_executor import *
+from .code_checker import *
+from .auto_fixer import *
+from .module_index import *
+from .map_runner import *
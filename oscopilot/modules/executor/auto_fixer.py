@@ -0,0 +1,196 @@
+import ast
+import os
+import re
+import sys
+from oscopilot.modules.executor.code_checker import is_module_available
+
+
+# Import statements for names that generated code commonly uses without importing them.
+# Standard library modules used by their own name (os, re, json, ...) are handled separately.
+COMMON_IMPORTS = {
+    'pd': 'import pandas as pd',
+    'np': 'import numpy as np',
+    'plt': 'import matplotlib.pyplot as plt',
+    'sns': 'import seaborn as sns',
+    'Path': 'from pathlib import Path',
+    'timedelta': 'from datetime import timedelta',
+    'defaultdict': 'from collections import defaultdict',
+    'Counter': 'from collections import Counter',
+    'OrderedDict': 'from collections import OrderedDict',
+    'deque': 'from collections import deque',
+    'namedtuple': 'from collections import namedtuple',
+    'List': 'from typing import List',
+    'Dict': 'from typing import Dict',
+    'Tuple': 'from typing import Tuple',
+    'Optional': 'from typing import Optional',
+    'Union': 'from typing import Union',
+    'Any': 'from typing import Any',
+    'load_workbook': 'from openpyxl import load_workbook',
+    'Workbook': 'from openpyxl import Workbook',
+    'Document': 'from docx import Document',
+    'Presentation': 'from pptx import Presentation',
+    'BeautifulSoup': 'from bs4 import BeautifulSoup',
+    'Image': 'from PIL import Image',
+}
+
+# Attributes that show `datetime` is used as the class rather than the module.
+DATETIME_CLASS_ATTRIBUTES = ('now', 'today', 'strptime', 'fromtimestamp', 'fromisoformat', 'utcnow', 'combine')
+
+NAME_ERROR_PATTERN = re.compile(r"NameError: name '(\w+)' is not defined")
+FILE_NOT_FOUND_PATTERN = re.compile(r"FileNotFoundError|No such file or directory")
+
+
+def auto_fix_tool(code, invoke, error, working_dir):
+    """
+    Applies rule-based fixes for mechanical errors in generated Python code, without calling the LLM.
+
+    The following rules are applied, based on the error of the failed execution:
+        - Names reported by a NameError that belong to the standard library or to a common package
+          get their import statement inserted at the top of the code.
+        - An invoke calling a name that is not defined, but matches a function or class of the code
+          up to capitalization and underscores, is changed to call the defined name.
+        - On a FileNotFoundError, relative paths passed in the invoke that exist under the working
+          directory are replaced with their absolute paths.
+
+    Args:
+        code (str): The Python code of the tool.
+        invoke (str): The invocation of the tool.
+        error (str): The error message of the failed execution.
+        working_dir (str): The working directory that relative paths in the task refer to.
+
+    Returns:
+        tuple: The fixed (code, invoke), or None if no rule applied.
+    """
+    if not error:
+        return None
+    try:
+        tree = ast.parse(code)
+        invoke_tree = ast.parse(invoke.strip(), mode='eval')
+    except SyntaxError:
+        return None
+
+    # The rules rewrite the invoke with `ast.unparse`, which also reformats it (e.g. the quotes of strings),
+    # so the invoke counts as changed only if its syntax tree changed
+    original_invoke = ast.dump(invoke_tree)
+    missing_names = list(dict.fromkeys(NAME_ERROR_PATTERN.findall(error)))
+    new_invoke = fix_invoke_name(tree, invoke_tree, missing_names)
+    if FILE_NOT_FOUND_PATTERN.search(error):
+        new_invoke = fix_relative_paths(ast.parse(new_invoke, mode='eval'), working_dir)
+    if ast.dump(ast.parse(new_invoke, mode='eval')) == original_invoke:
+        new_invoke = invoke.strip()
+    new_code = add_missing_imports(code, tree, missing_names)
+    if new_code == code and new_invoke == invoke.strip():
+        return None
+    return new_code, new_invoke
+
+
+def add_missing_imports(code, tree, names):
+    """
+    Inserts the import statements for undefined names that can be resolved unambiguously.
+
+    Args:
+        code (str): The Python code.
+        tree (ast.Module): The parsed code.
+        names (list[str]): The names reported as undefined.
+
+    Returns:
+        str: The code with the imports inserted, unchanged if no name could be resolved.
+    """
+    imports = []
+    for name in names:
+        statement = import_statement_for(name, code)
+        if statement and statement not in imports:
+            imports.append(statement)
+    if not imports:
+        return code
+
+    # Imports must come after `from __future__` statements.
+    insert_line = 0
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom) and node.module == '__future__':
+            insert_line = node.end_lineno
+        else:
+            break
+    lines = code.split('\n')
+    return '\n'.join(lines[:insert_line] + imports + lines[insert_line:])
+
+
+def import_statement_for(name, code):
+    """
+    Returns the import statement that defines a name, if the name is known and importable.
+
+    Args:
+        name (str): The undefined name.
+        code (str): The code using the name, used to tell the `datetime` module from the class.
+
+    Returns:
+        str: The import statement, or None if the name is unknown or its module is not installed.
+    """
+    if name == 'datetime':
+        if any('datetime.{}('.format(attribute) in code for attribute in DATETIME_CLASS_ATTRIBUTES):
+            statement = 'from datetime import datetime'
+        else:
+            statement = 'import datetime'
+    elif name in COMMON_IMPORTS:
+        statement = COMMON_IMPORTS[name]
+    elif name in sys.stdlib_module_names and not name.startswith('_'):
+        statement = 'import ' + name
+    else:
+        return None
+    module = statement.split()[1].split('.')[0]
+    if not is_module_available(module):
+        return None
+    return statement
+
+
+def fix_invoke_name(tree, invoke_tree, missing_names):
+    """
+    Replaces undefined names in the invoke with the function or class of the code they were meant to call.
+
+    Args:
+        tree (ast.Module): The parsed tool code.
+        invoke_tree (ast.Expression): The parsed invoke.
+        missing_names (list[str]): The names reported as undefined.
+
+    Returns:
+        str: The invoke, with mis-capitalized names replaced.
+    """
+    definitions = {normalize_name(node.name): node.name for node in tree.body
+                   if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))}
+    for node in ast.walk(invoke_tree):
+        if isinstance(node, ast.Name) and node.id in missing_names:
+            node.id = definitions.get(normalize_name(node.id), node.id)
+    return ast.unparse(invoke_tree)
+
+
+def normalize_name(name):
+    """
+    Normalizes a name for comparisons that ignore capitalization and underscores.
+    """
+    return name.replace('_', '').lower()
+
+
+def fix_relative_paths(invoke_tree, working_dir):
+    """
+    Replaces relative paths passed in the invoke with absolute paths under the working directory.
+
+    A string argument is only replaced if it does not exist relative to the current directory but
+    does exist under the working directory.
+
+    Args:
+        invoke_tree (ast.Expression): The parsed invoke.
+        working_dir (str): The working directory.
+
+    Returns:
+        str: The invoke, with relative paths made absolute.
+    """
+    for node in ast.walk(invoke_tree):
+        if not (isinstance(node, ast.Constant) and isinstance(node.value, str)):
+            continue
+        path = node.value
+        if not path or os.path.isabs(path) or '\n' in path or os.path.exists(path):
+            continue
+        absolute_path = os.path.join(working_dir, path)
+        if os.path.exists(absolute_path):
+            node.value = os.path.normpath(absolute_path)
+    return ast.unparse(invoke_tree)
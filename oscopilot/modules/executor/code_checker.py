@@ -0,0 +1,334 @@
+import ast
+import builtins
+import importlib.util
+import inspect
+import os
+import shutil
+import subprocess
+from oscopilot.modules.executor.map_runner import parse_map_invoke
+
+
+# Names that exist in a module's namespace without being bound by the code itself.
+MODULE_NAMES = {'__file__', '__name__', '__doc__', '__builtins__', '__spec__', '__loader__', '__package__', '__annotations__'}
+
+# Exceptions whose handlers make an import optional, so a missing module is not an error.
+IMPORT_GUARD_EXCEPTIONS = {'ImportError', 'ModuleNotFoundError', 'Exception', 'BaseException'}
+
+
+def check_tool_code(code, invoke, node_type):
+    """
+    Statically checks generated tool code before it is executed.
+
+    Python code is parsed, its imports are resolved against the installed environment, names that are
+    never defined are flagged and the invocation is matched against the signature of the function or
+    class it calls. Map code is checked like Python code, its invocation passing the list of items to the
+    per-item function. Shell code is checked with `bash -n`. Other code types are not checked.
+
+    Args:
+        code (str): The generated code.
+        invoke (str): The invocation of the generated Python tool, may be empty.
+        node_type (str): The type of the code, such as 'Python' or 'Shell'.
+
+    Returns:
+        str: A description of every problem found, one per line, or None if the code passed the check.
+    """
+    if node_type == 'Python':
+        errors = check_python_code(code, invoke)
+    elif node_type == 'Map':
+        try:
+            parse_map_invoke(invoke)
+        except ValueError as e:
+            return str(e)
+        errors = check_python_code(code, invoke)
+    elif node_type == 'Shell':
+        errors = check_shell_code(code)
+    else:
+        errors = []
+    if not errors:
+        return None
+    return "\n".join(errors)
+
+
+def check_python_code(code, invoke=''):
+    """
+    Statically checks Python code and its invocation.
+
+    Args:
+        code (str): The Python code defining the tool.
+        invoke (str): The expression invoking the tool, may be empty.
+
+    Returns:
+        list[str]: The problems found, formatted like the Python exceptions they would raise at runtime.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return [format_syntax_error(e)]
+    invoke_tree = None
+    if invoke.strip():
+        try:
+            invoke_tree = ast.parse(invoke.strip(), mode='eval')
+        except SyntaxError as e:
+            return ["SyntaxError in invoke `{}`: {}".format(invoke.strip(), e.msg)]
+
+    errors = ["ModuleNotFoundError: No module named '{}'".format(name) for name in find_missing_modules(tree)]
+    bound_names = collect_bound_names(tree)
+    if invoke_tree is not None:
+        # Comprehensions in the invocation bind their own variables
+        bound_names |= collect_bound_names(invoke_tree)
+    # A star import can bind any name, so undefined names cannot be told apart from imported ones.
+    if not has_star_import(tree):
+        loaded_names = collect_loaded_names(tree)
+        if invoke_tree is not None:
+            loaded_names += collect_loaded_names(invoke_tree)
+        for name in dict.fromkeys(loaded_names):
+            if name not in bound_names and not hasattr(builtins, name) and name not in MODULE_NAMES:
+                errors.append("NameError: name '{}' is not defined".format(name))
+    if invoke_tree is not None:
+        signature_error = check_invoke_signature(tree, invoke_tree.body)
+        if signature_error:
+            errors.append(signature_error)
+    return errors
+
+
+def check_shell_code(code):
+    """
+    Checks the syntax of a shell script with `bash -n` without running it.
+
+    Args:
+        code (str): The shell script.
+
+    Returns:
+        list[str]: The syntax errors reported by bash, or an empty list if bash is not available.
+    """
+    bash = shutil.which('bash')
+    if os.name == 'nt' or bash is None:
+        return []
+    try:
+        result = subprocess.run([bash, '-n'], input=code, capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return []
+    if result.returncode == 0:
+        return []
+    return ["SyntaxError (bash -n): {}".format(result.stderr.strip())]
+
+
+def format_syntax_error(error):
+    """
+    Formats a SyntaxError with the line it occurred on.
+
+    Args:
+        error (SyntaxError): The error raised by `ast.parse`.
+
+    Returns:
+        str: The formatted error message.
+    """
+    message = "{}: {} (line {})".format(type(error).__name__, error.msg, error.lineno)
+    if error.text:
+        message += ": " + error.text.strip()
+    return message
+
+
+def find_missing_modules(tree):
+    """
+    Finds the top-level modules imported by the code that cannot be found in the installed environment.
+
+    Imports inside a `try` block that handles ImportError are optional and are not reported.
+
+    Args:
+        tree (ast.Module): The parsed code.
+
+    Returns:
+        list[str]: The names of the missing modules, in order of first import.
+    """
+    guarded = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Try) and any(is_import_guard(handler) for handler in node.handlers):
+            for child in node.body:
+                guarded.update(id(sub_node) for sub_node in ast.walk(child))
+
+    missing = []
+    for node in ast.walk(tree):
+        if id(node) in guarded:
+            continue
+        if isinstance(node, ast.Import):
+            modules = [alias.name.split('.')[0] for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules = [node.module.split('.')[0]]
+        else:
+            continue
+        for module in modules:
+            if module not in missing and not is_module_available(module):
+                missing.append(module)
+    return missing
+
+
+def is_import_guard(handler):
+    """
+    Checks whether an exception handler catches import errors.
+
+    Args:
+        handler (ast.ExceptHandler): The handler to check.
+
+    Returns:
+        bool: True if the handler is a bare `except` or catches ImportError or one of its bases.
+    """
+    if handler.type is None:
+        return True
+    types = handler.type.elts if isinstance(handler.type, ast.Tuple) else [handler.type]
+    return any(isinstance(t, ast.Name) and t.id in IMPORT_GUARD_EXCEPTIONS for t in types)
+
+
+def is_module_available(module):
+    """
+    Checks whether a top-level module can be imported by the current interpreter.
+
+    Args:
+        module (str): The top-level module name.
+
+    Returns:
+        bool: True if the module can be found.
+    """
+    try:
+        return importlib.util.find_spec(module) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def has_star_import(tree):
+    """
+    Checks whether the code contains a `from module import *` statement.
+    """
+    return any(isinstance(node, ast.ImportFrom) and any(alias.name == '*' for alias in node.names)
+               for node in ast.walk(tree))
+
+
+def collect_bound_names(tree):
+    """
+    Collects every name bound anywhere in the code, regardless of scope.
+
+    Ignoring scopes keeps the check free of false positives: a name is only reported as undefined
+    if nothing in the code could ever define it.
+
+    Args:
+        tree (ast.AST): The parsed code.
+
+    Returns:
+        set[str]: The bound names.
+    """
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                names.add(alias.asname or alias.name.split('.')[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            names.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest:
+            names.add(node.rest)
+    return names
+
+
+def collect_loaded_names(tree):
+    """
+    Collects the names read by the code, in order of appearance.
+
+    Args:
+        tree (ast.AST): The parsed code.
+
+    Returns:
+        list[str]: The loaded names, possibly with duplicates.
+    """
+    return [node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)]
+
+
+def check_invoke_signature(tree, call):
+    """
+    Checks that the invocation passes arguments the called function or class accepts.
+
+    Supported invocations are `func(...)`, `Class(...)` and `Class(...)(...)`, where the function or
+    class is defined at the top level of the code. Calls with `*args` or `**kwargs` are not checked.
+
+    Args:
+        tree (ast.Module): The parsed tool code.
+        call (ast.expr): The parsed invocation expression.
+
+    Returns:
+        str: A TypeError message if the arguments do not match, otherwise None.
+    """
+    if not isinstance(call, ast.Call):
+        return None
+    definitions = {node.name: node for node in tree.body
+                   if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))}
+    checks = []
+    if isinstance(call.func, ast.Name) and call.func.id in definitions:
+        definition = definitions[call.func.id]
+        if isinstance(definition, ast.ClassDef):
+            checks.append((call, definition.name, find_method(definition, '__init__'), True))
+        else:
+            checks.append((call, definition.name, definition, False))
+    elif (isinstance(call.func, ast.Call) and isinstance(call.func.func, ast.Name)
+          and isinstance(definitions.get(call.func.func.id), ast.ClassDef)):
+        definition = definitions[call.func.func.id]
+        checks.append((call.func, definition.name, find_method(definition, '__init__'), True))
+        checks.append((call, definition.name + '.__call__', find_method(definition, '__call__'), True))
+
+    for node, name, function, is_method in checks:
+        if function is None or function.decorator_list:
+            continue
+        if any(isinstance(arg, ast.Starred) for arg in node.args) or any(k.arg is None for k in node.keywords):
+            continue
+        signature = signature_from_ast(function.args, is_method)
+        try:
+            signature.bind(*node.args, **{keyword.arg: keyword.value for keyword in node.keywords})
+        except TypeError as e:
+            return "TypeError: invoke `{}` does not match {}{}: {}".format(ast.unparse(node), name, signature, e)
+    return None
+
+
+def find_method(class_def, name):
+    """
+    Finds a method defined directly in a class body.
+    """
+    for node in class_def.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == name:
+            return node
+    return None
+
+
+def signature_from_ast(arguments, is_method=False):
+    """
+    Builds an `inspect.Signature` from the arguments of a parsed function definition.
+
+    Args:
+        arguments (ast.arguments): The arguments node of the function definition.
+        is_method (bool): Whether the first positional parameter (`self`) should be dropped.
+
+    Returns:
+        inspect.Signature: The signature, with placeholder defaults for optional parameters.
+    """
+    parameters = []
+    positional = arguments.posonlyargs + arguments.args
+    defaults = [inspect.Parameter.empty] * (len(positional) - len(arguments.defaults)) + [None] * len(arguments.defaults)
+    for index, (arg, default) in enumerate(zip(positional, defaults)):
+        kind = inspect.Parameter.POSITIONAL_ONLY if index < len(arguments.posonlyargs) else inspect.Parameter.POSITIONAL_OR_KEYWORD
+        parameters.append(inspect.Parameter(arg.arg, kind, default=default))
+    if is_method and parameters:
+        parameters = parameters[1:]
+    if arguments.vararg:
+        parameters.append(inspect.Parameter(arguments.vararg.arg, inspect.Parameter.VAR_POSITIONAL))
+    for arg, default in zip(arguments.kwonlyargs, arguments.kw_defaults):
+        parameters.append(inspect.Parameter(arg.arg, inspect.Parameter.KEYWORD_ONLY,
+                                            default=inspect.Parameter.empty if default is None else None))
+    if arguments.kwarg:
+        parameters.append(inspect.Parameter(arguments.kwarg.arg, inspect.Parameter.VAR_KEYWORD))
+    return inspect.Signature(parameters)
@@ -1,14 +1,66 @@
 from oscopilot.modules.base_module import BaseModule
 from oscopilot.tool_repository.manager.tool_manager import get_open_api_doc_path
+from oscopilot.tool_repository.manager.openapi_registry import get_openapi_registry
+from oscopilot.tool_repository.manager.tool_request_util import get_tool_request_util
 import re
+import ast
 import json
-import subprocess
+import asyncio
 from pathlib import Path
-from oscopilot.utils.utils import send_chat_prompts, api_exception_mechanism
+from oscopilot.utils.utils import send_chat_prompts, asend_chat_prompts, api_exception_mechanism
+from oscopilot.utils.trace import get_current_trace, is_replaying
+from oscopilot.utils.config import Config
+from oscopilot.utils.limits import ExecutionLimits, run_with_limits, arun_with_limits
+from oscopilot.utils.output_capture import OutputCapture
+from oscopilot.environments.python_worker_pool import PythonWorkerPool
+from oscopilot.environments.shell_session import ShellSession
+from oscopilot.modules.executor.code_checker import check_tool_code, find_missing_modules
+from oscopilot.modules.executor.module_index import ModuleIndex, Wheelhouse
+from oscopilot.modules.executor.map_runner import build_map_code
+from oscopilot.modules.executor.auto_fixer import auto_fix_tool
 import os
 import sys
+import time
 
 
+class SimpleState:
+    """
+    The execution state returned by `FridayExecutor.execute_tool` for code run outside the environment.
+
+    Attributes:
+        error (str): The error output of the execution, empty if it succeeded.
+        result (str): The standard output of the execution.
+        pwd (str): The directory the code was executed in.
+        ls (str): A listing of the working directory, may be empty.
+        fs_diff (str): The files and folders created, modified and deleted in the working directory during the execution.
+        score (int): Unused, kept for compatibility with older callers.
+        static_check_failed (bool): True if the code was rejected by the static check and never executed.
+    """
+    def __init__(self):
+        self.error = ""
+        self.result = ""
+        self.pwd = os.getcwd()
+        self.ls = ""
+        self.fs_diff = ""
+        self.score = 0
+        self.static_check_failed = False
+
+    @classmethod
+    def from_output(cls, returncode, stdout, stderr):
+        """
+        Creates the state of a finished process: its output on success, its error output otherwise.
+        """
+        state = cls()
+        if returncode == 0:
+            state.result = stdout
+        else:
+            state.error = stderr
+        return state
+
+    def __str__(self):
+        if self.error:
+            return f"Error: {self.error}"
+        return f"Result: {self.result}"
 
 
 class FridayExecutor(BaseModule):
@@ -26,25 +78,36 @@ class FridayExecutor(BaseModule):
         self.prompt = prompt
         self.tool_manager = tool_manager
         self.max_iter = max_iter
+        # Directory for the temporary files of an execution, the current directory if None
+        self.scratch_dir = None
+        self.limits = ExecutionLimits.from_config()
+        self.rollback_on_failure = bool(Config.get_parameter('rollback_on_failure'))
+        # Whether the working dir was checkpointed before the last execution, and the state of that execution
+        self.has_checkpoint = False
+        self.checkpoint_state = None
+        # The bash session running the Shell code of the current task, started by the first Shell execution
+        self.use_shell_session = bool(Config.get_parameter('shell_session')) and os.name == 'posix'
+        self.shell_session = None
+        # Whether the steps of a task run on the same pooled kernel, see `kernel_key`
+        self.kernel_affinity = bool(Config.get_parameter('kernel_affinity'))
+        self.python_worker_pool = None
+        if Config.get_parameter('python_workers'):
+            preload_modules = [module.strip() for module in (Config.get_parameter('python_worker_preload') or '').split(',') if module.strip()]
+            self.python_worker_pool = PythonWorkerPool(
+                Config.get_parameter('python_workers'),
+                preload_modules,
+                Config.get_parameter('python_worker_max_runs') or 50,
+                Config.get_parameter('python_worker_max_rss_mb') or 1024,
+            )
         self.open_api_doc_path = get_open_api_doc_path()
-        self.open_api_doc = {}
-        
-        # Fix for Windows compatibility
-        if os.path.isdir(self.open_api_doc_path):
-            # If it's a directory, create a default empty JSON file
-            default_api_path = os.path.join(self.open_api_doc_path, "default_api.json")
-            if not os.path.exists(default_api_path):
-                with open(default_api_path, "w") as f:
-                    json.dump({}, f)
-            self.open_api_doc_path = default_api_path
-        
-        # Try to load the API doc, but don't fail if it doesn't exist
-        try:
-            with open(self.open_api_doc_path) as f:
-                self.open_api_doc = json.load(f)
-        except (FileNotFoundError, PermissionError) as e:
-            print(f"Warning: Could not load API doc: {e}")
-            # Continue with empty API doc
+        self.open_api_registry = get_openapi_registry(self.open_api_doc_path)
+        # The modules importable by generated Python code, and the wheels missing modules are installed from
+        self.module_index = ModuleIndex()
+        module_index_size = Config.get_parameter('module_index_size')
+        self.module_index_size = 300 if module_index_size is None else module_index_size
+        self.wheelhouse = Wheelhouse(Config.get_parameter('wheelhouse')) if Config.get_parameter('wheelhouse') else None
+        # The number of processes a Map tool fans out over
+        self.map_workers = Config.get_parameter('map_workers') or os.cpu_count() or 1
     
     @api_exception_mechanism(max_retries=3)
     def generate_tool(self, task_name, task_description, tool_type, pre_tasks_info, relevant_code):
@@ -68,16 +131,50 @@ class FridayExecutor(BaseModule):
                 - code (str): The generated Python code for the tool.
                 - invoke (str): The specific logic or command to invoke the generated tool.
         """
+        sys_prompt, user_prompt = self.get_generate_prompts(task_name, task_description, tool_type, pre_tasks_info, relevant_code)
+        create_msg = send_chat_prompts(sys_prompt, user_prompt, self.llm)
+        return self.parse_generated_tool(create_msg, tool_type)
+
+    @api_exception_mechanism(max_retries=3)
+    async def agenerate_tool(self, task_name, task_description, tool_type, pre_tasks_info, relevant_code):
+        """
+        Asynchronous variant of `generate_tool`, awaiting the LLM instead of blocking on it.
+
+        Args:
+            task_name (str): The name of the task for which tool code is being generated.
+            task_description (str): A description of the task, detailing what the tool aims to accomplish.
+            tool_type (str): The type of tool being generated, such as 'Python', 'Shell', or 'AppleScript'.
+            pre_tasks_info (dict): Information about tasks that are prerequisites for the current task.
+            relevant_code (dict): A dictionary of code snippets relevant to the current task.
+
+        Returns:
+            tuple: The generated code and its invocation, as returned by `generate_tool`.
+        """
+        sys_prompt, user_prompt = self.get_generate_prompts(task_name, task_description, tool_type, pre_tasks_info, relevant_code)
+        create_msg = await asend_chat_prompts(sys_prompt, user_prompt, self.llm)
+        return self.parse_generated_tool(create_msg, tool_type)
+
+    def get_generate_prompts(self, task_name, task_description, tool_type, pre_tasks_info, relevant_code):
+        """
+        Formats the system and user prompts for generating the code of a tool.
+
+        Returns:
+            tuple: The system prompt and the user prompt.
+        """
         relevant_code = json.dumps(relevant_code)
-        if tool_type == 'Python':
-            sys_prompt = self.prompt['_SYSTEM_PYTHON_SKILL_AND_INVOKE_GENERATE_PROMPT']
+        if tool_type in ['Python', 'Map']:
+            if tool_type == 'Map':
+                sys_prompt = self.prompt['_SYSTEM_MAP_GENERATE_PROMPT']
+            else:
+                sys_prompt = self.prompt['_SYSTEM_PYTHON_SKILL_AND_INVOKE_GENERATE_PROMPT']
             user_prompt = self.prompt['_USER_PYTHON_SKILL_AND_INVOKE_GENERATE_PROMPT'].format(
                 system_version=self.system_version,
                 task_description=task_description,
                 working_dir= self.environment.working_dir,
                 task_name=task_name,
                 pre_tasks_info=pre_tasks_info,
-                relevant_code=relevant_code
+                relevant_code=relevant_code,
+                installed_modules=self.installed_modules()
             )
         else:
             sys_prompt = self.prompt['_SYSTEM_SHELL_APPLESCRIPT_GENERATE_PROMPT']
@@ -89,16 +186,82 @@ class FridayExecutor(BaseModule):
                 pre_tasks_info=pre_tasks_info,
                 Type=tool_type
             )
+        return sys_prompt, user_prompt
 
-        create_msg = send_chat_prompts(sys_prompt, user_prompt, self.llm)
-        code = self.extract_code(create_msg, tool_type)
-        if tool_type == 'Python':
+    def parse_generated_tool(self, create_msg, tool_type):
+        """
+        Extracts the code and, for Python and Map tools, the invocation from a generation response.
+
+        Returns:
+            tuple: The code and the invocation, empty for other tools.
+        """
+        if tool_type == 'Map':
+            code = self.extract_code(create_msg, 'Python')
+        else:
+            code = self.extract_code(create_msg, tool_type)
+        if tool_type in ['Python', 'Map']:
             invoke = self.extract_information(create_msg, begin_str='<invoke>', end_str='</invoke>')[0]
         else:
             invoke = ''
         return code, invoke
 
-    def execute_tool(self, code, invoke, node_type):
+    @api_exception_mechanism(max_retries=3)
+    def generate_invoke(self, task_name, task_description, code, pre_tasks_info):
+        """
+        Generates only the invocation of a stored Python tool for a task, so the stored code runs as it is.
+
+        Args:
+            task_name (str): The name of the task, which is also the name of the stored tool.
+            task_description (str): A description of the task.
+            code (str): The code of the stored tool.
+            pre_tasks_info (dict): Information about tasks that are prerequisites for the current task.
+
+        Returns:
+            str: The invocation of the tool.
+        """
+        sys_prompt, user_prompt = self.get_invoke_prompts(task_description, code, pre_tasks_info)
+        invoke_msg = send_chat_prompts(sys_prompt, user_prompt, self.llm)
+        return self.parse_invoke(invoke_msg)
+
+    @api_exception_mechanism(max_retries=3)
+    async def agenerate_invoke(self, task_name, task_description, code, pre_tasks_info):
+        """
+        Asynchronous variant of `generate_invoke`.
+        """
+        sys_prompt, user_prompt = self.get_invoke_prompts(task_description, code, pre_tasks_info)
+        invoke_msg = await asend_chat_prompts(sys_prompt, user_prompt, self.llm)
+        return self.parse_invoke(invoke_msg)
+
+    def get_invoke_prompts(self, task_description, code, pre_tasks_info):
+        """
+        Formats the system and user prompts for generating the invocation of a stored tool.
+
+        Returns:
+            tuple: The system prompt and the user prompt.
+        """
+        sys_prompt = self.prompt['_SYSTEM_PYTHON_INVOKE_GENERATE_PROMPT']
+        user_prompt = self.prompt['_USER_PYTHON_INVOKE_GENERATE_PROMPT'].format(
+            system_version=self.system_version,
+            working_dir=self.environment.working_dir,
+            task_description=task_description,
+            pre_tasks_info=pre_tasks_info,
+            code=code
+        )
+        return sys_prompt, user_prompt
+
+    def parse_invoke(self, invoke_msg):
+        """
+        Extracts the invocation from a response to the invoke prompts.
+
+        Raises:
+            ValueError: If the response holds no invocation.
+        """
+        invoke = self.extract_information(invoke_msg, begin_str='<invoke>', end_str='</invoke>')
+        if not invoke or not invoke[0].strip():
+            raise ValueError("No <invoke> block in the response.")
+        return invoke[0].strip()
+
+    def execute_tool(self, code, invoke, node_type, stored_tool=None):
         """
         Executes a given tool code and returns the execution state.
 
@@ -111,6 +274,8 @@ class FridayExecutor(BaseModule):
             code (str): The Python code to be executed as part of the tool.
             invoke (str): The specific command or function call that triggers the tool within the code.
             node_type (str): The type of the tool, determining how the tool is executed. Currently supports 'Code' type.
+            stored_tool (str, optional): The name of the stored tool the code belongs to. If the tool package holds
+                                         it with this code, the tool is imported from the package instead.
 
         Returns:
             state: The state object returned by the environments after executing the tool. This object contains
@@ -119,6 +284,170 @@ class FridayExecutor(BaseModule):
         Note:
             The execution logic is currently tailored for tools of type 'Code', where the code is directly executable
             Python code. The method is designed to be extensible for other tool types as needed.
+            While a trace is recorded the resulting state is added to it, and while a trace is replayed the
+            recorded state is returned without executing anything.
+        """
+        trace = get_current_trace()
+        if trace is not None and trace.replaying:
+            return self.replay_execution(trace, code, node_type)
+        start_time = time.perf_counter()
+        state = self.run_tool(code, invoke, node_type, stored_tool)
+        self.checkpoint_state = state if self.has_checkpoint else None
+        if trace is not None:
+            trace.record_step(code, node_type, state, time.perf_counter() - start_time)
+        return state
+
+    def run_tool(self, code, invoke, node_type, stored_tool=None):
+        """
+        Checks and runs the code of a tool, the actual execution behind `execute_tool`.
+
+        Args:
+            code (str): The code to be executed as part of the tool.
+            invoke (str): The specific command or function call that triggers the tool within the code.
+            node_type (str): The type of the tool, determining how the tool is executed.
+            stored_tool (str, optional): The name of the stored tool the code belongs to.
+
+        Returns:
+            state: The state of the execution.
+        """
+        self.checkpoint_working_dir()
+        state = self.check_before_execution(code, invoke, node_type)
+        if state is not None:
+            return state
+        code = self.build_executable_code(self.stored_tool_code(code, stored_tool), invoke, node_type)
+        # Snapshot the working dir so the prompts only need the changes made by the execution
+        fs_before = self.environment.snapshot_working_dir()
+
+        # Execute the code based on node_type
+        try:
+            if node_type == 'Python':
+                state = self.run_python_code(code)
+            elif node_type == 'Map':
+                # The tool fans out over its own process pool, so it runs in a fresh interpreter
+                state = self.run_python_code(code, use_workers=False)
+            elif node_type == 'Shell':
+                # For Shell commands, execute directly
+                state = self.run_shell_code(code)
+            else:
+                # For other node types, try to use the environment
+                state = self.environment.step(node_type, code, kernel_key=self.kernel_key())
+        except Exception as e:
+            # If there's an error, create a dummy state with the error message
+            state = SimpleState()
+            state.error = str(e)
+        return self.finish_execution(state, fs_before)
+
+    async def aexecute_tool(self, code, invoke, node_type, stored_tool=None):
+        """
+        Asynchronous variant of `execute_tool`.
+
+        Python and Shell code run as asyncio subprocesses, other code types through `Env.astep`, so the
+        event loop stays free while the code runs.
+
+        Args:
+            code (str): The code to be executed as part of the tool.
+            invoke (str): The specific command or function call that triggers the tool within the code.
+            node_type (str): The type of the tool, determining how the tool is executed.
+            stored_tool (str, optional): The name of the stored tool the code belongs to, see `execute_tool`.
+
+        Returns:
+            state: The state of the execution, as returned by `execute_tool`.
+        """
+        trace = get_current_trace()
+        if trace is not None and trace.replaying:
+            return self.replay_execution(trace, code, node_type)
+        start_time = time.perf_counter()
+        state = await self.arun_tool(code, invoke, node_type, stored_tool)
+        self.checkpoint_state = state if self.has_checkpoint else None
+        if trace is not None:
+            trace.record_step(code, node_type, state, time.perf_counter() - start_time)
+        return state
+
+    async def arun_tool(self, code, invoke, node_type, stored_tool=None):
+        """
+        Asynchronous variant of `run_tool`.
+        """
+        self.checkpoint_working_dir()
+        state = self.check_before_execution(code, invoke, node_type)
+        if state is not None:
+            return state
+        code = self.build_executable_code(self.stored_tool_code(code, stored_tool), invoke, node_type)
+        fs_before = self.environment.snapshot_working_dir()
+        try:
+            if node_type == 'Python':
+                state = await self.arun_python_code(code)
+            elif node_type == 'Map':
+                state = await self.arun_python_code(code, use_workers=False)
+            elif node_type == 'Shell':
+                state = await self.arun_shell_code(code)
+            else:
+                state = await self.environment.astep(node_type, code, kernel_key=self.kernel_key())
+        except Exception as e:
+            state = SimpleState()
+            state.error = str(e)
+        return self.finish_execution(state, fs_before)
+
+    def replay_execution(self, trace, code, node_type):
+        """
+        Returns the recorded state of an execution from a replayed trace.
+
+        Args:
+            trace (TraceReplayer): The trace being replayed.
+            code (str): The code of the tool.
+            node_type (str): The type of the tool.
+
+        Returns:
+            SimpleState: The recorded state.
+        """
+        self.checkpoint_state = None
+        state = SimpleState()
+        for field, value in trace.replay_step(code, node_type).items():
+            if value is not None:
+                setattr(state, field, value)
+        print("************************<state>**************************")
+        print(state)
+        print("************************</state>*************************")
+        return state
+
+    def checkpoint_working_dir(self):
+        """
+        Checkpoints the working directory before an execution, if rollback on failure is enabled.
+        """
+        self.has_checkpoint = self.rollback_on_failure and self.environment.checkpoint_working_dir()
+
+    def rollback_working_dir(self, state):
+        """
+        Undoes the changes an execution made to the working directory, if it was checkpointed.
+
+        Called by the agent when an execution was judged a failure, so that the repaired code or the new plan
+        starts from the state the failed code started from rather than from what it left half done. Only the
+        last execution can be rolled back; for any other the working directory is left as it is.
+
+        Args:
+            state: The state returned by the execution to undo.
+
+        Returns:
+            int: The number of entries removed or restored, 0 if nothing was rolled back.
+        """
+        if state is None or state is not self.checkpoint_state:
+            return 0
+        self.checkpoint_state = None
+        restored = self.environment.restore_working_dir() or 0
+        if restored:
+            print("Rolled back {} changed entries of the working directory.".format(restored))
+        return restored
+
+    def check_before_execution(self, code, invoke, node_type):
+        """
+        Prepares the working directory and statically checks the code before it is executed.
+
+        Args:
+            code (str): The code of the tool.
+            invoke (str): The invocation of the tool.
+            node_type (str): The type of the tool.
+
+        Returns:
+            SimpleState: The state of a rejected execution if the static check failed, otherwise None.
         """
         # Create working_dir/document directory if it doesn't exist
         if not os.path.exists("working_dir"):
@@ -141,65 +470,113 @@ class FridayExecutor(BaseModule):
             os.makedirs(os.path.join("working_dir", "agents"), exist_ok=True)
             print("Created working_dir/agents directory")
         
+        if node_type in ['Python', 'Map'] and self.wheelhouse is not None:
+            self.install_missing_modules(code)
+
+        # Reject code that cannot run before spawning anything, so the agent can go straight to repair
+        static_error = check_tool_code(code, invoke, node_type)
+        if not static_error:
+            return None
+        state = SimpleState()
+        state.error = "Static check failed before execution:\n" + static_error
+        state.static_check_failed = True
+        print("************************<state>**************************")
+        print(state)
+        print("************************</state>*************************")
+        return state
+
+    def installed_modules(self):
+        """
+        Returns the compact list of third-party modules generated Python code can import, for the prompts.
+
+        The modules the wheelhouse can install are listed as well, as they are installed before the code runs.
+        """
+        if self.module_index_size <= 0:
+            return "not listed"
+        installable = self.wheelhouse.modules() if self.wheelhouse is not None else ()
+        return self.module_index.summary(self.module_index_size, installable) or "none"
+
+    def install_missing_modules(self, code):
+        """
+        Installs the modules imported by Python code but missing from the interpreter, from the wheelhouse.
+
+        Modules the wheelhouse does not provide are left to the static check, which reports them as missing.
+
+        Args:
+            code (str): The Python code to be executed.
+
+        Returns:
+            list[str]: The modules installed.
+        """
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return []
+        missing = find_missing_modules(tree)
+        if not missing:
+            return []
+        installed = self.wheelhouse.install(missing)
+        if installed:
+            print("Installed {} from the wheelhouse.".format(", ".join(installed)))
+        return installed
+
+    def stored_tool_code(self, code, stored_tool):
+        """
+        Returns the code importing a stored tool from the tool package, or the code itself if the package does
+        not hold the tool with exactly this code.
+
+        Args:
+            code (str): The code of the tool.
+            stored_tool (str): The name of the stored tool, or None if the code is not a stored tool.
+
+        Returns:
+            str: The code to run before the invocation of the tool.
+        """
+        tool_package = getattr(self.tool_manager, 'tool_package', None)
+        if stored_tool is None or tool_package is None or not tool_package.has_tool(stored_tool, code):
+            return code
+        return tool_package.import_code(stored_tool)
+
+    def build_executable_code(self, code, invoke, node_type):
+        """
+        Appends the invocation of a Python tool and the printing of its result to the tool code.
+
+        The code of a Map tool is followed instead by the code calling its function on every item over a
+        process pool, see `build_map_code`.
+
+        Args:
+            code (str): The code of the tool.
+            invoke (str): The invocation of the tool.
+            node_type (str): The type of the tool.
+
+        Returns:
+            str: The code to execute.
+        """
         # print result info
         if node_type == 'Python':
             info = "\n" + '''print("<return>")''' + "\n" + "print(result)" +  "\n" + '''print("</return>")'''
             code = code + '\nresult=' + invoke + info
+        elif node_type == 'Map':
+            code = build_map_code(code, invoke, self.map_workers)
         # state = EnvState(command=code)
         print("************************<code>**************************")
         print(code)
         print("************************</code>*************************")
-        
-        # Create a simple state object
-        class SimpleState:
-            def __init__(self):
-                self.error = ""
-                self.result = ""
-                self.pwd = os.getcwd()
-                self.ls = ""
-                self.score = 0
-            
-            def __str__(self):
-                if self.error:
-                    return f"Error: {self.error}"
-                return f"Result: {self.result}"
-        
-        # Execute the code based on node_type
-        try:
-            if node_type == 'Python':
-                # Create a temporary Python file
-                with open("temp_code.py", "w") as f:
-                    f.write(code)
-                
-                # Execute the temporary file
-                result = subprocess.run([sys.executable, "temp_code.py"], capture_output=True, text=True)
-                
-                state = SimpleState()
-                
-                if result.returncode == 0:
-                    state.result = result.stdout
-                else:
-                    state.error = result.stderr
-                
-                # Clean up the temporary file
-                os.remove("temp_code.py")
-            elif node_type == 'Shell':
-                # For Shell commands, execute directly
-                result = subprocess.run(code, shell=True, capture_output=True, text=True)
-                
-                state = SimpleState()
-                
-                if result.returncode == 0:
-                    state.result = result.stdout
-                else:
-                    state.error = result.stderr
-            else:
-                # For other node types, try to use the environment
-                state = self.environment.step(node_type, code)
-        except Exception as e:
-            # If there's an error, create a dummy state with the error message
-            state = SimpleState()
-            state.error = str(e)
+        return code
+
+    def finish_execution(self, state, fs_before):
+        """
+        Records the working directory changes of an execution on its state and prints the state.
+
+        Args:
+            state: The state of the execution.
+            fs_before (dict): The snapshot of the working directory taken before the execution.
+
+        Returns:
+            state: The same state.
+        """
+        state.fs_diff = self.environment.working_dir_changes(fs_before)
+        self.externalize_outputs(state)
         
         print("************************<state>**************************")
         print(state)
@@ -207,6 +584,149 @@ class FridayExecutor(BaseModule):
         print("************************</state>*************************") 
         return state
 
+    def externalize_outputs(self, state):
+        """
+        Moves a large result or error of an execution to the artifact store, if it is enabled, leaving a preview
+        and a reference to the stored output on the state.
+
+        Args:
+            state: The state of the execution.
+
+        Returns:
+            state: The same state.
+        """
+        store = self.environment.artifact_store()
+        if store is not None:
+            state.result = store.externalize(state.result)
+            state.error = store.externalize(state.error)
+        return state
+
+    def run_python_code(self, code, use_workers=True):
+        """
+        Runs Python code in a fresh interpreter, or on a warm worker of the Python worker pool if it is enabled,
+        within the execution limits.
+
+        Args:
+            code (str): The Python code to run.
+            use_workers (bool): Whether the code may run on the Python worker pool.
+
+        Returns:
+            SimpleState: The output of the run.
+        """
+        if self.python_worker_pool is not None and use_workers:
+            return SimpleState.from_output(*self.python_worker_pool.run(
+                code, limits=self.limits, log_prefix=self.environment.output_log_prefix()))
+        # Create a temporary Python file
+        temp_code_path = os.path.join(self.scratch_dir or '.', "temp_code.py")
+        with open(temp_code_path, "w") as f:
+            f.write(code)
+        try:
+            # Execute the temporary file
+            result = run_with_limits([sys.executable, temp_code_path], self.limits, log_prefix=self.environment.output_log_prefix())
+        finally:
+            # Clean up the temporary file
+            os.remove(temp_code_path)
+        return SimpleState.from_output(*result)
+
+    async def arun_python_code(self, code, use_workers=True):
+        """
+        Asynchronous variant of `run_python_code`, running the interpreter as an asyncio subprocess.
+        """
+        if self.python_worker_pool is not None and use_workers:
+            return SimpleState.from_output(*await asyncio.to_thread(
+                self.python_worker_pool.run, code, limits=self.limits, log_prefix=self.environment.output_log_prefix()))
+        temp_code_path = os.path.join(self.scratch_dir or '.', "temp_code.py")
+        with open(temp_code_path, "w") as f:
+            f.write(code)
+        try:
+            result = await arun_with_limits([sys.executable, temp_code_path], self.limits, log_prefix=self.environment.output_log_prefix())
+        finally:
+            os.remove(temp_code_path)
+        return SimpleState.from_output(*result)
+
+    def run_shell_code(self, code):
+        """
+        Runs a shell script within the execution limits, in a new shell or in the shell session of the task
+        if `shell_session` is enabled.
+
+        Args:
+            code (str): The shell script to run.
+
+        Returns:
+            SimpleState: The output of the run.
+        """
+        if self.use_shell_session:
+            return SimpleState.from_output(*self.get_shell_session().run(code, log_prefix=self.environment.output_log_prefix()))
+        return SimpleState.from_output(*run_with_limits(code, self.limits, shell=True, log_prefix=self.environment.output_log_prefix()))
+
+    async def arun_shell_code(self, code):
+        """
+        Asynchronous variant of `run_shell_code`, running the script as an asyncio subprocess, or in the
+        shell session on a worker thread.
+        """
+        if self.use_shell_session:
+            return SimpleState.from_output(*await asyncio.to_thread(
+                self.get_shell_session().run, code, log_prefix=self.environment.output_log_prefix()))
+        return SimpleState.from_output(*await arun_with_limits(code, self.limits, shell=True, log_prefix=self.environment.output_log_prefix()))
+
+    def get_shell_session(self):
+        """
+        Returns the shell session of the current task, creating it on first use.
+        """
+        if self.shell_session is None:
+            self.shell_session = ShellSession()
+        return self.shell_session
+
+    def prewarm(self, languages):
+        """
+        Starts the processes running the code of the given languages in the background, so that the first step of
+        each finds them ready. Called while the task is being planned.
+
+        Python starts the idle kernels of the kernel pool of the environment, if it is enabled; Shell starts the
+        shell session of the task, if it is enabled. The Python worker pool starts its workers when it is created.
+
+        Args:
+            languages (list[str]): The languages, 'Python' or 'Shell'.
+        """
+        for language in languages:
+            if language == 'Python' and self.environment.kernel_pool is not None:
+                self.environment.kernel_pool.prewarm()
+            elif language == 'Shell' and self.use_shell_session:
+                self.get_shell_session().prewarm()
+
+    def warmup_metrics(self):
+        """
+        Returns the number of steps that found their process running and of those that had to start it, by language.
+        """
+        metrics = {}
+        if self.environment.kernel_pool is not None:
+            metrics['Python'] = self.environment.kernel_pool.metrics()
+        if self.shell_session is not None:
+            metrics['Shell'] = {"warm_hits": self.shell_session.warm_hits, "cold_starts": self.shell_session.cold_starts}
+        return metrics
+
+    def kernel_key(self):
+        """
+        Returns the affinity key of the pooled kernel running the steps of the current task, or None without
+        kernel affinity. The executor of every concurrent task is a distinct object, so its identity is the key.
+        """
+        return id(self) if self.kernel_affinity else None
+
+    def release_kernel(self):
+        """
+        Returns the pooled kernel of the task to the kernel pool, so that the next task starts from a clean kernel.
+        """
+        if self.kernel_affinity:
+            self.environment.release_kernel(self.kernel_key())
+
+    def close_shell_session(self):
+        """
+        Stops the shell session of the task, if any, so that the next task starts with a fresh shell.
+        """
+        if self.shell_session is not None:
+            self.shell_session.close()
+            self.shell_session = None
+
     @api_exception_mechanism(max_retries=3)
     def judge_tool(self, code, task_description, state, next_action):
         """
@@ -229,6 +749,35 @@ class FridayExecutor(BaseModule):
                 - judge (bool): The LLM's judgment on whether the tool successfully completed the task.
                 - score (float): A score representing the effectiveness of the tool.
         """
+        sys_prompt, user_prompt = self.get_judge_prompts(code, task_description, state, next_action)
+        response = send_chat_prompts(sys_prompt, user_prompt, self.llm)
+        return self.parse_judgement(response)
+
+    @api_exception_mechanism(max_retries=3)
+    async def ajudge_tool(self, code, task_description, state, next_action):
+        """
+        Asynchronous variant of `judge_tool`, awaiting the LLM instead of blocking on it.
+
+        Args:
+            code (str): The code of the tool that was executed.
+            task_description (str): The description of the task the tool was intended to complete.
+            state: The state object returned after executing the tool.
+            next_action (str): The name of the next expected tool in the sequence.
+
+        Returns:
+            tuple: The reasoning, status and score, as returned by `judge_tool`.
+        """
+        sys_prompt, user_prompt = self.get_judge_prompts(code, task_description, state, next_action)
+        response = await asend_chat_prompts(sys_prompt, user_prompt, self.llm)
+        return self.parse_judgement(response)
+
+    def get_judge_prompts(self, code, task_description, state, next_action):
+        """
+        Formats the system and user prompts for judging an executed tool.
+
+        Returns:
+            tuple: The system prompt and the user prompt.
+        """
         next_action = json.dumps(next_action)
         sys_prompt = self.prompt['_SYSTEM_TASK_JUDGE_PROMPT']
         user_prompt = self.prompt['_USER_TASK_JUDGE_PROMPT'].format(
@@ -237,11 +786,19 @@ class FridayExecutor(BaseModule):
             code_output=state.result[:999] if len(state.result) > 1000 else state.result,
             current_working_dir=state.pwd,
             working_dir=self.environment.working_dir,
-            files_and_folders=state.ls,
+            working_dir_changes=state.fs_diff,
             next_action=next_action,
             code_error=state.error,
         )
-        response = send_chat_prompts(sys_prompt, user_prompt, self.llm)
+        return sys_prompt, user_prompt
+
+    def parse_judgement(self, response):
+        """
+        Extracts the reasoning, status and score from a judge response.
+
+        Raises:
+            ValueError: If the response does not contain the expected keys.
+        """
         judge_json = self.extract_json_from_string(response) 
         print("************************<judge_json>**************************")
         print(judge_json)
@@ -255,6 +812,57 @@ class FridayExecutor(BaseModule):
             raise ValueError("Missing key in judge module output: {}".format(e))
         return reasoning, status, score
 
+    @api_exception_mechanism(max_retries=3)
+    def judge_tools(self, judge_items):
+        """
+        Evaluates several independent executed tools with a single LLM call.
+
+        The fixed part of the judge prompt is sent once, followed by one compact block per tool. The
+        LLM returns a list of verdicts in the same order as the tools, so the round trip and the prompt
+        preamble are amortized over the whole batch.
+
+        Args:
+            judge_items (list[dict]): One dictionary per tool with the keys 'code', 'task_description',
+                                      'state' and 'next_action', as they would be passed to `judge_tool`.
+
+        Returns:
+            list[tuple]: One (reasoning, status, score) tuple per item, in the order of `judge_items`.
+
+        Raises:
+            ValueError: If the LLM response does not contain one well-formed verdict per item.
+        """
+        subtasks = []
+        for index, item in enumerate(judge_items, start=1):
+            state = item['state']
+            subtasks.append(self.prompt['_USER_TASK_BATCH_JUDGE_ITEM_PROMPT'].format(
+                index=index,
+                current_code=item['code'],
+                task=item['task_description'],
+                code_output=state.result[:999] if len(state.result) > 1000 else state.result,
+                code_error=state.error,
+                current_working_dir=state.pwd,
+                working_dir_changes=state.fs_diff,
+                next_action=json.dumps(item['next_action']),
+            ))
+        sys_prompt = self.prompt['_SYSTEM_TASK_BATCH_JUDGE_PROMPT']
+        user_prompt = self.prompt['_USER_TASK_BATCH_JUDGE_PROMPT'].format(
+            working_dir=self.environment.working_dir,
+            subtasks=''.join(subtasks),
+        )
+        response = send_chat_prompts(sys_prompt, user_prompt, self.llm)
+        judge_json = self.extract_json_from_string(response)
+        print("************************<judge_json>**************************")
+        print(judge_json)
+        print("************************</judge_json>*************************")
+        try:
+            verdicts = judge_json['verdicts']
+            if len(verdicts) != len(judge_items):
+                raise ValueError("Expected {} verdicts, got {}".format(len(judge_items), len(verdicts)))
+            return [(verdict['reasoning'], verdict['status'], verdict['score']) for verdict in verdicts]
+        except (KeyError, TypeError) as e:
+            print("The judge module did not output in the specified format.")
+            raise ValueError("Missing key in batch judge module output: {}".format(e))
+
     @api_exception_mechanism(max_retries=3)
     def repair_tool(self, current_code, task_description, tool_type, state, critique, pre_tasks_info):
         """
@@ -278,8 +886,42 @@ class FridayExecutor(BaseModule):
                 - new_code (str): The amended code for the tool.
                 - invoke (str): The command or logic to invoke the amended tool.
         """
-        if tool_type == 'Python':
-            sys_prompt = self.prompt['_SYSTEM_PYTHON_SKILL_AMEND_AND_INVOKE_PROMPT']
+        sys_prompt, user_prompt = self.get_repair_prompts(current_code, task_description, tool_type, state, critique, pre_tasks_info)
+        amend_msg = send_chat_prompts(sys_prompt, user_prompt, self.llm)
+        return self.parse_repaired_tool(amend_msg, tool_type)
+
+    @api_exception_mechanism(max_retries=3)
+    async def arepair_tool(self, current_code, task_description, tool_type, state, critique, pre_tasks_info):
+        """
+        Asynchronous variant of `repair_tool`, awaiting the LLM instead of blocking on it.
+
+        Args:
+            current_code (str): The original code of the tool that requires amendment.
+            task_description (str): The description of the task the tool is intended to complete.
+            tool_type (str): The type of tool being amended, such as 'Python', 'Shell', or 'AppleScript'.
+            state: The state object containing details about the tool's execution outcome.
+            critique (str): Feedback or critique on the tool's execution, used to guide the amendment.
+            pre_tasks_info (dict): Information about tasks that are prerequisites for the current task.
+
+        Returns:
+            tuple: The amended code and its invocation, as returned by `repair_tool`.
+        """
+        sys_prompt, user_prompt = self.get_repair_prompts(current_code, task_description, tool_type, state, critique, pre_tasks_info)
+        amend_msg = await asend_chat_prompts(sys_prompt, user_prompt, self.llm)
+        return self.parse_repaired_tool(amend_msg, tool_type)
+
+    def get_repair_prompts(self, current_code, task_description, tool_type, state, critique, pre_tasks_info):
+        """
+        Formats the system and user prompts for amending the code of a tool.
+
+        Returns:
+            tuple: The system prompt and the user prompt.
+        """
+        if tool_type in ['Python', 'Map']:
+            if tool_type == 'Map':
+                sys_prompt = self.prompt['_SYSTEM_MAP_AMEND_PROMPT']
+            else:
+                sys_prompt = self.prompt['_SYSTEM_PYTHON_SKILL_AMEND_AND_INVOKE_PROMPT']
             user_prompt = self.prompt['_USER_PYTHON_SKILL_AMEND_AND_INVOKE_PROMPT'].format(
                 original_code = current_code,
                 task = task_description,
@@ -287,9 +929,10 @@ class FridayExecutor(BaseModule):
                 code_output = state.result,
                 current_working_dir = state.pwd,
                 working_dir= self.environment.working_dir,
-                files_and_folders = state.ls,
+                working_dir_changes = state.fs_diff,
                 critique = critique,
-                pre_tasks_info = pre_tasks_info
+                pre_tasks_info = pre_tasks_info,
+                installed_modules = self.installed_modules()
             )
         elif tool_type in ['Shell', 'AppleScript']:
             sys_prompt = self.prompt['_SYSTEM_SHELL_APPLESCRIPT_AMEND_PROMPT']
@@ -300,15 +943,48 @@ class FridayExecutor(BaseModule):
                 code_output = state.result,
                 current_working_dir = state.pwd,
                 working_dir= self.environment.working_dir,
-                files_and_folders = state.ls,
+                working_dir_changes = state.fs_diff,
                 critique = critique,
                 pre_tasks_info = pre_tasks_info
             )
-        amend_msg = send_chat_prompts(sys_prompt, user_prompt, self.llm)
-        new_code = self.extract_python_code(amend_msg)
-        invoke = self.extract_information(amend_msg, begin_str='<invoke>', end_str='</invoke>')[0]
+        return sys_prompt, user_prompt
+
+    def parse_repaired_tool(self, amend_msg, tool_type):
+        """
+        Extracts the amended code and, for Python and Map tools, its invocation from a repair response.
+
+        Returns:
+            tuple: The amended code and the invocation, empty for other tools.
+        """
+        if tool_type in ['Python', 'Map']:
+            new_code = self.extract_python_code(amend_msg)
+            invoke = self.extract_information(amend_msg, begin_str='<invoke>', end_str='</invoke>')[0]
+        else:
+            new_code = self.extract_code(amend_msg, tool_type)
+            invoke = ''
         return new_code, invoke
 
+    def auto_repair_tool(self, code, invoke, tool_type, state):
+        """
+        Repairs mechanical errors in a failed tool locally, without an LLM round trip.
+
+        Missing imports, mis-capitalized names in the invocation and relative paths that only exist under
+        the working directory are fixed by rules, based on the error of the failed execution. Only Python
+        and Map tools are supported.
+
+        Args:
+            code (str): The code of the tool that failed.
+            invoke (str): The invocation of the tool.
+            tool_type (str): The type of the tool.
+            state: The state object returned by the failed execution.
+
+        Returns:
+            tuple: The fixed (code, invoke), or None if no rule applies and the LLM has to repair the tool.
+        """
+        if tool_type not in ['Python', 'Map'] or not invoke or state is None:
+            return None
+        return auto_fix_tool(code, invoke, state.error, self.environment.working_dir)
+
     @api_exception_mechanism(max_retries=3)
     def analysis_tool(self, code, task_description, state):
         """
@@ -336,7 +1012,7 @@ class FridayExecutor(BaseModule):
             code_error=state.error,
             current_working_dir=state.pwd,
             working_dir= self.environment.working_dir,
-            files_and_folders= state.ls
+            working_dir_changes= state.fs_diff
         )
 
         response = send_chat_prompts(sys_prompt, user_prompt, self.llm)
@@ -365,7 +1041,11 @@ class FridayExecutor(BaseModule):
             - Adds a new tool to the tool library if it doesn't already exist.
             - Saves tool details to the filesystem and updates the tool library's database.
             - Outputs a message if the tool already exists in the library.
+
+        Nothing is stored while a trace is replayed, as a replayed run has no side effects.
         """
+        if is_replaying():
+            return
         # If tool not in db.
         if not self.tool_manager.exist_tool(tool):
             # Implement tool storage logic and store new tools
@@ -409,6 +1089,144 @@ class FridayExecutor(BaseModule):
         code = self.extract_python_code(response)
         return code 
     
+    def can_call_api(self, api_path):
+        """
+        Returns whether an API can be called directly with JSON arguments, which excludes file uploads.
+        """
+        operation = self.open_api_registry.api_operation(api_path)
+        return operation is not None and operation['content_type'] != 'multipart/form-data'
+
+    @api_exception_mechanism(max_retries=3)
+    def generate_api_args(self, description, api_path, context="No context provided."):
+        """
+        Generates the arguments of an API call as JSON, validated against the schema of the API.
+
+        Args:
+            description (str): A description of the task to be performed by the API call.
+            api_path (str): The path or endpoint of the API to be called.
+            context (str, optional): Additional context to be included in the API call. Defaults to "No context provided.".
+
+        Returns:
+            dict: The arguments of the call.
+        """
+        sys_prompt, user_prompt = self.get_api_args_prompts(description, api_path, context)
+        response = send_chat_prompts(sys_prompt, user_prompt, self.llm)
+        return self.parse_api_args(response, api_path)
+
+    @api_exception_mechanism(max_retries=3)
+    async def agenerate_api_args(self, description, api_path, context="No context provided."):
+        """
+        Asynchronous variant of `generate_api_args`.
+        """
+        sys_prompt, user_prompt = self.get_api_args_prompts(description, api_path, context)
+        response = await asend_chat_prompts(sys_prompt, user_prompt, self.llm)
+        return self.parse_api_args(response, api_path)
+
+    def get_api_args_prompts(self, description, api_path, context):
+        """
+        Formats the system and user prompts for generating the arguments of an API call.
+
+        Returns:
+            tuple: The system prompt and the user prompt.
+        """
+        sys_prompt = self.prompt['_SYSTEM_API_ARGS_PROMPT'].format(
+            openapi_doc = json.dumps(self.generate_openapi_doc(api_path)),
+            tool_sub_task = description,
+            context = context
+        )
+        return sys_prompt, self.prompt['_USER_API_ARGS_PROMPT']
+
+    def parse_api_args(self, response, api_path):
+        """
+        Extracts the JSON arguments of an API call from a response and validates them.
+
+        Raises:
+            ValueError: If the response holds no JSON or the arguments do not match the schema of the API.
+        """
+        try:
+            args = json.loads(self.extract_code(response, 'json'))
+        except NotImplementedError:
+            args = json.loads(response.strip())
+        errors = self.open_api_registry.validate_args(api_path, args)
+        if errors:
+            raise ValueError("Invalid arguments for {}:\n{}".format(api_path, "\n".join(errors)))
+        return args
+
+    def execute_api(self, api_path, args):
+        """
+        Calls an API with the given arguments in-process and returns the execution state.
+
+        Like `execute_tool`, the call is recorded in the current trace, and replayed from it without calling
+        the API.
+
+        Args:
+            api_path (str): The path of the API.
+            args (dict): The arguments of the call, as returned by `generate_api_args`.
+
+        Returns:
+            SimpleState: The response of the API as the result, or the error of the call.
+        """
+        code = json.dumps({'api_path': api_path, 'args': args}, ensure_ascii=False)
+        trace = get_current_trace()
+        if trace is not None and trace.replaying:
+            return self.replay_execution(trace, code, 'API')
+        start_time = time.perf_counter()
+        state = self.call_api(api_path, args)
+        self.checkpoint_state = None
+        if trace is not None:
+            trace.record_step(code, 'API', state, time.perf_counter() - start_time)
+        return state
+
+    async def aexecute_api(self, api_path, args):
+        """
+        Asynchronous variant of `execute_api`, calling the API on a worker thread.
+        """
+        code = json.dumps({'api_path': api_path, 'args': args}, ensure_ascii=False)
+        trace = get_current_trace()
+        if trace is not None and trace.replaying:
+            return self.replay_execution(trace, code, 'API')
+        start_time = time.perf_counter()
+        state = await asyncio.to_thread(self.call_api, api_path, args)
+        self.checkpoint_state = None
+        if trace is not None:
+            trace.record_step(code, 'API', state, time.perf_counter() - start_time)
+        return state
+
+    def call_api(self, api_path, args):
+        """
+        Sends an API request through the shared HTTP session, within the timeout and output cap of the
+        execution limits.
+
+        Args:
+            api_path (str): The path of the API.
+            args (dict): The arguments of the call.
+
+        Returns:
+            SimpleState: The body of the response as the result, or the error of the call.
+        """
+        operation = self.open_api_registry.api_operation(api_path)
+        state = SimpleState()
+        try:
+            response = get_tool_request_util().send(
+                api_path, operation['method'], args,
+                content_type=operation['content_type'] or 'application/json',
+                timeout=self.limits.timeout,
+            )
+        except Exception as e:
+            state.error = "http request error: {}".format(e)
+        else:
+            body = OutputCapture(self.limits.max_output_bytes)
+            body.write(response.content)
+            if response.status_code >= 400:
+                state.error = "HTTP {} error: {}".format(response.status_code, body.getvalue())
+            else:
+                state.result = body.getvalue()
+        self.externalize_outputs(state)
+        print("************************<state>**************************")
+        print(state)
+        print("************************</state>*************************")
+        return state
+
     def question_and_answer_tool(self, context, question, current_question=None):
         sys_prompt = self.prompt['_SYSTEM_QA_PROMPT']
         user_prompt = self.prompt['_USER_QA_PROMPT'].format(
@@ -609,10 +1427,9 @@ class FridayExecutor(BaseModule):
         """
         Generates a reduced OpenAPI documentation for a specific API path from the full OpenAPI documentation.
 
-        This method isolates and extracts the documentation for a specific tool API path, including its
-        schemas and operations (GET, POST), from the entire OpenAPI documentation stored in the instance.
-        It constructs a new, smaller OpenAPI document that only includes details relevant to the specified API path.
-        If the API path does not exist in the full documentation, it returns an error message.
+        The reduced documents are precomputed by the OpenAPI registry when the documents in `open_api_docs`
+        are loaded, so this is a lookup. Each includes the schemas and operations (GET, POST) of the path only.
+        If the API path does not exist in the documentation, it returns an error message.
 
         Args:
             tool_api_path (str): The specific API path for which the OpenAPI documentation should be generated.
@@ -620,50 +1437,6 @@ class FridayExecutor(BaseModule):
         Returns:
             dict: A dictionary representing the OpenAPI documentation for the specific API path. If the path is not
                 found, returns a dictionary with an error message.
-        
-        The method performs several checks:
-        - Verifies the existence of the tool API path in the full OpenAPI documentation.
-        - Extracts relevant parts of the OpenAPI schema related to the path.
-        - Includes any referenced schemas necessary for understanding the API's structure and data types.
-
-        It handles both JSON and multipart/form-data content types in API request bodies, searching for schema references
-        to include in the returned documentation. This enables the resulting API document to be self-contained with respect
-        to the schemas needed to understand the API's usage.
-        """
-        # init current api's doc
-        curr_api_doc = {}
-        curr_api_doc["openapi"] = self.open_api_doc["openapi"]
-        curr_api_doc["info"] = self.open_api_doc["info"]
-        curr_api_doc["paths"] = {}
-        curr_api_doc["components"] = {"schemas":{}}
-        api_path_doc = {}
-        #extract path and schema
-        if tool_api_path not in self.open_api_doc["paths"]:
-            curr_api_doc = {"error": "The api is not existed"}
-            return curr_api_doc
-        api_path_doc = self.open_api_doc["paths"][tool_api_path]
-        curr_api_doc["paths"][tool_api_path] = api_path_doc
-        find_ptr = {}
-        if "get" in api_path_doc:
-            findptr  = api_path_doc["get"]
-        elif "post" in api_path_doc:
-            findptr = api_path_doc["post"]
-        api_params_schema_ref = ""
-        # json格式
-        if (("requestBody" in findptr) and 
-        ("content" in findptr["requestBody"]) and 
-        ("application/json" in findptr["requestBody"]["content"]) and 
-        ("schema" in findptr["requestBody"]["content"]["application/json"]) and 
-        ("$ref" in findptr["requestBody"]["content"]["application/json"]["schema"])):
-            api_params_schema_ref = findptr["requestBody"]["content"]["application/json"]["schema"]["$ref"]
-        elif (("requestBody" in findptr) and 
-        ("content" in findptr["requestBody"]) and 
-        ("multipart/form-data" in findptr["requestBody"]["content"]) and 
-        ("schema" in findptr["requestBody"]["content"]["multipart/form-data"]) and 
-        ("allOf" in findptr["requestBody"]["content"]["multipart/form-data"]["schema"]) and 
-        ("$ref" in findptr["requestBody"]["content"]["multipart/form-data"]["schema"]["allOf"][0])):
-            api_params_schema_ref = findptr["requestBody"]["content"]["multipart/form-data"]["schema"]["allOf"][0]["$ref"]
-        if api_params_schema_ref != None and api_params_schema_ref != "":
-            curr_api_doc["components"]["schemas"][api_params_schema_ref.split('/')[-1]] = self.open_api_doc["components"]["schemas"][api_params_schema_ref.split('/')[-1]]
-        return curr_api_doc
+        """
+        return self.open_api_registry.path_doc(tool_api_path)
 
@@ -0,0 +1,87 @@
+import ast
+
+
+# Appended to the code of a Map tool: calls the per-item function on every item over a process pool.
+# The pool is started under the __main__ guard, so that worker processes importing the script do not run it.
+MAP_DRIVER = '''
+
+def _map_item(item):
+    try:
+        return True, {function}(item)
+    except Exception as e:
+        return False, "{{}}: {{}}".format(type(e).__name__, e)
+
+
+if __name__ == "__main__":
+    import sys as _sys
+    from concurrent.futures import ProcessPoolExecutor as _ProcessPoolExecutor
+    _items = list({items})
+    _workers = max(1, min({max_workers}, len(_items)))
+    if _workers == 1:
+        _outcomes = [_map_item(_item) for _item in _items]
+    else:
+        with _ProcessPoolExecutor(_workers) as _pool:
+            _outcomes = list(_pool.map(_map_item, _items, chunksize=max(1, len(_items) // (_workers * 4))))
+    _failures = [(_item, _error) for _item, (_ok, _error) in zip(_items, _outcomes) if not _ok]
+    if _failures:
+        print("{{}} of {{}} items failed:".format(len(_failures), len(_items)), file=_sys.stderr)
+        for _item, _error in _failures[:{max_failures}]:
+            print("{{!r}}: {{}}".format(_item, _error), file=_sys.stderr)
+        if len(_failures) > {max_failures}:
+            print("... and {{}} more".format(len(_failures) - {max_failures}), file=_sys.stderr)
+        _sys.exit(1)
+    result = [{{"item": _item, "result": _value}} for _item, (_ok, _value) in zip(_items, _outcomes)]
+    print("<return>")
+    print(result)
+    print("</return>")
+'''
+
+# The number of failed items whose error is reported
+MAX_REPORTED_FAILURES = 20
+
+
+def parse_map_invoke(invoke):
+    """
+    Splits the invocation of a Map tool into the name of its per-item function and the expression of its items.
+
+    A Map tool is invoked like a function called with the list of all items as its only argument, e.g.
+    `convert_file([os.path.join(folder, name) for name in os.listdir(folder)])`. The function itself is
+    called once per item.
+
+    Args:
+        invoke (str): The invocation of the Map tool.
+
+    Returns:
+        tuple: The function name and the source of the items expression.
+
+    Raises:
+        ValueError: If the invocation is not a call of a function by name with exactly one argument.
+    """
+    invoke = invoke.strip()
+    try:
+        call = ast.parse(invoke, mode='eval').body
+    except SyntaxError as e:
+        raise ValueError("SyntaxError in invoke `{}`: {}".format(invoke, e.msg))
+    if not (isinstance(call, ast.Call) and isinstance(call.func, ast.Name) and len(call.args) == 1 and not call.keywords):
+        raise ValueError("The invoke `{}` of a Map tool must call its function with the list of items as its only argument".format(invoke))
+    return call.func.id, ast.get_source_segment(invoke, call.args[0])
+
+
+def build_map_code(code, invoke, max_workers):
+    """
+    Builds the script running a Map tool over its items in parallel.
+
+    Every item is processed in a worker process and the results are printed in the order of the items, like
+    the result of a Python tool. If any item fails, the script exits with an error listing the failed items.
+
+    Args:
+        code (str): The code of the Map tool, defining the per-item function.
+        invoke (str): The invocation of the Map tool, see `parse_map_invoke`.
+        max_workers (int): The maximum number of worker processes.
+
+    Returns:
+        str: The script to execute.
+    """
+    function, items = parse_map_invoke(invoke)
+    return code + MAP_DRIVER.format(function=function, items=items, max_workers=int(max_workers),
+                                    max_failures=MAX_REPORTED_FAILURES)
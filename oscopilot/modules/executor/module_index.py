@@ -0,0 +1,182 @@
+import os
+import re
+import sys
+import pkgutil
+import zipfile
+import importlib
+import subprocess
+
+
+# Wheel file names: {distribution}-{version}(-{build})?-{python}-{abi}-{platform}.whl
+WHEEL_NAME_PATTERN = re.compile(r"^(?P<name>[^-]+)-(?P<version>[^-]+)(-\d[^-]*)?-[^-]+-[^-]+-[^-]+\.whl$")
+
+PIP_INSTALL_TIMEOUT = 300
+
+
+class ModuleIndex:
+    """
+    An index of the top-level modules importable by the interpreter that executes generated code.
+
+    Generated code is executed by this same interpreter (`sys.executable`), so the index is built in-process
+    from `sys.path`. It is cached and rebuilt only when a directory of `sys.path` changes, which is the case
+    when a package is installed.
+
+    Attributes:
+        names (set[str]): The importable top-level modules, built-in modules included.
+    """
+
+    def __init__(self):
+        self.names = set()
+        self.signature = None
+
+    def refresh(self):
+        """
+        Rebuilds the index if a directory of `sys.path` changed since it was built.
+        """
+        signature = path_signature()
+        if signature == self.signature:
+            return
+        importlib.invalidate_caches()
+        names = set(sys.builtin_module_names)
+        names.update(module.name for module in pkgutil.iter_modules())
+        self.names, self.signature = names, signature
+
+    def third_party(self):
+        """
+        Returns the importable modules that are not part of the standard library, sorted.
+        """
+        self.refresh()
+        stdlib = getattr(sys, 'stdlib_module_names', frozenset())
+        return sorted(name for name in self.names
+                      if name not in stdlib and not name.startswith('_') and name.isidentifier())
+
+    def summary(self, limit, extra=()):
+        """
+        Returns a compact list of the third-party modules for codegen prompts.
+
+        Args:
+            limit (int): The maximum number of modules listed.
+            extra (iterable): Modules that are not installed but can be installed on demand.
+
+        Returns:
+            str: The comma-separated module names, with a count of the modules left out if there are more.
+        """
+        names = sorted(set(self.third_party()) | set(extra))
+        if len(names) <= limit:
+            return ", ".join(names)
+        return "{} (and {} more)".format(", ".join(names[:limit]), len(names) - limit)
+
+
+class Wheelhouse:
+    """
+    A local directory of wheels that missing modules are installed from, without network access.
+
+    The top-level modules provided by every wheel are read from its `top_level.txt` metadata, or from its
+    file list when the wheel has none. The index is rebuilt when the directory changes.
+
+    Attributes:
+        directory (str): The wheelhouse directory.
+        providers (dict): The wheel file providing every top-level module, by module name.
+    """
+
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        self.providers = {}
+        self.mtime = None
+
+    def refresh(self):
+        """
+        Rebuilds the index of the wheels if the directory changed since it was built.
+        """
+        try:
+            mtime = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            self.providers, self.mtime = {}, None
+            return
+        if mtime == self.mtime:
+            return
+        providers = {}
+        for file_name in sorted(os.listdir(self.directory)):
+            if not WHEEL_NAME_PATTERN.match(file_name):
+                continue
+            for module in wheel_top_level_modules(os.path.join(self.directory, file_name)):
+                providers.setdefault(module, file_name)
+        self.providers, self.mtime = providers, mtime
+
+    def modules(self):
+        """
+        Returns the top-level modules the wheelhouse can install.
+        """
+        self.refresh()
+        return set(self.providers)
+
+    def install(self, modules):
+        """
+        Installs the wheels providing the given modules into the executing interpreter, from the wheelhouse only.
+
+        Dependencies are resolved by pip within the wheelhouse as well.
+
+        Args:
+            modules (list[str]): The missing top-level modules.
+
+        Returns:
+            list[str]: The modules whose wheels were installed. Modules without a wheel are left out.
+        """
+        self.refresh()
+        available = [module for module in modules if module in self.providers]
+        if not available:
+            return []
+        distributions = sorted({WHEEL_NAME_PATTERN.match(self.providers[module]).group('name') for module in available})
+        command = [sys.executable, '-m', 'pip', 'install', '--no-index', '--find-links', self.directory, *distributions]
+        try:
+            completed = subprocess.run(command, capture_output=True, text=True, timeout=PIP_INSTALL_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            print("Could not install {} from the wheelhouse: {}".format(", ".join(distributions), e))
+            return []
+        if completed.returncode != 0:
+            print("Could not install {} from the wheelhouse:\n{}".format(", ".join(distributions), completed.stderr.strip()))
+            return []
+        importlib.invalidate_caches()
+        return available
+
+
+def wheel_top_level_modules(path):
+    """
+    Returns the top-level modules provided by a wheel.
+
+    Args:
+        path (str): The wheel file.
+
+    Returns:
+        list[str]: The module names, empty if the wheel cannot be read.
+    """
+    try:
+        with zipfile.ZipFile(path) as wheel:
+            file_names = wheel.namelist()
+            top_level = [name for name in file_names if name.endswith('.dist-info/top_level.txt')]
+            if top_level:
+                return [line.strip() for line in wheel.read(top_level[0]).decode('utf-8').splitlines() if line.strip()]
+    except (OSError, zipfile.BadZipFile, UnicodeDecodeError):
+        return []
+    modules = []
+    for name in file_names:
+        first = name.split('/')[0]
+        if first.endswith(('.dist-info', '.data')):
+            continue
+        module = first[:-3] if first.endswith('.py') and '/' not in name else first.split('.')[0]
+        if module.isidentifier() and module not in modules:
+            modules.append(module)
+    return modules
+
+
+def path_signature():
+    """
+    Returns the modification times of the directories of `sys.path`, which change when a package is installed.
+    """
+    signature = []
+    for entry in sys.path:
+        try:
+            signature.append((entry, os.stat(entry or '.').st_mtime_ns))
+        except OSError:
+            signature.append((entry, None))
+    return tuple(signature)
@@ -2,7 +2,8 @@ from oscopilot.tool_repository.manager.action_node import ActionNode
 from collections import defaultdict, deque
 from oscopilot.modules.base_module import BaseModule
 from oscopilot.tool_repository.manager.tool_manager import get_open_api_description_pair
-from oscopilot.utils.utils import send_chat_prompts, api_exception_mechanism
+from oscopilot.utils.utils import send_chat_prompts, asend_chat_prompts, api_exception_mechanism
+from oscopilot.utils.config import Config
 import json
 import sys
 import logging
@@ -21,6 +22,8 @@ class FridayPlanner(BaseModule):
         self.prompt = prompt
         self.tool_graph = defaultdict(list)
         self.sub_task_list = []
+        # Whether plans may contain Map subtasks, run over a process pool by the executor
+        self.map_subtasks = bool(Config.get_parameter('map_subtasks'))
 
     def reset_plan(self):
         """
@@ -50,11 +53,110 @@ class FridayPlanner(BaseModule):
             Updates the tool graph with the decomposed subtasks and reorders tools based on
             dependencies through topological sorting.
         """
+        sys_prompt = self.with_map_prompt(self.prompt['_SYSTEM_TASK_DECOMPOSE_PROMPT'])
+        user_prompt = self.get_decompose_user_prompt(task, tool_description_pair)
+        response = send_chat_prompts(sys_prompt, user_prompt, self.llm, prefix="Overall")
+        self.build_plan(response)
+
+    @api_exception_mechanism(max_retries=3)
+    async def adecompose_task(self, task, tool_description_pair):
+        """
+        Asynchronous variant of `decompose_task`, awaiting the LLM instead of blocking on it.
+
+        Args:
+            task (str): The complex task to be decomposed.
+            tool_description_pair (dict): A dictionary mapping tool names to their descriptions.
+        """
+        sys_prompt = self.with_map_prompt(self.prompt['_SYSTEM_TASK_DECOMPOSE_PROMPT'])
+        user_prompt = self.get_decompose_user_prompt(task, tool_description_pair)
+        response = await asend_chat_prompts(sys_prompt, user_prompt, self.llm, prefix="Overall")
+        self.build_plan(response)
+
+    @api_exception_mechanism(max_retries=3)
+    def decompose_task_fast(self, task, tool_description_pair):
+        """
+        Decomposes a task and, when the plan is a single code subtask, generates its code in the same LLM call.
+
+        The decomposition prompt is extended with fast path requirements: if the task can be completed by
+        one Python or Shell subtask, the model also writes the code (and, for Python, the invocation) of
+        that subtask. The code is attached to the subtask's node so the executor can run it without a
+        separate generation call. Otherwise the response is an ordinary decomposition.
+
+        Args:
+            task (str): The complex task to be decomposed.
+            tool_description_pair (dict): A dictionary mapping tool names to their descriptions.
+
+        Side Effects:
+            Updates the tool graph like `decompose_task`, and sets `_code` and `_invoke` on the node of
+            a single-subtask plan when the response contains its code.
+        """
+        sys_prompt = self.with_map_prompt(self.prompt['_SYSTEM_TASK_DECOMPOSE_PROMPT']) + self.prompt['_SYSTEM_TASK_FAST_PATH_PROMPT']
+        user_prompt = self.get_decompose_user_prompt(task, tool_description_pair)
+        response = send_chat_prompts(sys_prompt, user_prompt, self.llm, prefix="Overall")
+        self.build_plan(response)
+        self.attach_fast_path_code(response)
+
+    @api_exception_mechanism(max_retries=3)
+    async def adecompose_task_fast(self, task, tool_description_pair):
+        """
+        Asynchronous variant of `decompose_task_fast`, awaiting the LLM instead of blocking on it.
+
+        Args:
+            task (str): The complex task to be decomposed.
+            tool_description_pair (dict): A dictionary mapping tool names to their descriptions.
+        """
+        sys_prompt = self.with_map_prompt(self.prompt['_SYSTEM_TASK_DECOMPOSE_PROMPT']) + self.prompt['_SYSTEM_TASK_FAST_PATH_PROMPT']
+        user_prompt = self.get_decompose_user_prompt(task, tool_description_pair)
+        response = await asend_chat_prompts(sys_prompt, user_prompt, self.llm, prefix="Overall")
+        self.build_plan(response)
+        self.attach_fast_path_code(response)
+
+    def with_map_prompt(self, sys_prompt):
+        """
+        Appends the description of Map subtasks to a planning system prompt, if Map subtasks are enabled.
+        """
+        if self.map_subtasks:
+            return sys_prompt + self.prompt['_SYSTEM_TASK_MAP_PROMPT']
+        return sys_prompt
+
+    def attach_fast_path_code(self, response):
+        """
+        Attaches the code of a single-subtask plan, generated together with the plan, to its node.
+
+        Args:
+            response (str): The LLM response of a fast path decomposition.
+        """
+        if self.tool_num != 1:
+            return
+        tool_node = self.tool_node[self.sub_task_list[0]]
+        code_type_str = '```' + tool_node.node_type.lower()
+        if tool_node.node_type not in ['Python', 'Shell'] or code_type_str not in response:
+            return
+        tool_node._code = response.split(code_type_str)[1].split('```')[0].strip()
+        if tool_node.node_type == 'Python':
+            invoke = self.extract_information(response, begin_str='<invoke>', end_str='</invoke>')
+            if not invoke:
+                # Without a call the code cannot run on its own, so generate it the usual way.
+                tool_node._code = ''
+                return
+            tool_node._invoke = invoke[0].strip()
+        logging.info("Fast path: code for {} was generated together with the plan.".format(tool_node.name))
+
+    def get_decompose_user_prompt(self, task, tool_description_pair):
+        """
+        Formats the user prompt for task decomposition with the current environment information.
+
+        Args:
+            task (str): The complex task to be decomposed.
+            tool_description_pair (dict): A dictionary mapping tool names to their descriptions.
+
+        Returns:
+            str: The formatted user prompt.
+        """
         files_and_folders = self.environment.list_working_dir()
         tool_description_pair = json.dumps(tool_description_pair)
         api_list = get_open_api_description_pair()
-        sys_prompt = self.prompt['_SYSTEM_TASK_DECOMPOSE_PROMPT']
-        user_prompt = self.prompt['_USER_TASK_DECOMPOSE_PROMPT'].format(
+        return self.prompt['_USER_TASK_DECOMPOSE_PROMPT'].format(
             system_version=self.system_version,
             task=task,
             tool_list = tool_description_pair,
@@ -62,7 +164,14 @@ class FridayPlanner(BaseModule):
             working_dir = self.environment.working_dir,
             files_and_folders = files_and_folders
         )
-        response = send_chat_prompts(sys_prompt, user_prompt, self.llm, prefix="Overall")
+
+    def build_plan(self, response):
+        """
+        Builds the tool graph and execution order from a decomposition response.
+
+        Args:
+            response (str): The LLM response containing the subtask JSON.
+        """
         decompose_json = self.extract_json_from_string(response)
         # Building tool graph and topological ordering of tools
         if decompose_json != 'No JSON data found in the string.':
@@ -93,13 +202,39 @@ class FridayPlanner(BaseModule):
             Modifies the tool graph to include new tools and updates the execution order
             of tools within the graph.
         """
+        sys_prompt = self.with_map_prompt(self.prompt['_SYSTEM_TASK_REPLAN_PROMPT'])
+        user_prompt = self.get_replan_user_prompt(reasoning, current_task, relevant_tool_description_pair)
+        response = send_chat_prompts(sys_prompt, user_prompt, self.llm)
+        self.apply_replan(response, current_task)
+
+    async def areplan_task(self, reasoning, current_task, relevant_tool_description_pair):
+        """
+        Asynchronous variant of `replan_task`, awaiting the LLM instead of blocking on it.
+
+        Args:
+            reasoning (str): The reasoning or justification for replanning the task.
+            current_task (str): The identifier of the current task being replanned.
+            relevant_tool_description_pair (dict): A dictionary mapping relevant tool names to
+                                                    their descriptions for replanning.
+        """
+        sys_prompt = self.with_map_prompt(self.prompt['_SYSTEM_TASK_REPLAN_PROMPT'])
+        user_prompt = self.get_replan_user_prompt(reasoning, current_task, relevant_tool_description_pair)
+        response = await asend_chat_prompts(sys_prompt, user_prompt, self.llm)
+        self.apply_replan(response, current_task)
+
+    def get_replan_user_prompt(self, reasoning, current_task, relevant_tool_description_pair):
+        """
+        Formats the user prompt for replanning the current task.
+
+        Returns:
+            str: The formatted user prompt.
+        """
         # current_task information
         current_tool = self.tool_node[current_task]
         current_task_description = current_tool.description
         relevant_tool_description_pair = json.dumps(relevant_tool_description_pair)
         files_and_folders = self.environment.list_working_dir()
-        sys_prompt = self.prompt['_SYSTEM_TASK_REPLAN_PROMPT']
-        user_prompt = self.prompt['_USER_TASK_REPLAN_PROMPT'].format(
+        return self.prompt['_USER_TASK_REPLAN_PROMPT'].format(
             current_task = current_task,
             current_task_description = current_task_description,
             system_version=self.system_version,
@@ -108,7 +243,15 @@ class FridayPlanner(BaseModule):
             working_dir = self.environment.working_dir,
             files_and_folders = files_and_folders
         )
-        response = send_chat_prompts(sys_prompt, user_prompt, self.llm)
+
+    def apply_replan(self, response, current_task):
+        """
+        Adds the tools of a replanning response to the tool graph and updates the execution order.
+
+        Args:
+            response (str): The LLM response containing the new tools.
+            current_task (str): The identifier of the task that was replanned.
+        """
         new_tool = self.extract_json_from_string(response)
         # add new tool to tool graph
         self.add_new_tool(new_tool, current_task)
@@ -141,6 +284,10 @@ class FridayPlanner(BaseModule):
                 print(return_val)
                 print("************************</return>*************************")  
             if return_val != 'None':
+                store = self.environment.artifact_store()
+                if store is not None:
+                    # A large return value is passed on to the next tasks by reference
+                    return_val = store.externalize(return_val)
                 self.tool_node[tool]._return_val = return_val
         if relevant_code:
             self.tool_node[tool]._relevant_code = relevant_code
@@ -1,6 +1,8 @@
 from oscopilot.modules.base_module import BaseModule
 from oscopilot.utils.utils import send_chat_prompts
+from oscopilot.utils.trace import get_current_trace
 import json
+import time
 
 
 class FridayRetriever(BaseModule):
@@ -44,7 +46,13 @@ class FridayRetriever(BaseModule):
         Returns:
             list[str]: A list of the top k tool names relevant to the specified task.
         """
+        trace = get_current_trace()
+        if trace is not None and trace.replaying:
+            return trace.replay_retrieval(task)
+        start_time = time.perf_counter()
         retrieve_tool_name = self.tool_manager.retrieve_tool_name(task, k)
+        if trace is not None:
+            trace.record_retrieval(task, retrieve_tool_name, time.perf_counter() - start_time)
         return retrieve_tool_name
 
     def tool_code_filter(self, tool_code_pair, task):
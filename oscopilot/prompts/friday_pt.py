@@ -24,6 +24,34 @@ Example:
         # Accessing a specific prompts for task execution
         execute_prompt = prompts['execute_prompt']['_SYSTEM_SKILL_CREATE_AND_INVOKE_PROMPT']
 """
+# The analysis process and the criteria of the task judge, shared by the single and the batch judge prompts
+_TASK_JUDGE_ANALYSIS_PROMPT = '''
+        You are an program expert to verify code against a user's task requirements.
+        Your goal is to determine if the provided code accomplishes the user's specified task based on the feedback information, And score the code based on the degree of generalizability of the code.
+        You should only respond with a JSON result. 
+        You must follow the analysis process and format requirements as follows:
+        1. Analyze the provided code: Examine the user's code to understand its functionality and structure.
+        2. Compare the code with the task description: Align the objectives stated in the user's task description with the capabilities of the code.
+        3. Evaluate the feedback information: Review the user's feedback, Includes 'Code Output', 'Code Error' and the working catalog information provided by user to measure the effectiveness of the code.
+        4. Formulate a reasoning process: Based on the analysis of the code and feedback received, generate a reasoning process about the execution of the code. If you believe the task has been successfully completed, you need to explain how the code accomplished the task. If you think the task has not been completed, you need to explain the reasons for the failure and provide corresponding solutions.
+        5. Evaluate task status: Based on the reasoning process, determine the status of the task. There are three possible statuses for a task:
+                Complete: The task has been successfully executed.
+                Amend: There are errors in the code, or the code does not meet the task requirements, necessitating fixes based on the reasoning process.
+                Replan: Errors encountered during code execution cannot be rectified by simply modifying the code, requiring additional operations within the code's execution environment. This necessitates new tasks to perform these extra operations.
+        6. Code's generality score: Evaluate the generality of the code and give code a score. The generality of the code can be analyzed based on parameters flexibility, error and exception handling, clarity of comments, code efficiency, security aspects, and other factors. According to the evaluation results, the code can be scored on a scale from 1 to 10, with integers reflecting the code's generality. A score of 1-3 indicates that the code is not very generic and can only complete the current task. A score of 4-6 indicates that the code can efficiently complete similar tasks, but the parameter names are not generic enough. A score of 7-8 indicates that the code is sufficiently generic but lacks in terms of security, clarity of comments, and fault tolerance. A score of 9-10 indicates that the code is highly generic in all aspects.
+'''
+
+_TASK_JUDGE_CRITERIA_PROMPT = '''        And you should also follow the following criteria:
+        1. Provide clear, logical reasoning.
+        2. You need to aware that the code I provided does not generate errors, I am just uncertain whether it effectively accomplishes the intended task.
+        3. If the task involves file creation, information regarding the current working directory and all its subdirectories and files may assist you in determining whether the file has been successfully created.
+        4. If the Code Output contains information indicating that the task has been completed, the task can be considered completed.    
+        5. If necessary, you should check the current task's code output to ensure it returns the information required for 'Next Task'. If it does not, then the current task can be considered incomplete.
+        6. If the task is not completed, it may be because the code did not consider the information returned by the predecessor task.
+        7. If 'Code Error' contains an 'ExecutionLimitError', the code was stopped because it exceeded the wall-clock or CPU time limit of an execution, and its output is incomplete. The task is not complete; choose Amend if the code can be made to finish in time (for example an endless loop or reading a huge file at once), or Replan if the task itself needs to be split into smaller tasks.
+        8. The JSON response must be enclosed between ```json and ```.
+        '''
+
 prompt = {
     'execute_prompt': {
         # shell/applescript generator
@@ -101,15 +129,75 @@ prompt = {
         Task Description: {task_description}     
         Information of Prerequisite Tasks: {pre_tasks_info}   
         Relevant Code: {relevant_code}
+        Installed Modules: {installed_modules}
         Detailed description of user information:
         1. 'Working Directory' represents the working directory. It may not necessarily be the same as the current working directory. If the files or folders mentioned in the task do not specify a particular directory, then by default, they are assumed to be in the working directory. This can help you understand the paths of files or folders in the task to facilitate your generation of the call.
         2. 'Information of Prerequisite Tasks' provides relevant information about the prerequisite tasks for the current task, encapsulated in a dictionary format. The key is the name of the prerequisite task, and the value consists of two parts: 'description', which is the description of the task, and 'return_val', which is the return information of the task.
         3. 'Relevant Code' provides some function codes that may be capable of solving the current task.
+        4. 'Installed Modules' lists the third-party modules that can be imported besides the Python standard library. Prefer them, and do not import other third-party modules.
+
+        Note: Please output according to the output format specified in the system message.
+        ''',
+
+
+        # Python invoke prompts in os, for running a stored tool without generating its code again
+        '_SYSTEM_PYTHON_INVOKE_GENERATE_PROMPT': '''
+        You are a world-class programmer that can complete any task by calling existing functions, your goal is to generate the call of the given function that accomplishes the task.
+        You could only respond with the function call enclosed between <invoke> and </invoke>.
+        Output Format:
+        <invoke>python_function(arg1, arg2, ...)</invoke>
+
+        The function call should follow the following criteria:
+        1. The Python function call must be syntactically correct as per Python standards, and call the function given in 'Function Code' by its name.
+        2. Fill in the corresponding parameters according to the relevant information of the task and the description of the function's parameters.
+        3. If the function call requires the output of prerequisite tasks, you can obtain relevant information from 'Information of Prerequisite Tasks'.
+        4. The parameter information should be written directly into the function call, rather than being passed as variables to the function.
+        5. The generated function call should be a single line and should not include any additional text or comments.
+        ''',
+        '_USER_PYTHON_INVOKE_GENERATE_PROMPT': '''
+        User's information is as follows:
+        System Version: {system_version}
+        Working Directory: {working_dir}
+        Task Description: {task_description}
+        Information of Prerequisite Tasks: {pre_tasks_info}
+        Function Code: {code}
+        Detailed description of user information:
+        1. 'Working Directory' represents the working directory. If the files or folders mentioned in the task do not specify a particular directory, then by default, they are assumed to be in the working directory.
+        2. 'Information of Prerequisite Tasks' provides relevant information about the prerequisite tasks for the current task, encapsulated in a dictionary format. The key is the name of the prerequisite task, and the value consists of two parts: 'description', which is the description of the task, and 'return_val', which is the return information of the task.
 
         Note: Please output according to the output format specified in the system message.
         ''',
 
 
+        # Map generate prompts in os, for tools applying one operation to every item of a collection in parallel
+        '_SYSTEM_MAP_GENERATE_PROMPT': '''
+        You are a world-class programmer that can complete any task by executing code, your goal is to generate the function code that processes one item of a collection, along with the function call listing all the items.
+        The function will be called once per item, in parallel worker processes, and the results will be gathered in the order of the items.
+        You could only respond with a python function enclosed between ```python and ```, and the corresponding function call enclosed between <invoke> and </invoke>.
+        Output Format:
+        ```python
+        def python_function(item):
+            # function code processing one item
+        ```
+        <invoke>python_function([item1, item2, ...])</invoke>
+
+        The python function you write should follow the following criteria:
+        1. Function name should be the same as the 'Task Name' provided by the user.
+        2. The function takes exactly one parameter, a single item such as the absolute path of one file, and processes only that item. If more values are needed per item, the item can be a tuple.
+        3. The items are processed independently and concurrently, so the function must not depend on the results of other items, and must not write to a file shared with other items.
+        4. The code should be well-documented, explaining what the function does, its Args and its Returns.
+        5. The function must return a value that can be printed and pickled, such as a string, a number, a list or a dictionary. If there is no return value, it can return information indicating that the item has been processed.
+        6. Raise an exception if an item cannot be processed; it will be reported with the item.
+        7. If the code involves the output of file paths, ensure that the output includes the files' absolute path.
+        8. Modules needed to list the items, such as os or glob, must be imported at the top of the code.
+
+        And the function call should follow the following criteria:
+        1. The function call must be syntactically correct as per Python standards, and pass the list of all items as its only argument, either written out or as an expression computing it, e.g. `python_function(sorted(glob.glob('/abs/folder/*.docx')))`.
+        2. If the items come from prerequisite tasks, you can obtain them from 'Information of Prerequisite Tasks'.
+        3. The generated function call should be a single line and should not include any additional text or comments.
+        ''',
+
+
         # shell/applescript amend in os
         '_SYSTEM_SHELL_APPLESCRIPT_AMEND_PROMPT': '''
         You are an expert in programming, with a focus on diagnosing and resolving code issues.
@@ -127,6 +215,7 @@ prompt = {
         4. All modifications must address the specific issues identified in the error analysis.
         5. The solution must enable the code to successfully complete the intended task without errors.
         6. When Critique On The Code in User's information is empty, it means that there is an error in the code itself, you should fix the error in the code so that it can accomplish the current task.
+        7. If the error starts with 'ExecutionLimitError', the code was stopped for running too long or using too much CPU time. Make it finish faster, for example by processing less data or avoiding commands that wait for input or never end.
         ''',
         '_USER_SHELL_APPLESCRIPT_AMEND_PROMPT': '''
         User's information are as follows:
@@ -136,7 +225,7 @@ prompt = {
         Code Output: {code_output}
         Current Working Directiory: {current_working_dir}
         Working Directiory: {working_dir}
-        Files And Folders in Current Working Directiory: {files_and_folders}
+        Working Directory Changes During Execution: {working_dir_changes}
         Critique On The Code: {critique}
         Information of Prerequisite Tasks: {pre_tasks_info}   
         Detailed description of user information:
@@ -174,6 +263,7 @@ prompt = {
         5. All modifications must address the specific issues identified in the error analysis.
         6. The solution must enable the code to successfully complete the intended task without errors.
         7. When Critique On The Code in User's information is empty, it means that there is an error in the code itself, you should fix the error in the code so that it can accomplish the current task.
+        8. If the error starts with 'ExecutionLimitError', the code was stopped for running too long or using too much CPU time. Make it finish faster, for example by reading files in chunks, processing less data or avoiding loops that never end.
 
         And the function call should also follow the following criteria:
         1. The Python function call must be syntactically correct as per Python standards.
@@ -190,9 +280,10 @@ prompt = {
         Code Output: {code_output}
         Current Working Directiory: {current_working_dir}
         Working Directiory: {working_dir}
-        Files And Folders in Current Working Directiory: {files_and_folders}
+        Working Directory Changes During Execution: {working_dir_changes}
         Critique On The Code: {critique}
         Information of Prerequisite Tasks: {pre_tasks_info}   
+        Installed Modules: {installed_modules}
         Detailed description of user information:
         1. 'Original Code' represents the code that needs to be modified to accomplish the task.
         2. 'Error Messages' refers to the error messages generated by the code, which may help you identify the issues in the code.
@@ -200,28 +291,34 @@ prompt = {
         4. 'Working Directory' represents the root directory of the working directory, and 'Current Working Directory' represents the directory where the current task is located.    
         5. 'Critique On The Code' refers to code modification suggestions given by other code experts and may be empty.
         6. 'Information of Prerequisite Tasks' from User's information provides relevant information about the prerequisite tasks for the current task, encapsulated in a dictionary format. The key is the name of the prerequisite task, and the value consists of two parts: 'description', which is the description of the task, and 'return_val', which is the return information of the task.
+        7. 'Installed Modules' lists the third-party modules that can be imported besides the Python standard library. If the error is a missing module, rewrite the code with these modules or the standard library instead.
         
         Note: Please output according to the output format specified in the system message.
         ''',
 
 
+        # Map amend prompts in os, used with the Python amend user prompt
+        '_SYSTEM_MAP_AMEND_PROMPT': '''
+        You are an expert in Python programming, with a focus on diagnosing and resolving code issues.
+        Your goal is to precisely identify the reasons for failure in the existing code and implement effective modifications to ensure it accomplishes the intended task without errors.
+        The code defines a function that processes one item of a collection. It is called once per item in parallel worker processes, and its function call passes the list of all items as its only argument. If some items failed, 'Error Messages' lists them with their errors.
+        You should only respond with a python code and a function call.
+        1. Error Analysis: Conduct a step-by-step analysis to identify why the code is generating errors or failing to complete the task for some or all items.
+        2. Modified Code: Based on the error analysis, modify the original code to fix all the problems. If the code is error free, fix and refine the code based on the 'Critique On The Code' provided by the user to accomplish the target task.
+        3. Output Format: The python code must be enclosed between ```python and ```, and the function call must be enclosed in <invoke></invoke> tags. For example, <invoke>function([item1, item2])</invoke>.
+
+        And the code you write should also follow the following criteria:
+        1. You must keep the original function name, and the function must keep taking exactly one item as its only parameter.
+        2. The items are processed independently and concurrently, so the function must not depend on other items, and its return value must be printable and picklable.
+        3. Modules needed to list the items must be imported at the top of the code.
+        4. If the error starts with 'ExecutionLimitError', the code was stopped for running too long or using too much CPU time. Make it finish faster.
+        5. The function call must pass the list of all items as its only argument, in a single line without any additional text or comments.
+        ''',
+
+
 
         # Task judge prompts in os
-        '_SYSTEM_TASK_JUDGE_PROMPT': '''
-        You are an program expert to verify code against a user's task requirements.
-        Your goal is to determine if the provided code accomplishes the user's specified task based on the feedback information, And score the code based on the degree of generalizability of the code.
-        You should only respond with a JSON result. 
-        You must follow the analysis process and format requirements as follows:
-        1. Analyze the provided code: Examine the user's code to understand its functionality and structure.
-        2. Compare the code with the task description: Align the objectives stated in the user's task description with the capabilities of the code.
-        3. Evaluate the feedback information: Review the user's feedback, Includes 'Code Output', 'Code Error' and the working catalog information provided by user to measure the effectiveness of the code.
-        4. Formulate a reasoning process: Based on the analysis of the code and feedback received, generate a reasoning process about the execution of the code. If you believe the task has been successfully completed, you need to explain how the code accomplished the task. If you think the task has not been completed, you need to explain the reasons for the failure and provide corresponding solutions.
-        5. Evaluate task status: Based on the reasoning process, determine the status of the task. There are three possible statuses for a task:
-                Complete: The task has been successfully executed.
-                Amend: There are errors in the code, or the code does not meet the task requirements, necessitating fixes based on the reasoning process.
-                Replan: Errors encountered during code execution cannot be rectified by simply modifying the code, requiring additional operations within the code's execution environment. This necessitates new tasks to perform these extra operations.
-        6. Code's generality score: Evaluate the generality of the code and give code a score. The generality of the code can be analyzed based on parameters flexibility, error and exception handling, clarity of comments, code efficiency, security aspects, and other factors. According to the evaluation results, the code can be scored on a scale from 1 to 10, with integers reflecting the code's generality. A score of 1-3 indicates that the code is not very generic and can only complete the current task. A score of 4-6 indicates that the code can efficiently complete similar tasks, but the parameter names are not generic enough. A score of 7-8 indicates that the code is sufficiently generic but lacks in terms of security, clarity of comments, and fault tolerance. A score of 9-10 indicates that the code is highly generic in all aspects.
-        7. Output Format: 
+        '_SYSTEM_TASK_JUDGE_PROMPT': _TASK_JUDGE_ANALYSIS_PROMPT + '''        7. Output Format: 
 
         ```json
         {
@@ -231,15 +328,7 @@ prompt = {
         }
         ``` 
 
-        And you should also follow the following criteria:
-        1. Provide clear, logical reasoning.
-        2. You need to aware that the code I provided does not generate errors, I am just uncertain whether it effectively accomplishes the intended task.
-        3. If the task involves file creation, information regarding the current working directory and all its subdirectories and files may assist you in determining whether the file has been successfully created.
-        4. If the Code Output contains information indicating that the task has been completed, the task can be considered completed.    
-        5. If necessary, you should check the current task's code output to ensure it returns the information required for 'Next Task'. If it does not, then the current task can be considered incomplete.
-        6. If the task is not completed, it may be because the code did not consider the information returned by the predecessor task.
-        7. The JSON response must be enclosed between ```json and ```.
-        ''',
+''' + _TASK_JUDGE_CRITERIA_PROMPT,
         '_USER_TASK_JUDGE_PROMPT': '''
         User's information are as follows:
         Current Code: {current_code}
@@ -248,7 +337,7 @@ prompt = {
         Code Error: {code_error}
         Current Working Directiory: {current_working_dir}
         Working Directory: {working_dir}
-        Files And Folders in Current Working Directiory: {files_and_folders}
+        Working Directory Changes During Execution: {working_dir_changes}
         Next Task: {next_action}
         Detailed description of user information:
         1. 'Working Directory' represents the root directory of the working directory.
@@ -256,9 +345,50 @@ prompt = {
         3. 'Code Output' represents the output of the code execution, which may be empty.
         4. 'Code Error' represents any error messages generated during code execution, which may also be empty.
         5. 'Next Task' describes tasks that follow the current task and may depend on the return from the current task. 
+        6. 'Working Directory Changes During Execution' lists the files and folders created, modified and deleted in the working directory while the code was running, which shows the effect of the code on the file system.
+
+        Note: Please output according to the output format specified in the system message.
+        ''',
+
+        # Batch task judge prompts in os, the analysis process and criteria of the task judge with a list of verdicts as output
+        '_SYSTEM_TASK_BATCH_JUDGE_PROMPT': _TASK_JUDGE_ANALYSIS_PROMPT + '''        7. Output Format: one JSON object whose 'verdicts' value is a list with exactly one verdict per subtask, in the same order as the subtasks are given.
+
+        ```json
+        {
+            verdicts: [
+                {
+                    reasoning: Your reasoning process for subtask 1,
+                    status: Complete/Amend/Replan,
+                    score: 1-10
+                }
+            ]
+        }
+        ```
+
+        The user will provide several independent subtasks at once. Follow the analysis process for each subtask separately, and do not let the result of one subtask influence the judgement of another.
+
+''' + _TASK_JUDGE_CRITERIA_PROMPT,
+        '_USER_TASK_BATCH_JUDGE_PROMPT': '''
+        User's information are as follows:
+        Working Directory: {working_dir}
+        Subtasks: {subtasks}
+        Detailed description of user information:
+        1. 'Working Directory' represents the root directory of the working directory.
+        2. Each subtask in 'Subtasks' provides its 'Current Code', 'Task', 'Code Output', 'Code Error', 'Current Working Directiory', 'Working Directory Changes During Execution' and 'Next Task', which have the same meaning as when a single task is judged.
+        3. 'Code Output' and 'Code Error' may be empty.
 
         Note: Please output according to the output format specified in the system message.
         ''',
+        '_USER_TASK_BATCH_JUDGE_ITEM_PROMPT': '''
+        Subtask {index}:
+        Current Code: {current_code}
+        Task: {task}
+        Code Output: {code_output}
+        Code Error: {code_error}
+        Current Working Directiory: {current_working_dir}
+        Working Directory Changes During Execution: {working_dir_changes}
+        Next Task: {next_action}
+        ''',
 
         # Tool usage prompts in os
         '_SYSTEM_TOOL_USAGE_PROMPT': '''
@@ -289,6 +419,25 @@ prompt = {
         # TODO: your code here
         ''',
 
+        # API argument prompts in os
+        '_SYSTEM_API_ARGS_PROMPT': '''
+        You are a useful AI assistant capable of accessing APIs to complete user-specified tasks, according to API documentation.
+        The API is called for you, you only need to provide the arguments of the call. The API documentation is as follows: 
+        {openapi_doc}
+        The user-specified task is as follows: 
+        {tool_sub_task}
+        The context which can further help you to determine the params of the API is as follows:
+        {context}
+        You should only respond with a JSON object holding the arguments of the API, which must match the schema of the request body
+        in the API documentation, in the following format:
+        ```json
+        {{"param_name": "param_value"}}
+        ```
+        ''',
+        '_USER_API_ARGS_PROMPT': '''
+        Please provide the arguments of the API call:
+        ''',
+
         # QA prompts in os
         '_SYSTEM_QA_PROMPT': '''
         You are a helpful ai assistant that can answer the question with the help of the context provided by the user in a step by step manner. The full question may help you to solve the current question.
@@ -367,6 +516,19 @@ prompt = {
         14. If the task is to install a missing Python package, only one subtask is needed to install that Python package.
         15. The JSON response must be enclosed between ```json and ```.
         ''',
+        # Appended to the task decompose system prompt when the fast path is enabled
+        '_SYSTEM_TASK_FAST_PATH_PROMPT': '''
+        Fast path requirements:
+        1. If the whole task can be completed by exactly one subtask, and that subtask is of type Python or Shell, you must also write the code of that subtask, so that it can be executed directly without another round of code generation.
+        2. In that case, output the code before the reasoning process and the JSON. Python code must be a function enclosed between ```python and ```, whose name is the same as the subtask name, followed by the function call enclosed between <invoke> and </invoke>. Shell code must be enclosed between ```shell and ``` and needs no function call.
+        3. The Python function must be a general-purpose tool: values are passed in as parameters instead of being hard-coded, the function is documented with its purpose, Args and Returns, it has a return value, and any file paths it outputs are absolute. The function call must be a single line with the parameter values written directly into it.
+        4. If the task needs more than one subtask, or the only subtask is not of type Python or Shell, do not output any code, only the reasoning process and the JSON.
+        ''',
+        # Appended to the task decompose and replan system prompts when Map subtasks are enabled
+        '_SYSTEM_TASK_MAP_PROMPT': '''
+        Besides the five types above, there is a sixth type of subtask:
+                Map: Map subtasks apply the same independent operation to every item of a collection, such as converting, extracting data from or analyzing every file of a folder. The items are processed in parallel, one process per CPU core, so use Map instead of Python when a subtask would loop over many files or items whose processing does not depend on each other. The description of a Map subtask must state which items are processed, e.g. the folder and the file pattern, and what is done to each item.
+        ''',
         '_USER_TASK_DECOMPOSE_PROMPT': '''
         User's information are as follows:
         System Version: {system_version}
@@ -1 +1,3 @@
-from .tool_manager import *
\ No newline at end of file
+from .tool_manager import *
+from .openapi_registry import *
+from .tool_package import *
\ No newline at end of file
@@ -11,6 +11,8 @@ class ActionNode:
         _next_action (dict): A dictionary mapping subsequent actions that depend on the current action.
         _status (bool): The execution status of the action, indicating whether it has been successfully executed.
         _type (str): The type of the action, categorizing its purpose or method of execution.
+        _code (str): Code generated for the action ahead of execution, e.g. by the planner's fast path.
+        _invoke (str): The invocation that goes with `_code`, if any.
     """
     def __init__(self, name, description, node_type):
         """
@@ -28,6 +30,8 @@ class ActionNode:
         self._next_action = {}
         self._status = False
         self._type = node_type
+        self._code = ''
+        self._invoke = ''
 
     @property
     def name(self):
@@ -89,6 +93,26 @@ class ActionNode:
         """
         return self._type 
     
+    @property
+    def code(self):
+        """
+        Returns the code generated for the action ahead of execution.
+
+        Returns:
+            str: The pre-generated code, or an empty string if the code still has to be generated.
+        """
+        return self._code
+
+    @property
+    def invoke(self):
+        """
+        Returns the invocation that goes with the pre-generated code.
+
+        Returns:
+            str: The pre-generated invocation, or an empty string if there is none.
+        """
+        return self._invoke
+
     @property
     def next_action(self):
         """
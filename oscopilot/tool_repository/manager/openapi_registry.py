@@ -0,0 +1,276 @@
+import os
+import json
+import threading
+from typing import Dict, Any, List, Optional
+
+
+# The document the executor read its API paths from before the registry; its paths take precedence.
+DEFAULT_API_DOC = "default_api.json"
+
+API_NOT_FOUND_DOC = {"error": "The api is not existed"}
+
+
+class OpenAPIRegistry:
+    """
+    An index of the OpenAPI documents in a directory, loaded once and kept up to date.
+
+    The planner lists the description of every document in its prompt and the executor gives the LLM a
+    minimal document for the single API path it calls. Both are precomputed when the documents are loaded:
+    every path maps to a self-contained document with only that path and the schemas it references, so a
+    lookup is a dictionary access instead of a walk over the full document. Before each lookup the
+    modification times of the documents are compared with those of the last load, and the index is rebuilt
+    when a document was added, changed or removed.
+
+    Attributes:
+        doc_dir (str): The directory of the OpenAPI documents (`*.json`).
+        descriptions (dict): The `info.description` of each document, by file name.
+        path_docs (dict): The minimal OpenAPI document of each API path.
+        operations (dict): The method, content type and request body schema of each API path, for calling it
+                           without generated code.
+    """
+
+    def __init__(self, doc_dir):
+        self.doc_dir = doc_dir
+        self.descriptions = {}
+        self.path_docs = {}
+        self.operations = {}
+        self.signature = None
+        self.lock = threading.Lock()
+
+    def description_pair(self) -> Dict[str, str]:
+        """
+        Returns the description of every OpenAPI document, by file name.
+        """
+        self.refresh()
+        return self.descriptions
+
+    def path_doc(self, api_path: str) -> Dict[str, Any]:
+        """
+        Returns the minimal OpenAPI document of an API path.
+
+        The document is shared between callers and must not be modified.
+
+        Args:
+            api_path (str): The API path, e.g. "/tools/bing/searchv2".
+
+        Returns:
+            dict: The document with the path, its operations and the schemas they reference, or a dictionary
+                  with an error message if no document defines the path.
+        """
+        self.refresh()
+        return self.path_docs.get(api_path, API_NOT_FOUND_DOC)
+
+    def api_operation(self, api_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns how to call an API path: its 'method', its request 'content_type' (None without a request body)
+        and the 'schema' of its arguments (None without a request body), or None if no document defines the path.
+        """
+        self.refresh()
+        return self.operations.get(api_path)
+
+    def validate_args(self, api_path: str, args: Any) -> List[str]:
+        """
+        Checks the arguments of a call to an API path against the schema of its request body.
+
+        Args:
+            api_path (str): The API path.
+            args: The arguments, decoded from JSON.
+
+        Returns:
+            list[str]: A description of every problem found, empty if the arguments are valid.
+        """
+        self.refresh()
+        operation = self.operations.get(api_path)
+        if operation is None:
+            return ["The api {} is not existed".format(api_path)]
+        if operation["schema"] is None:
+            return [] if args in (None, {}) else ["The api {} takes no arguments".format(api_path)]
+        schemas = self.path_docs[api_path]["components"]["schemas"]
+        return validate_schema(args, operation["schema"], schemas, "args")
+
+    def refresh(self):
+        """
+        Reloads the documents if any of them was added, changed or removed since the last load.
+        """
+        signature = self.scan()
+        if signature == self.signature:
+            return
+        with self.lock:
+            if signature == self.signature:
+                return
+            descriptions, path_docs, operations = {}, {}, {}
+            # Load the default document last, so its paths replace those of other documents
+            for file_name in sorted(signature, key=lambda name: (name == DEFAULT_API_DOC, name)):
+                doc = load_doc(os.path.join(self.doc_dir, file_name))
+                if doc is None:
+                    continue
+                info = doc.get("info", {})
+                if "description" in info:
+                    descriptions[file_name] = info["description"]
+                for api_path in doc.get("paths", {}):
+                    path_docs[api_path] = build_path_doc(doc, api_path)
+                    operations[api_path] = build_operation(doc["paths"][api_path])
+            self.descriptions, self.path_docs, self.operations = descriptions, path_docs, operations
+            self.signature = signature
+
+    def scan(self):
+        """
+        Returns the modification time and size of every document in the directory, by file name.
+        """
+        signature = {}
+        try:
+            with os.scandir(self.doc_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".json") and entry.is_file():
+                        stat = entry.stat()
+                        signature[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        return signature
+
+
+def load_doc(file_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            doc = json.load(f)
+    except json.JSONDecodeError:
+        print(f"Error: Could not parse {file_path} as JSON")
+        return None
+    except OSError as e:
+        print(f"Warning: Could not load API doc: {e}")
+        return None
+    return doc if isinstance(doc, dict) else None
+
+
+def build_path_doc(doc: Dict[str, Any], api_path: str) -> Dict[str, Any]:
+    """
+    Builds the self-contained OpenAPI document of one path of a full document.
+
+    The schema of the request body (JSON, or the first `allOf` entry of multipart/form-data) of the GET or
+    POST operation is included, along with the schemas it references in turn.
+
+    Args:
+        doc (dict): The full OpenAPI document.
+        api_path (str): A path of the document.
+
+    Returns:
+        dict: The OpenAPI document for the path alone.
+    """
+    api_path_doc = doc["paths"][api_path]
+    path_doc = {
+        "openapi": doc.get("openapi"),
+        "info": doc.get("info"),
+        "paths": {api_path: api_path_doc},
+        "components": {"schemas": {}},
+    }
+    schemas = doc.get("components", {}).get("schemas", {})
+    pending = find_refs(build_operation(api_path_doc)["schema"])
+    while pending:
+        name = pending.pop().split('/')[-1]
+        if name in path_doc["components"]["schemas"] or name not in schemas:
+            continue
+        path_doc["components"]["schemas"][name] = schemas[name]
+        pending.extend(find_refs(schemas[name]))
+    return path_doc
+
+
+def build_operation(api_path_doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extracts the method, request content type and request body schema of the GET or POST operation of a path.
+
+    Only the JSON schema, or the first `allOf` entry of a multipart/form-data schema, is taken as the body.
+    """
+    method = "get" if "get" in api_path_doc else "post"
+    content = (api_path_doc.get(method) or {}).get("requestBody", {}).get("content", {})
+    if "application/json" in content:
+        return {"method": method, "content_type": "application/json", "schema": content["application/json"].get("schema")}
+    if "multipart/form-data" in content:
+        all_of = content["multipart/form-data"].get("schema", {}).get("allOf") or [None]
+        return {"method": method, "content_type": "multipart/form-data", "schema": all_of[0]}
+    return {"method": method, "content_type": None, "schema": None}
+
+
+JSON_TYPES = {
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "array": list,
+    "object": dict,
+    "null": type(None),
+}
+
+
+def validate_schema(value, schema, schemas, location):
+    """
+    Validates a JSON value against the subset of JSON Schema used by the FastAPI tool documents: `$ref`,
+    `type`, `anyOf`, `enum`, `properties`, `required` and `items`.
+
+    Args:
+        value: The JSON value.
+        schema (dict): The schema of the value.
+        schemas (dict): The component schemas `$ref`s point to, by name.
+        location (str): The position of the value, used in the error messages.
+
+    Returns:
+        list[str]: A description of every problem found.
+    """
+    if not isinstance(schema, dict):
+        return []
+    if "$ref" in schema:
+        name = schema["$ref"].split('/')[-1]
+        return validate_schema(value, schemas.get(name), schemas, location)
+    if "anyOf" in schema:
+        if any(not validate_schema(value, option, schemas, location) for option in schema["anyOf"]):
+            return []
+        return ["{} does not match any of the allowed schemas".format(location)]
+    if "enum" in schema and value not in schema["enum"]:
+        return ["{} must be one of {}".format(location, schema["enum"])]
+    types = schema.get("type")
+    if types is not None:
+        types = types if isinstance(types, list) else [types]
+        # bool is an int in Python but not a JSON integer
+        if not any(isinstance(value, JSON_TYPES.get(name, object)) and not (isinstance(value, bool) and name in ("integer", "number"))
+                   for name in types):
+            return ["{} must be of type {}".format(location, " or ".join(types))]
+    errors = []
+    if isinstance(value, dict):
+        for name in schema.get("required", []):
+            if name not in value:
+                errors.append("{}.{} is required".format(location, name))
+        for name, property_schema in schema.get("properties", {}).items():
+            if name in value:
+                errors.extend(validate_schema(value[name], property_schema, schemas, "{}.{}".format(location, name)))
+    elif isinstance(value, list) and "items" in schema:
+        for index, item in enumerate(value):
+            errors.extend(validate_schema(item, schema["items"], schemas, "{}[{}]".format(location, index)))
+    return errors
+
+
+def find_refs(node):
+    """
+    Returns the `$ref` values found anywhere in a JSON value.
+    """
+    if isinstance(node, dict):
+        refs = [node["$ref"]] if isinstance(node.get("$ref"), str) else []
+        for value in node.values():
+            refs.extend(find_refs(value))
+        return refs
+    if isinstance(node, list):
+        return [ref for value in node for ref in find_refs(value)]
+    return []
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_openapi_registry(doc_dir: str) -> OpenAPIRegistry:
+    """
+    Returns the registry of a directory of OpenAPI documents, shared by the planner and the executor.
+    """
+    doc_dir = os.path.abspath(doc_dir)
+    with _registries_lock:
+        if doc_dir not in _registries:
+            _registries[doc_dir] = OpenAPIRegistry(doc_dir)
+        return _registries[doc_dir]
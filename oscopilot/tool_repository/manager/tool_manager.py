@@ -1,8 +1,9 @@
 import os
-import json
 import glob
 import shutil
 from typing import List, Dict, Any, Optional
+from oscopilot.tool_repository.manager.openapi_registry import get_openapi_registry
+from oscopilot.tool_repository.manager.tool_package import ToolPackage
 
 # Constants
 EMBED_MODEL_TYPE = "OpenAI"
@@ -24,7 +25,7 @@ class ToolManager:
             current_dir = os.path.dirname(os.path.abspath(__file__))
             self.generated_tool_repo_dir = os.path.join(current_dir, "../../../generated_tool_repo")
         else:
-        self.generated_tool_repo_dir = generated_tool_repo_dir
+            self.generated_tool_repo_dir = generated_tool_repo_dir
         
         # Create the necessary directories
         os.makedirs(self.generated_tool_repo_dir, exist_ok=True)
@@ -33,6 +34,9 @@ class ToolManager:
         
         # Load existing tools
         self._load_existing_tools()
+
+        # The tools as an importable package with compiled code, written on first use
+        self._tool_package = None
     
     def _load_existing_tools(self):
         """Load existing tools from the generated tool repository."""
@@ -59,6 +63,24 @@ class ToolManager:
                     "code": code
                 }
 
+    @property
+    def tool_package(self) -> ToolPackage:
+        """Get the tool package, writing it into the repository on first use."""
+        if self._tool_package is None:
+            self._update_tool_package()
+        return self._tool_package
+
+    def _update_tool_package(self):
+        """Write the tool package for the current tools, compiling new and changed tools only."""
+        if self._tool_package is None:
+            self._tool_package = ToolPackage(self.generated_tool_repo_dir)
+        try:
+            self._tool_package.materialize(self.programs, os.path.join(self.generated_tool_repo_dir, "tool_code"))
+        except OSError as e:
+            print(f"Warning: Could not write the tool package: {e}")
+            # Stored tools run from their source until the package is written
+            self._tool_package.hashes = {}
+
     @property
     def programs(self) -> Dict[str, str]:
         """Get all tool programs."""
@@ -111,8 +133,10 @@ class ToolManager:
             "code": tool_code
         }
         
+        self._update_tool_package()
+        
         print(f"Added new tool: {tool_name}")
-            return True
+        return True
     
     def exist_tool(self, tool: str) -> bool:
         """Check if a tool exists."""
@@ -168,6 +192,8 @@ class ToolManager:
         
         # Remove the tool from the generated_tools dictionary
         del self.generated_tools[tool]
+        if self._tool_package is not None:
+            self._update_tool_package()
         
         print(f"Deleted tool: {tool}")
         return True
@@ -203,7 +229,7 @@ def add_tool(toolManager: ToolManager, tool_name: str, tool_path: str) -> None:
         print_error_and_exit(f"Could not extract description from {tool_path}")
     
     # Add the tool to the repository
-        info = {
+    info = {
         "name": tool_name,
         "description": tool_description,
         "code": tool_code
@@ -224,22 +250,7 @@ def get_open_api_doc_path() -> str:
 
 def get_open_api_description_pair() -> Dict[str, str]:
     """Get the OpenAPI description pairs."""
-    open_api_doc_path = get_open_api_doc_path()
-    if not os.path.exists(open_api_doc_path):
-        return {}
-    
-    result = {}
-    for file_path in glob.glob(os.path.join(open_api_doc_path, "*.json")):
-        file_name = os.path.basename(file_path)
-        with open(file_path, "r", encoding="utf-8") as f:
-            try:
-                data = json.load(f)
-                if "info" in data and "description" in data["info"]:
-                    result[file_name] = data["info"]["description"]
-            except json.JSONDecodeError:
-                print(f"Error: Could not parse {file_path} as JSON")
-    
-    return result
+    return get_openapi_registry(get_open_api_doc_path()).description_pair()
 
 def main() -> None:
     """Main function."""
@@ -0,0 +1,180 @@
+import os
+import sys
+import json
+import marshal
+import hashlib
+import tempfile
+from typing import Dict
+
+
+# The name under which the stored tools are imported by executed code.
+PACKAGE_NAME = "oscopilot_tools"
+
+# The `__init__.py` of the package. It is imported by executed code, possibly in a worker process without the
+# oscopilot package, so it only uses the standard library.
+PACKAGE_INIT = '''"""
+The stored tools of the tool repository, one lazily imported submodule per tool.
+
+Generated by oscopilot, do not edit. `from oscopilot_tools import <tool>` executes the compiled code of the
+tool once per process, loading it from __marshal__/<content hash>.<cache tag>.bin. The manifest is read again
+when it changes, so an updated tool is imported again.
+"""
+import os
+import sys
+import json
+import types
+import marshal
+
+_DIR = os.path.dirname(os.path.abspath(__file__))
+_MANIFEST = os.path.join(_DIR, "manifest.json")
+_manifest = {}
+_manifest_mtime = None
+_modules = {}
+
+
+def _tools():
+    global _manifest, _manifest_mtime
+    mtime = os.stat(_MANIFEST).st_mtime_ns
+    if mtime != _manifest_mtime:
+        with open(_MANIFEST, encoding="utf-8") as f:
+            _manifest = json.load(f)["tools"]
+        _manifest_mtime = mtime
+    return _manifest
+
+
+def _code(entry):
+    path = os.path.join(_DIR, "__marshal__", "{}.{}.bin".format(entry["hash"], sys.implementation.cache_tag))
+    try:
+        with open(path, "rb") as f:
+            return marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        # Compiled by another interpreter version, or removed: compile the source instead
+        with open(entry["source"], encoding="utf-8") as f:
+            return compile(f.read(), entry["source"], "exec")
+
+
+def __getattr__(name):
+    if name.startswith("__"):
+        raise AttributeError(name)
+    entry = _tools().get(name)
+    if entry is None:
+        raise AttributeError("No stored tool named {!r}".format(name))
+    module = _modules.get(name)
+    if module is None or module.__tool_hash__ != entry["hash"]:
+        module = types.ModuleType("{}.{}".format(__name__, name))
+        module.__file__ = entry["source"]
+        module.__tool_hash__ = entry["hash"]
+        exec(_code(entry), module.__dict__)
+        _modules[name] = module
+        sys.modules[module.__name__] = module
+    return module
+
+
+def __dir__():
+    return sorted(_tools())
+'''
+
+
+class ToolPackage:
+    """
+    The stored tools materialized as an importable package with compiled code.
+
+    The package lives in the tool repository. Its manifest maps every tool to the content hash of its code and
+    to its source file, and the code object of every tool is cached with `marshal` under its content hash, so
+    only new or changed tools are compiled. Executed code imports a tool with `from oscopilot_tools import <tool>`
+    and invokes it by name: a warm worker executes the class definitions of a tool once instead of on every
+    run, and a fresh interpreter loads the compiled code instead of parsing the source.
+
+    Attributes:
+        package_dir (str): The directory of the package.
+        hashes (dict): The content hash of the code of every tool in the package, by tool name.
+    """
+
+    def __init__(self, repo_dir):
+        self.package_dir = os.path.join(repo_dir, PACKAGE_NAME)
+        self.hashes = {}
+
+    def materialize(self, tools: Dict[str, str], source_dir: str) -> None:
+        """
+        Writes the package for the given tools, compiling the code of the tools without a cached artifact and
+        removing the artifacts of tools that no longer exist.
+
+        Args:
+            tools (dict): The code of every tool, by tool name.
+            source_dir (str): The directory of the source files of the tools, `<tool>.py`.
+        """
+        marshal_dir = os.path.join(self.package_dir, "__marshal__")
+        os.makedirs(marshal_dir, exist_ok=True)
+        init_path = os.path.join(self.package_dir, "__init__.py")
+        if not os.path.exists(init_path) or read_text(init_path) != PACKAGE_INIT:
+            write_atomic(init_path, PACKAGE_INIT.encode("utf-8"))
+        hashes, manifest, artifacts = {}, {}, set()
+        for name, code in tools.items():
+            if not name.isidentifier():
+                continue
+            content_hash = code_hash(code)
+            source = os.path.abspath(os.path.join(source_dir, "{}.py".format(name)))
+            artifact = "{}.{}.bin".format(content_hash, sys.implementation.cache_tag)
+            artifacts.add(artifact)
+            if not os.path.exists(os.path.join(marshal_dir, artifact)):
+                try:
+                    compiled = compile(code, source, "exec")
+                except (SyntaxError, ValueError) as e:
+                    print(f"Error: Could not compile tool {name}: {e}")
+                    continue
+                write_atomic(os.path.join(marshal_dir, artifact), marshal.dumps(compiled))
+            hashes[name] = content_hash
+            manifest[name] = {"hash": content_hash, "source": source}
+        write_atomic(os.path.join(self.package_dir, "manifest.json"), json.dumps({"tools": manifest}, indent=2).encode("utf-8"))
+        for file_name in os.listdir(marshal_dir):
+            if file_name.endswith(".{}.bin".format(sys.implementation.cache_tag)) and file_name not in artifacts:
+                os.remove(os.path.join(marshal_dir, file_name))
+        self.hashes = hashes
+
+    def has_tool(self, name: str, code: str) -> bool:
+        """
+        Returns whether the package holds a tool with exactly this code.
+        """
+        return self.hashes.get(name) == code_hash(code)
+
+    def import_code(self, name: str) -> str:
+        """
+        Returns Python code importing a tool from the package into the global namespace, as if its code had run.
+
+        Args:
+            name (str): The name of the tool.
+
+        Returns:
+            str: The code, followed in an execution by the invocation of the tool.
+        """
+        repo_dir = os.path.dirname(os.path.abspath(self.package_dir))
+        return (
+            "import sys\n"
+            "if {repo_dir!r} not in sys.path:\n"
+            "    sys.path.insert(0, {repo_dir!r})\n"
+            "from {package} import {name} as _stored_tool\n"
+            "globals().update((key, value) for key, value in vars(_stored_tool).items() if not key.startswith('__'))"
+        ).format(repo_dir=repo_dir, package=PACKAGE_NAME, name=name)
+
+
+def code_hash(code: str) -> str:
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()[:32]
+
+
+def read_text(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """
+    Writes a file through a temporary file renamed over it, so that concurrent readers never see it half written.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
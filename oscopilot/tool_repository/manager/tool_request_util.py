@@ -1,5 +1,7 @@
 import requests
 import os
+import threading
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
 load_dotenv(dotenv_path='.env', override=True)
@@ -18,11 +20,17 @@ class ToolRequestUtil:
         headers (dict): Default headers to be sent with each request.
         base_url (str): The base URL for the API endpoints.
     """
-    def __init__(self):
+    def __init__(self, pool_size=10):
         """
         Initializes the ToolRequestUtil with a session and default request headers.
+
+        Args:
+            pool_size (int, optional): The number of connections kept open per host. Defaults to 10.
         """
         self.session = requests.session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
         self.headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_4) AppleWebKit/537.36 (KHTML like Gecko) Chrome/52.0.2743.116 Safari/537.36'}
         self.base_url = API_BASE_URL
 
@@ -48,24 +56,61 @@ class ToolRequestUtil:
         Raises:
             Prints an error message to the console if an HTTP request error occurs.
         """
-        url = self.base_url + api_path
         try:
-            if method.lower() == "get":
-                if content_type == "application/json":
-                    result = self.session.get(url=url, json=params, headers=self.headers, timeout=60).json()
-                else: 
-                    result = self.session.get(url=url, params=params, headers=self.headers, timeout=60).json()
-            elif method.lower() == "post":
-                if content_type == "multipart/form-data":
-                    result = self.session.post(url=url, files=files, data=params, headers=self.headers).json()
-                elif content_type == "application/json":
-                    result = self.session.post(url=url, json=params, headers=self.headers).json()
-                else:
-                    result = self.session.post(url=url, data=params, headers=self.headers).json()
-            else:
+            if method.lower() not in ("get", "post"):
                 print("request method error!")
                 return None
-            return result
+            timeout = 60 if method.lower() == "get" else None
+            return self.send(api_path, method, params, files, content_type, timeout).json()
         except Exception as e:
             print("http request error: %s" % e)
-            return None
\ No newline at end of file
+            return None
+
+    def send(self, api_path, method, params=None, files=None, content_type="application/json", timeout=None):
+        """
+        Sends a request to the specified API endpoint and returns the response as it is.
+
+        Unlike `request`, errors are raised rather than printed, and the response is not decoded.
+
+        Args:
+            api_path (str): The path of the API endpoint.
+            method (str): The HTTP method to use for the request ('get' or 'post').
+            params (dict, optional): The parameters to include in the request. Defaults to None.
+            files (dict, optional): Files to be uploaded in a POST request. Defaults to None.
+            content_type (str, optional): The content type of the request. Defaults to "application/json".
+            timeout (float, optional): The seconds to wait for the server. Defaults to None (no timeout).
+
+        Returns:
+            requests.Response: The response of the API.
+
+        Raises:
+            ValueError: If the method is neither 'get' nor 'post'.
+            requests.RequestException: If the request failed.
+        """
+        url = self.base_url + api_path
+        if method.lower() == "get":
+            if content_type == "application/json":
+                return self.session.get(url=url, json=params, headers=self.headers, timeout=timeout)
+            return self.session.get(url=url, params=params, headers=self.headers, timeout=timeout)
+        if method.lower() == "post":
+            if content_type == "multipart/form-data":
+                return self.session.post(url=url, files=files, data=params, headers=self.headers, timeout=timeout)
+            if content_type == "application/json":
+                return self.session.post(url=url, json=params, headers=self.headers, timeout=timeout)
+            return self.session.post(url=url, data=params, headers=self.headers, timeout=timeout)
+        raise ValueError("request method error: {}".format(method))
+
+
+_shared_util = None
+_shared_util_lock = threading.Lock()
+
+
+def get_tool_request_util():
+    """
+    Returns the ToolRequestUtil shared within the process, whose connections are reused across API calls.
+    """
+    global _shared_util
+    with _shared_util_lock:
+        if _shared_util is None:
+            _shared_util = ToolRequestUtil()
+        return _shared_util
@@ -1,3 +1,8 @@
 from .config import *
 from .utils import *
 from .schema import *
+from .budget import *
+from .trace import *
+from .limits import *
+from .output_capture import *
+from .artifact_store import *
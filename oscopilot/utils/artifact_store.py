@@ -0,0 +1,169 @@
+import os
+import re
+import mmap
+import hashlib
+import tempfile
+import threading
+from oscopilot.utils.output_capture import RETURN_START, RETURN_END
+
+
+# The reference left in place of a stored payload, in states, prompts and logs.
+ARTIFACT_REF = "[artifact {digest}: {size} bytes{kind}, stored in {path}]"
+ARTIFACT_REF_PATTERN = re.compile(r"\[artifact ([0-9a-f]{64}): (\d+) bytes[^\]]*, stored in ([^\]]+)\]")
+
+
+class ArtifactStore:
+    """
+    A content-addressed store for large execution outputs, kept out of the states of the agent.
+
+    A payload is written once under the SHA-256 hash of its content, in a folder named after the first two
+    characters of the hash. A state, prompt or log holds a short reference to it instead of the payload, so
+    large outputs are neither kept in memory nor copied each time the state is serialized. The reference
+    names the file of the payload, which generated code can open, and the payload is read back with `mmap`.
+
+    Attributes:
+        root (str): The folder of the store.
+        threshold (int): The size in bytes above which `externalize` stores a text.
+        preview_bytes (int): The number of leading bytes of a stored text kept in front of its reference.
+    """
+
+    def __init__(self, root, threshold, preview_bytes=1024):
+        self.root = root
+        self.threshold = threshold
+        self.preview_bytes = preview_bytes
+
+    def put(self, data: bytes) -> str:
+        """
+        Stores a payload, unless a payload with the same content is already stored.
+
+        Args:
+            data (bytes): The payload.
+
+        Returns:
+            str: The SHA-256 hex digest identifying the payload.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+        return digest
+
+    def path(self, digest: str) -> str:
+        """
+        Returns the file of a payload.
+        """
+        return os.path.join(self.root, digest[:2], digest)
+
+    def open(self, digest: str):
+        """
+        Maps a payload into memory, read-only.
+
+        Args:
+            digest (str): The digest of the payload.
+
+        Returns:
+            mmap.mmap: The mapping, to be closed by the caller, or empty bytes for an empty payload, which
+                       cannot be mapped. Both support slicing and the buffer protocol.
+        """
+        with open(self.path(digest), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b''
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read_text(self, digest: str, limit: int = None) -> str:
+        """
+        Returns a stored text, or its first `limit` bytes.
+        """
+        mapping = self.open(digest)
+        try:
+            return mapping[:limit].decode("utf-8", errors="replace")
+        finally:
+            if isinstance(mapping, mmap.mmap):
+                mapping.close()
+
+    def reference(self, digest: str, size: int, kind: str = '') -> str:
+        """
+        Returns the reference to a stored payload.
+
+        Args:
+            digest (str): The digest of the payload.
+            size (int): The size of the payload in bytes.
+            kind (str): A description of the payload, such as its media type, or an empty string.
+        """
+        return ARTIFACT_REF.format(digest=digest, size=size, kind=", " + kind if kind else '', path=self.path(digest))
+
+    def externalize(self, text):
+        """
+        Replaces a text larger than the threshold by a preview of it and a reference to the whole text.
+
+        The preview keeps the first and the last `preview_bytes` bytes of the text, so that the end of a
+        traceback, with the exception raised, stays in it. The last `<return>...</return>` block printed by
+        a Python tool is always kept whole, like `OutputCapture` keeps it, because the result of the tool is
+        read from it.
+
+        Args:
+            text (str): The text, may be None.
+
+        Returns:
+            str: The text itself if it is small enough, otherwise its preview followed by the reference.
+        """
+        if not text or len(text) <= self.threshold // 4:
+            # A text of n characters takes at most 4n bytes in UTF-8
+            return text
+        data = text.encode("utf-8", errors="replace")
+        if len(data) <= self.threshold:
+            return text
+        digest = self.put(data)
+        block = b''
+        start = data.rfind(RETURN_START)
+        end = data.find(RETURN_END, start)
+        if start >= 0 and end >= 0:
+            end += len(RETURN_END)
+            block = data[start:end]
+            data_outside = data[:start] + data[end:]
+        else:
+            data_outside = data
+        if len(data_outside) <= 2 * self.preview_bytes:
+            preview = data_outside.decode("utf-8", errors="replace")
+        else:
+            head = data_outside[:self.preview_bytes].decode("utf-8", errors="ignore")
+            tail = data_outside[-self.preview_bytes:].decode("utf-8", errors="ignore")
+            preview = "{}\n[... {} of {} bytes are left out here ...]\n{}".format(
+                head, len(data_outside) - len(head.encode("utf-8")) - len(tail.encode("utf-8")), len(data), tail)
+        if block:
+            preview = "{}\n{}".format(preview.rstrip("\n"), block.decode("utf-8", errors="replace"))
+        return "{}\n{}".format(preview.rstrip("\n"), self.reference(digest, len(data), "text"))
+
+
+def find_artifacts(text):
+    """
+    Returns the digests of the artifacts referenced by a text, in order of appearance.
+    """
+    return [match.group(1) for match in ARTIFACT_REF_PATTERN.finditer(text or '')]
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_artifact_store(root, threshold):
+    """
+    Returns the artifact store of a folder, shared by the environment, the executor and the planner.
+
+    Args:
+        root (str): The folder of the store.
+        threshold (int): The size in bytes above which texts are stored, taken from the first call for a folder.
+    """
+    root = os.path.abspath(root)
+    with _stores_lock:
+        if root not in _stores:
+            _stores[root] = ArtifactStore(root, threshold)
+        return _stores[root]
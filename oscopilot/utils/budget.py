@@ -0,0 +1,96 @@
+import time
+import contextvars
+
+
+# The budget of the task running in the current context, read by the LLM clients to account for tokens.
+_current_budget = contextvars.ContextVar('current_budget', default=None)
+
+
+class TaskBudget:
+    """
+    A wall-clock and token budget for running one task.
+
+    A budget is low once less than `low_fraction` of its time or tokens is left, at which point the agent
+    switches to cheaper behavior, and exhausted once either limit is reached, at which point the agent
+    stops with the result obtained so far. A limit of None is unlimited.
+
+    Attributes:
+        max_seconds (float): The wall-clock limit in seconds, or None.
+        max_tokens (int): The limit on LLM tokens (prompt and completion), or None.
+        low_fraction (float): The remaining fraction below which the budget is considered low.
+        tokens_used (int): The LLM tokens used so far.
+    """
+
+    def __init__(self, max_seconds=None, max_tokens=None, low_fraction=0.2):
+        self.max_seconds = max_seconds
+        self.max_tokens = max_tokens
+        self.low_fraction = low_fraction
+        self.tokens_used = 0
+        self.start_time = time.monotonic()
+
+    @property
+    def elapsed_seconds(self):
+        return time.monotonic() - self.start_time
+
+    def add_tokens(self, tokens):
+        """
+        Accounts for tokens used by an LLM call.
+        """
+        self.tokens_used += tokens or 0
+
+    def remaining_fraction(self):
+        """
+        Returns the fraction of the scarcer of the two limits that is left, 1.0 for an unlimited budget.
+        """
+        fractions = [1.0]
+        if self.max_seconds:
+            fractions.append(1 - self.elapsed_seconds / self.max_seconds)
+        if self.max_tokens:
+            fractions.append(1 - self.tokens_used / self.max_tokens)
+        return max(0.0, min(fractions))
+
+    def is_low(self):
+        return self.remaining_fraction() < self.low_fraction
+
+    def is_exhausted(self):
+        return self.remaining_fraction() <= 0
+
+    def __str__(self):
+        return "TaskBudget({:.1f}s/{} seconds, {}/{} tokens)".format(
+            self.elapsed_seconds, self.max_seconds, self.tokens_used, self.max_tokens)
+
+
+def get_current_budget():
+    """
+    Returns the budget of the task running in the current context, or None if the task has no budget.
+    """
+    return _current_budget.get()
+
+
+def set_current_budget(budget):
+    """
+    Sets the budget of the task running in the current context.
+
+    Args:
+        budget (TaskBudget): The budget, or None to remove it.
+
+    Returns:
+        contextvars.Token: A token to restore the previous budget with `reset_current_budget`.
+    """
+    return _current_budget.set(budget)
+
+
+def reset_current_budget(token):
+    """
+    Restores the budget that was current before `set_current_budget` returned the token.
+    """
+    _current_budget.reset(token)
+
+
+def record_token_usage(tokens):
+    """
+    Accounts for the tokens of an LLM call in the budget of the current task, if it has one.
+    """
+    budget = get_current_budget()
+    if budget is not None:
+        budget.add_tokens(tokens)
@@ -63,6 +63,37 @@ def setup_config():
     parser.add_argument('--logging_filename', type=str, default='temp0325.log', help='log file name')
     parser.add_argument('--logging_prefix', type=str, default=random_string(16), help='log file prefix')
     parser.add_argument('--score', type=int, default=8, help='critic score > score => store the tool')
+    parser.add_argument('--batch_judge_size', type=int, default=1, help='Max number of independent Shell subtasks judged in one LLM call. Default is 1 (no batching).')
+    parser.add_argument('--direct_invoke', action='store_true', help='Run a stored tool named like the subtask as it is, only generating its invocation, and generate new code only if it fails')
+    parser.add_argument('--native_api', action='store_true', help='Call API subtasks directly with arguments generated as JSON, instead of generating code that calls them')
+    parser.add_argument('--map_subtasks', action='store_true', help='Let the planner create Map subtasks, which apply one generated function to many items over a process pool')
+    parser.add_argument('--map_workers', type=int, default=None, help='Number of processes a Map subtask fans out over. Default is the number of CPU cores.')
+    parser.add_argument('--fast_path', action='store_true', help='Plan single-step tasks and generate their code in one LLM call')
+    parser.add_argument('--time_budget', type=float, default=None, help='Wall-clock budget of a task in seconds. Default is no limit.')
+    parser.add_argument('--token_budget', type=int, default=None, help='LLM token budget of a task. Default is no limit.')
+    parser.add_argument('--trace_path', type=str, default=None, help='Record the LLM calls and executions of each run into this trace bundle, for FridayAgent.replay. The tasks of FridayAgent.run_many are recorded into one bundle each, e.g. trace.0.json')
+    parser.add_argument('--shell_session', action='store_true', help='Run the Shell subtasks of a task in one persistent bash session, keeping the working directory and exported variables between them')
+    parser.add_argument('--kernel_pool_size', type=int, default=0, help='Number of idle Jupyter kernels kept for reuse by the Python steps of the environment. Default is 0 (a new kernel per step).')
+    parser.add_argument('--kernel_affinity', action='store_true', help='Run the kernel steps of a task on the same pooled kernel, keeping its variables between them')
+    parser.add_argument('--kernel_reset', action='store_true', help='Clear the namespace of a pooled kernel with %%reset -f before another step or task reuses it')
+    parser.add_argument('--prewarm', type=str, default='', help='Comma-separated languages whose processes start in the background while a task is planned: Python (the kernel pool, see --kernel_pool_size) and Shell (the shell session, see --shell_session)')
+    parser.add_argument('--python_workers', type=int, default=0, help='Number of warm Python worker processes executing generated Python tools. Default is 0 (a new interpreter per execution).')
+    parser.add_argument('--python_worker_preload', type=str, default='openpyxl,pandas,requests', help='Comma-separated modules imported by every Python worker at startup')
+    parser.add_argument('--python_worker_max_runs', type=int, default=50, help='Number of executions after which a Python worker is replaced')
+    parser.add_argument('--python_worker_max_rss_mb', type=int, default=1024, help='Memory in MB above which a Python worker is replaced')
+    parser.add_argument('--wheelhouse', type=str, default=None, help='Local directory of wheels that the modules missing from generated Python code are installed from before it runs, without network access')
+    parser.add_argument('--module_index_size', type=int, default=300, help='Max number of installed third-party modules listed in the Python code generation prompts. 0 omits the list.')
+    parser.add_argument('--exec_timeout', type=float, default=300, help='Wall-clock seconds after which the execution of generated code is stopped. 0 disables the timeout.')
+    parser.add_argument('--exec_cpu_seconds', type=int, default=None, help='CPU seconds each process of generated code may use (POSIX only)')
+    parser.add_argument('--exec_memory_mb', type=int, default=None, help='Address space in MB each process of generated code may use (POSIX only)')
+    parser.add_argument('--exec_max_output_bytes', type=int, default=1000000, help='Bytes of stdout and of stderr kept per execution of generated code, the rest is dropped')
+    parser.add_argument('--spill_output', action='store_true', help='Write the full stdout and stderr of each execution to log files in the temp dir, outside the working dir')
+    parser.add_argument('--artifact_threshold', type=int, default=None, help='Size in bytes above which execution outputs, return values and images are written to an artifacts folder in the temp dir, outside the working dir, and referenced by content hash. Default is to keep them inline.')
+    parser.add_argument('--rollback_on_failure', action='store_true', help='Checkpoint the working dir before each execution and restore it before a failed tool is re-run or replanned. Disabled in FridayAgent.run_many when more than one task runs at a time, as the tasks share the working dir.')
+    parser.add_argument('--rollback_max_mb', type=int, default=512, help='Size in MB of the working dir above which no rollback checkpoint is taken')
+    parser.add_argument('--concurrency', type=int, default=1, help='Max number of tasks run at the same time by FridayAgent.run_many. Default is 1.')
+    parser.add_argument('--fs_snapshot_hash', action='store_true', help='Hash file contents when diffing the working dir around each execution, instead of comparing size and mtime only')
+    parser.add_argument('--fs_snapshot_max_entries', type=int, default=5000, help='Max number of working dir entries snapshotted around each execution. Larger dirs fall back to a plain listing.')
 
 
     # for Self-Leanring
@@ -0,0 +1,271 @@
+import os
+import time
+import signal
+import asyncio
+import subprocess
+import threading
+from oscopilot.utils.config import Config
+from oscopilot.utils.output_capture import OutputCapture
+
+try:
+    import resource
+except ImportError:
+    # Resource limits are not available on Windows, only the wall-clock timeout and output caps apply there.
+    resource = None
+
+# Whether the limits of a started process can be set from outside it (Linux). Then no code has to run in the
+# child between fork and exec, which is not safe when the parent has threads, as the child may deadlock.
+HAS_PRLIMIT = resource is not None and hasattr(resource, 'prlimit')
+
+# The prefix of the errors reported for code stopped by an execution limit, which the judge prompt refers to.
+LIMIT_ERROR_PREFIX = 'ExecutionLimitError'
+
+# Extra CPU seconds between the SIGXCPU of the soft limit and the SIGKILL of the hard limit.
+CPU_LIMIT_GRACE_SECONDS = 5
+
+READ_CHUNK_SIZE = 65536
+
+
+class ExecutionLimits:
+    """
+    The limits applied to every execution of generated code.
+
+    A limit of None (or 0) is unlimited.
+
+    Attributes:
+        timeout (float): The wall-clock time in seconds after which the execution is stopped.
+        cpu_seconds (int): The CPU time in seconds a process of the execution may use (RLIMIT_CPU).
+        memory_mb (int): The address space in megabytes a process of the execution may use (RLIMIT_AS).
+        max_output_bytes (int): The number of bytes kept of stdout and of stderr each, besides the return
+                                block; the middle of a longer output is dropped.
+    """
+
+    def __init__(self, timeout=None, cpu_seconds=None, memory_mb=None, max_output_bytes=None):
+        self.timeout = timeout or None
+        self.cpu_seconds = cpu_seconds or None
+        self.memory_mb = memory_mb or None
+        self.max_output_bytes = max_output_bytes or None
+
+    @classmethod
+    def from_config(cls):
+        """
+        Creates the limits set by the `exec_*` configuration parameters.
+        """
+        return cls(
+            Config.get_parameter('exec_timeout'),
+            Config.get_parameter('exec_cpu_seconds'),
+            Config.get_parameter('exec_memory_mb'),
+            Config.get_parameter('exec_max_output_bytes'),
+        )
+
+    def preexec_fn(self):
+        """
+        Returns a function applying the resource limits in a child process before it starts, or None if there
+        are no resource limits to apply or if they are applied with `limit_process` once the process started.
+        """
+        if resource is None or HAS_PRLIMIT or not (self.cpu_seconds or self.memory_mb):
+            return None
+        cpu_seconds, memory_mb = self.cpu_seconds, self.memory_mb
+        return lambda: apply_resource_limits(cpu_seconds, memory_mb)
+
+    def limit_process(self, pid):
+        """
+        Applies the resource limits to a started child process with `prlimit`, where it is available.
+
+        Called right after the process started, in place of `preexec_fn`. The processes it starts afterwards
+        inherit the limits, and the CPU time it used before counts towards its limit.
+
+        Args:
+            pid (int): The process ID of the child process.
+        """
+        if not HAS_PRLIMIT or pid is None or not (self.cpu_seconds or self.memory_mb):
+            return
+        apply_resource_limits(self.cpu_seconds, self.memory_mb, pid)
+
+    def timeout_error(self):
+        return "{}: the execution exceeded the wall-clock limit of {} seconds and was stopped.".format(
+            LIMIT_ERROR_PREFIX, format_seconds(self.timeout))
+
+    def exit_error(self, returncode):
+        """
+        Returns the error for a process that was killed for exceeding its CPU time limit, or None.
+
+        Args:
+            returncode (int): The return code of the process, negative for a signal, or 128 plus the signal
+                              for a shell reporting the signal of its last command.
+        """
+        if resource is None or not self.cpu_seconds:
+            return None
+        if returncode not in (-signal.SIGXCPU, 128 + signal.SIGXCPU):
+            return None
+        return "{}: the execution exceeded the CPU time limit of {} seconds and was stopped.".format(
+            LIMIT_ERROR_PREFIX, self.cpu_seconds)
+
+
+def format_seconds(seconds):
+    return '{:g}'.format(seconds)
+
+
+def apply_resource_limits(cpu_seconds=None, memory_mb=None, pid=None):
+    """
+    Lowers the CPU time and address space limits of the current process, or of the process `pid`.
+
+    Errors are ignored rather than preventing the execution (macOS, for instance, does not support RLIMIT_AS,
+    and the process may already have exited).
+    """
+    if cpu_seconds:
+        lower_resource_limit(resource.RLIMIT_CPU, int(cpu_seconds), int(cpu_seconds) + CPU_LIMIT_GRACE_SECONDS, pid)
+    if memory_mb:
+        memory_bytes = int(memory_mb) * 1024 * 1024
+        lower_resource_limit(resource.RLIMIT_AS, memory_bytes, memory_bytes, pid)
+
+
+def lower_resource_limit(kind, soft, hard, pid=None):
+    try:
+        _, current_hard = resource.getrlimit(kind) if pid is None else resource.prlimit(pid, kind)
+        if current_hard != resource.RLIM_INFINITY:
+            soft, hard = min(soft, current_hard), min(hard, current_hard)
+        if pid is None:
+            resource.setrlimit(kind, (soft, hard))
+        else:
+            resource.prlimit(pid, kind, (soft, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def kill_process_tree(process):
+    """
+    Kills a process started by `run_with_limits`, together with the processes it started.
+    """
+    try:
+        if os.name == 'posix':
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def finish_limited_run(limits, returncode, stdout, stderr, timed_out):
+    """
+    Returns the outcome of a limited run, with the error of the exceeded limit appended to stderr.
+    """
+    stdout, stderr = stdout.getvalue(), stderr.getvalue()
+    error = limits.timeout_error() if timed_out else limits.exit_error(returncode)
+    if error:
+        if stderr and not stderr.endswith('\n'):
+            stderr += '\n'
+        stderr += error + '\n'
+        returncode = returncode or 1
+    return returncode, stdout, stderr
+
+
+def open_captures(limits, log_prefix=None):
+    """
+    Creates the stdout and stderr captures of a run, spilling the full streams to `log_prefix`.stdout.log and
+    `log_prefix`.stderr.log if a prefix is given.
+    """
+    return tuple(
+        OutputCapture(limits.max_output_bytes, None if log_prefix is None else '{}.{}.log'.format(log_prefix, name))
+        for name in ('stdout', 'stderr')
+    )
+
+
+def run_with_limits(args, limits, shell=False, cwd=None, log_prefix=None):
+    """
+    Runs a command with execution limits, like `subprocess.run` with `capture_output=True`.
+
+    The command runs in its own process group, so that on timeout the processes it started are killed with
+    it. The execution lasts until the command has exited and its output pipes are closed.
+
+    Args:
+        args (list[str] | str): The command, a string if `shell` is True.
+        limits (ExecutionLimits): The limits to apply.
+        shell (bool): Whether to run the command through the shell.
+        cwd (str): The directory to run the command in.
+        log_prefix (str): The path prefix of the log files the full output is written to, or None.
+
+    Returns:
+        tuple: The returncode, stdout and stderr of the command. If a limit was exceeded, stderr ends with
+               an `ExecutionLimitError` line and the returncode is non-zero.
+    """
+    process = subprocess.Popen(
+        args,
+        shell=shell,
+        cwd=cwd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        preexec_fn=limits.preexec_fn(),
+        start_new_session=os.name == 'posix',
+    )
+    limits.limit_process(process.pid)
+    stdout, stderr = open_captures(limits, log_prefix)
+    readers = [
+        threading.Thread(target=pump_stream, args=(process.stdout, stdout), daemon=True),
+        threading.Thread(target=pump_stream, args=(process.stderr, stderr), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+    deadline = None if limits.timeout is None else time.monotonic() + limits.timeout
+    timed_out = False
+    try:
+        process.wait(timeout=limits.timeout)
+        # Processes left running in the background may still hold the output pipes open
+        for reader in readers:
+            reader.join(None if deadline is None else max(0, deadline - time.monotonic()))
+        timed_out = any(reader.is_alive() for reader in readers)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+    if timed_out:
+        kill_process_tree(process)
+        process.wait()
+        for reader in readers:
+            reader.join(1)
+    return finish_limited_run(limits, process.returncode, stdout, stderr, timed_out)
+
+
+async def arun_with_limits(args, limits, shell=False, cwd=None, log_prefix=None):
+    """
+    Asynchronous variant of `run_with_limits`, running the command as an asyncio subprocess.
+    """
+    kwargs = dict(
+        cwd=cwd,
+        stdin=subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        preexec_fn=limits.preexec_fn(),
+        start_new_session=os.name == 'posix',
+    )
+    if shell:
+        process = await asyncio.create_subprocess_shell(args, **kwargs)
+    else:
+        process = await asyncio.create_subprocess_exec(*args, **kwargs)
+    limits.limit_process(process.pid)
+    stdout, stderr = open_captures(limits, log_prefix)
+    timed_out = False
+    try:
+        await asyncio.wait_for(asyncio.gather(
+            apump_stream(process.stdout, stdout),
+            apump_stream(process.stderr, stderr),
+            process.wait(),
+        ), limits.timeout)
+    except asyncio.TimeoutError:
+        timed_out = True
+        kill_process_tree(process)
+        await process.wait()
+    return finish_limited_run(limits, process.returncode, stdout, stderr, timed_out)
+
+
+def pump_stream(stream, output):
+    with stream:
+        for chunk in iter(lambda: stream.read1(READ_CHUNK_SIZE), b''):
+            output.write(chunk)
+
+
+async def apump_stream(stream, output):
+    while True:
+        chunk = await stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        output.write(chunk)
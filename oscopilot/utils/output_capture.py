@@ -0,0 +1,156 @@
+import os
+
+
+# The markers around the return value printed by an executed Python tool.
+RETURN_START = b'<return>'
+RETURN_END = b'</return>'
+
+
+class OutputCapture:
+    """
+    A bounded capture of a process output stream.
+
+    Only the first and the last bytes of the stream are kept, half of `max_bytes` each, along with byte and
+    line counts of the whole stream, so that chatty code costs neither memory nor repeated string building.
+    The `<return>...</return>` block printed by a Python tool is always kept whole, wherever it falls in the
+    stream, because the result of the tool is read from it. The full stream can be written to a log file.
+
+    Attributes:
+        max_bytes (int): The number of bytes kept besides the return block, or None to keep everything.
+        spill_path (str): The file the full stream is written to, or None.
+        total_bytes (int): The number of bytes written to the capture.
+        total_lines (int): The number of lines written to the capture.
+    """
+
+    def __init__(self, max_bytes=None, spill_path=None):
+        self.max_bytes = max_bytes
+        self.head_limit = None if max_bytes is None else max_bytes // 2
+        self.tail_limit = None if max_bytes is None else max_bytes - self.head_limit
+        self.spill_path = spill_path
+        self.spill_file = None
+        self.total_bytes = 0
+        self.total_lines = 0
+        self.head = bytearray()
+        self.tail = bytearray()
+        # Number of bytes written outside the return block, of which head and tail are the first and last
+        self.stream_bytes = 0
+        # Bytes held back because they may be the beginning of a split return marker
+        self.pending = b''
+        self.block = None
+        self.block_complete = False
+        self.block_offset = 0
+
+    def write(self, data):
+        """
+        Adds bytes of the stream to the capture.
+        """
+        if not data:
+            return
+        self.total_bytes += len(data)
+        self.total_lines += data.count(b'\n')
+        if self.spill_path is not None:
+            if self.spill_file is None:
+                os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+                self.spill_file = open(self.spill_path, 'wb')
+            self.spill_file.write(data)
+        self.route(data)
+
+    def route(self, data):
+        """
+        Sends bytes to the return block while one is open, and to the head and tail otherwise.
+        """
+        while data:
+            if self.block is not None and not self.block_complete:
+                search_from = max(0, len(self.block) - len(RETURN_END))
+                self.block += data
+                end = self.block.find(RETURN_END, search_from)
+                if end < 0:
+                    return
+                end += len(RETURN_END)
+                if self.block[end:end + 1] == b'\n':
+                    end += 1
+                data = bytes(self.block[end:])
+                del self.block[end:]
+                self.block_complete = True
+                continue
+            data = self.pending + data
+            start = data.find(RETURN_START)
+            if start < 0:
+                # Hold back a possible beginning of the start marker until more data arrives
+                keep = len(RETURN_START) - 1
+                self.pending = data[-keep:]
+                self.keep(data[:-keep])
+                return
+            self.pending = b''
+            self.keep(data[:start])
+            if self.block is not None:
+                # Only the last return block is the result, an earlier one is ordinary output
+                self.keep(bytes(self.block))
+            self.block = bytearray()
+            self.block_complete = False
+            self.block_offset = self.stream_bytes
+            data = data[start:]
+
+    def keep(self, data):
+        """
+        Adds bytes outside the return block to the head, or to the tail ring buffer once the head is full.
+        """
+        if not data:
+            return
+        self.stream_bytes += len(data)
+        if self.head_limit is None:
+            self.head += data
+            return
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if not data:
+            return
+        self.tail += data
+        # Trim the ring buffer only once it doubled, so trimming costs constant time per byte
+        if len(self.tail) > 2 * self.tail_limit:
+            del self.tail[:len(self.tail) - self.tail_limit]
+
+    @property
+    def dropped_bytes(self):
+        return self.stream_bytes - len(self.head) - min(len(self.tail), self.tail_limit or 0)
+
+    def getvalue(self):
+        """
+        Returns the captured text: the head, a note on the dropped bytes if any, the tail, and the return
+        block at its original position.
+        """
+        if self.pending:
+            self.keep(self.pending)
+            self.pending = b''
+        self.close()
+        head = bytes(self.head)
+        tail = bytes(self.tail[-self.tail_limit:]) if self.tail_limit else bytes(self.tail)
+        dropped = self.dropped_bytes
+        note = self.dropped_note(dropped).encode() if dropped else b''
+        block = bytes(self.block) if self.block is not None else b''
+        offset = self.block_offset
+        tail_start = self.stream_bytes - len(tail)
+        if offset <= len(head):
+            parts = [head[:offset], block, head[offset:], note, tail]
+        elif offset >= tail_start:
+            parts = [head, note, tail[:offset - tail_start], block, tail[offset - tail_start:]]
+        else:
+            parts = [head, note, block, tail]
+        return b''.join(parts).decode(errors='replace')
+
+    def dropped_note(self, dropped):
+        note = "\n[... {} bytes of output were dropped, {} bytes in {} lines in total".format(
+            dropped, self.total_bytes, self.total_lines)
+        if self.spill_path is not None:
+            note += ", the full output is in {}".format(self.spill_path)
+        return note + " ...]\n"
+
+    def close(self):
+        """
+        Closes the log file of the capture, if any.
+        """
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
@@ -51,6 +51,7 @@ class EnvState:
     error: Optional[str] = None
     pwd: Optional[str] = ''
     ls: Optional[str] = ''
+    fs_diff: Optional[str] = ''
 
     def __str__(self):
         return (f"Result: {self.result}\n"
@@ -70,6 +71,7 @@ class ExecutionState:
     code: str = ''
     result: str = ''
     relevant_code: str = ''
+    invoke: str = ''
 
     def get_all_state(self):
         return self.state, self.node_type, self.description, self.code, self.result, self.relevant_code
@@ -78,4 +80,5 @@ class ExecutionState:
 class TaskStatusCode(IntEnum):
     START = 1
     FAILED = 6
-    COMPLETED = 7
\ No newline at end of file
+    COMPLETED = 7
+    BUDGET_EXHAUSTED = 8
\ No newline at end of file
@@ -0,0 +1,212 @@
+import os
+import json
+import hashlib
+import logging
+import contextvars
+from contextlib import contextmanager
+
+
+# The trace being recorded or replayed by the task running in the current context.
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+# The attributes of an execution state kept in a trace.
+TRACE_STATE_FIELDS = ('result', 'error', 'pwd', 'ls', 'fs_diff', 'static_check_failed')
+
+TRACE_VERSION = 1
+
+
+class TraceMismatchError(Exception):
+    """
+    Raised when a replayed run asks for an event the trace does not contain at that point.
+    """
+
+
+class TraceRecorder:
+    """
+    Records the LLM calls, tool retrievals and tool executions of one run into a trace bundle.
+
+    Every event keeps the time it took, so that the agent's own overhead can be told apart from model and
+    execution latency.
+
+    Attributes:
+        task (str): The task of the recorded run.
+        events (list[dict]): The recorded events, in order.
+    """
+    replaying = False
+
+    def __init__(self, task):
+        self.task = task
+        self.events = []
+
+    def record_llm(self, messages, response, seconds):
+        self.events.append({'kind': 'llm', 'key': message_key(messages), 'response': response, 'seconds': seconds})
+
+    def record_retrieval(self, query, tool_names, seconds):
+        self.events.append({'kind': 'retrieve', 'key': query, 'response': tool_names, 'seconds': seconds})
+
+    def record_step(self, code, node_type, state, seconds):
+        self.events.append({
+            'kind': 'step',
+            'key': message_key([node_type, code]),
+            'response': {field: getattr(state, field, None) for field in TRACE_STATE_FIELDS},
+            'seconds': seconds,
+        })
+
+    def to_bundle(self):
+        return {'version': TRACE_VERSION, 'task': self.task, 'events': self.events}
+
+    def save(self, path):
+        """
+        Writes the trace bundle to a JSON file.
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_bundle(), f, ensure_ascii=False, indent=2)
+        print("The trace of the run has been saved to {}.".format(path))
+
+
+class TraceReplayer:
+    """
+    Replays a recorded trace bundle: LLM responses, retrieved tools and execution states are served from
+    the bundle in recording order, without network access or real execution.
+
+    Attributes:
+        task (str): The task of the recorded run.
+        events (list[dict]): The recorded events.
+        strict (bool): Whether a request that differs from the recorded one raises, instead of being logged.
+        position (int): The index of the next event to replay.
+        recorded_seconds (float): The total time the replayed events took when they were recorded.
+    """
+    replaying = True
+
+    def __init__(self, bundle, strict=False):
+        if bundle.get('version') != TRACE_VERSION:
+            raise ValueError("Unsupported trace version: {}".format(bundle.get('version')))
+        self.task = bundle['task']
+        self.events = bundle['events']
+        self.strict = strict
+        self.position = 0
+        self.recorded_seconds = 0.0
+
+    @classmethod
+    def load(cls, path, strict=False):
+        """
+        Loads a trace bundle from a JSON file.
+        """
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f), strict)
+
+    def replay_llm(self, messages):
+        return self.next_event('llm', message_key(messages))
+
+    def replay_retrieval(self, query):
+        return self.next_event('retrieve', query)
+
+    def replay_step(self, code, node_type):
+        return self.next_event('step', message_key([node_type, code]))
+
+    def next_event(self, kind, key):
+        """
+        Returns the recorded response of the next event.
+
+        Args:
+            kind (str): The kind of event requested: 'llm', 'retrieve' or 'step'.
+            key (str): The key of the request, compared with the recorded one.
+
+        Returns:
+            The recorded response.
+
+        Raises:
+            TraceMismatchError: If the trace is exhausted or its next event is of another kind, or, in strict
+                                mode, if the request differs from the recorded one.
+        """
+        if self.position >= len(self.events):
+            raise TraceMismatchError("The trace has no more events, a '{}' event was requested.".format(kind))
+        event = self.events[self.position]
+        if event['kind'] != kind:
+            raise TraceMismatchError("Event {} of the trace is a '{}' event, a '{}' event was requested.".format(
+                self.position, event['kind'], kind))
+        if event['key'] != key:
+            message = "The '{}' request of event {} differs from the recorded one.".format(kind, self.position)
+            if self.strict:
+                raise TraceMismatchError(message)
+            logging.warning(message)
+        self.position += 1
+        self.recorded_seconds += event['seconds']
+        return event['response']
+
+
+def message_key(messages):
+    """
+    Returns a short, stable key identifying a request, so traces stay small.
+    """
+    return hashlib.sha256(json.dumps(messages, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
+
+def get_current_trace():
+    """
+    Returns the trace recorded or replayed in the current context, or None.
+    """
+    return _current_trace.get()
+
+
+def is_replaying():
+    """
+    Returns whether a trace is replayed in the current context, in which case nothing may be executed or stored.
+    """
+    trace = _current_trace.get()
+    return trace is not None and trace.replaying
+
+
+def task_trace_path(path, index):
+    """
+    Returns the path of the trace bundle of one of several tasks recorded with the same `trace_path` setting.
+
+    Args:
+        path (str): The configured path, e.g. 'trace.json', or None.
+        index (int): The index of the task.
+
+    Returns:
+        str: The path with the index before its extension, e.g. 'trace.3.json', or None if `path` is None.
+    """
+    if not path:
+        return path
+    root, extension = os.path.splitext(path)
+    return "{}.{}{}".format(root, index, extension)
+
+
+@contextmanager
+def recording_trace(task, path):
+    """
+    Records the run executed within the context and saves its trace bundle on exit.
+
+    Nothing is recorded if `path` is empty or a trace is already being recorded or replayed.
+
+    Args:
+        task (str): The task of the run.
+        path (str): The path of the trace bundle to write.
+    """
+    if not path or get_current_trace() is not None:
+        yield None
+        return
+    recorder = TraceRecorder(task)
+    token = _current_trace.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current_trace.reset(token)
+        recorder.save(path)
+
+
+@contextmanager
+def replaying_trace(replayer):
+    """
+    Replays a trace for the run executed within the context.
+
+    Args:
+        replayer (TraceReplayer): The trace to replay.
+    """
+    token = _current_trace.set(replayer)
+    try:
+        yield replayer
+    finally:
+        _current_trace.reset(token)
@@ -14,7 +14,10 @@ import random
 from datasets import load_dataset
 from oscopilot.prompts.general_pt import prompt as general_pt
 from oscopilot.utils.llms import OpenAI
+from oscopilot.utils.trace import get_current_trace
 import platform
+import time
+import inspect
 from functools import wraps
 
 
@@ -329,12 +332,46 @@ def send_chat_prompts(sys_prompt, user_prompt, llm, prefix=""):
         The response from the language learning model, which is typically a string containing the model's answer or generated content based on the provided prompts.
 
     The function is a utility for simplifying the process of sending structured chat prompts to a language learning model and parsing its response, useful in scenarios where dynamic interaction with the model is required.
+    While a trace is recorded the request and response are added to it, and while a trace is replayed the recorded response is returned without calling the model.
     """
     message = [
             {"role": "system", "content": sys_prompt},
             {"role": "user", "content": user_prompt},
         ]
-    return llm.chat(message, prefix=prefix)
+    trace = get_current_trace()
+    if trace is not None and trace.replaying:
+        return trace.replay_llm(message)
+    start_time = time.perf_counter()
+    response = llm.chat(message, prefix=prefix)
+    if trace is not None:
+        trace.record_llm(message, response, time.perf_counter() - start_time)
+    return response
+
+
+async def asend_chat_prompts(sys_prompt, user_prompt, llm, prefix=""):
+    """
+    Asynchronous variant of `send_chat_prompts`, awaiting the `achat` method of the language learning model.
+
+    Args:
+        sys_prompt (str): The system prompt that sets the context or provides instructions for the language learning model.
+        user_prompt (str): The user prompt that contains the specific query or command intended for the language learning model.
+        llm (object): The language learning model to which the prompts are sent. This model is expected to have an `achat` coroutine method.
+
+    Returns:
+        The response from the language learning model.
+    """
+    message = [
+            {"role": "system", "content": sys_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
+    trace = get_current_trace()
+    if trace is not None and trace.replaying:
+        return trace.replay_llm(message)
+    start_time = time.perf_counter()
+    response = await llm.achat(message, prefix=prefix)
+    if trace is not None:
+        trace.record_llm(message, response, time.perf_counter() - start_time)
+    return response
 
 
 def get_project_root_path():
@@ -478,6 +515,7 @@ def api_exception_mechanism(max_retries=3):
     """
     A decorator to add a retry mechanism to functions, particularly for handling API calls.
     This decorator will retry a function up to `max_retries` times if an exception is raised.
+    Coroutine functions are supported as well, their wrapper is a coroutine function too.
 
     Args:
     max_retries (int): The maximum number of retries allowed before giving up and re-raising the exception.
@@ -495,6 +533,24 @@ def api_exception_mechanism(max_retries=3):
         Returns:
         function: The wrapped function with retry logic.
         """
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                """
+                The asynchronous counterpart of `wrapper`, awaiting the decorated coroutine function.
+                """
+                attempts = 0
+                while attempts < max_retries:
+                    try:
+                        return await func(*args, **kwargs)
+                    except Exception as e:
+                        attempts += 1
+                        logging.error(f"Error on attempt {attempts} in {func.__name__}: {str(e)}")
+                        if attempts == max_retries:
+                            logging.error(f"Max retries reached in {func.__name__}, operation failed.")
+                            raise
+            return async_wrapper
+
         @wraps(func)
         def wrapper(*args, **kwargs):
             """
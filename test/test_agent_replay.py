@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+from oscopilot import FridayAgent, FridayExecutor
+from oscopilot.utils import send_chat_prompts
+
+
+class StubLLM:
+    """
+    Stands for the LLM client, counting the calls that reach it.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def chat(self, messages, prefix=""):
+        self.calls += 1
+        return "print({!r})".format(messages[-1]["content"])
+
+
+class StubToolManager:
+    """
+    Stands for the tool repository, recording the tools added to it.
+    """
+
+    def __init__(self, generated_tool_repo_path=None):
+        self.added = []
+
+    def exist_tool(self, tool):
+        return False
+
+    def add_new_tool(self, tool_info):
+        self.added.append(tool_info)
+
+
+class StubPlanner:
+    def __init__(self, prompt):
+        pass
+
+
+class StubRetriever:
+    def __init__(self, prompt, tool_manager):
+        pass
+
+
+class StubExecutor(FridayExecutor):
+    """
+    The executor with its tool storage, recording the kernels and shells it is asked to prewarm.
+    """
+
+    def __init__(self, prompt, tool_manager, max_iter=3):
+        self.tool_manager = tool_manager
+        self.prewarmed = []
+
+    def prewarm(self, languages):
+        self.prewarmed.append(languages)
+
+    def warmup_metrics(self):
+        return {}
+
+    def close_shell_session(self):
+        pass
+
+    def release_kernel(self):
+        pass
+
+
+class TestAgentReplay:
+    """
+    A test class for verifying that a recorded run is replayed without calling the LLM, prewarming or storing tools.
+    """
+
+    def test_record_and_replay(self, tmp_path):
+        """
+        Test that replaying a recorded run serves the recorded LLM response and has none of the side effects of the run.
+        """
+        trace_path = tmp_path / "trace.json"
+        config = SimpleNamespace(
+            generated_tool_repo_path=None, max_repair_iterations=1, score=0, fast_path=False, direct_invoke=False,
+            native_api=False, batch_judge_size=1, prewarm='Python,Shell', time_budget=None, token_budget=None,
+            trace_path=str(trace_path), concurrency=1,
+        )
+        agent = FridayAgent(StubPlanner, StubRetriever, StubExecutor, StubToolManager, config=config)
+        llm = StubLLM()
+
+        def plan_and_execute(task):
+            code = send_chat_prompts("Write the code of the task.", task, llm)
+            agent.inner_monologue.result = code
+            agent.store_tool("print_task", '"""\nPrints the task.\n"""\n' + code)
+
+        agent.plan_and_execute = plan_and_execute
+        agent.run("say hi")
+        assert trace_path.exists() and agent.inner_monologue.result == "print('say hi')"
+        assert llm.calls == 1 and len(agent.tool_manager.added) == 1
+        assert agent.executor.prewarmed == [["Python", "Shell"]]
+
+        agent.inner_monologue.result = ''
+        replayer = agent.replay(str(trace_path), strict=True)
+        assert replayer.position == 1 and agent.inner_monologue.result == "print('say hi')"
+        assert llm.calls == 1 and len(agent.tool_manager.added) == 1
+        assert agent.executor.prewarmed == [["Python", "Shell"]]
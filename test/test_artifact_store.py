@@ -0,0 +1,47 @@
+import os
+from oscopilot.utils.artifact_store import ArtifactStore, find_artifacts
+
+
+class TestArtifactStore:
+    """
+    A test class for verifying that large outputs are stored once by content and referenced from states.
+    """
+
+    def test_put_once_and_read(self, tmp_path):
+        """
+        Test that a payload is stored once under its content hash and read back through a memory map.
+        """
+        store = ArtifactStore(str(tmp_path), threshold=16)
+        digest = store.put(b"payload")
+        mtime = os.stat(store.path(digest)).st_mtime_ns
+        assert store.put(b"payload") == digest and os.stat(store.path(digest)).st_mtime_ns == mtime
+        assert store.read_text(digest) == "payload" and store.read_text(digest, 3) == "pay"
+        assert store.read_text(store.put(b"")) == ""
+
+    def test_externalize(self, tmp_path):
+        """
+        Test that only texts above the threshold are replaced by a preview and a reference to the whole text.
+        """
+        store = ArtifactStore(str(tmp_path), threshold=100, preview_bytes=10)
+        assert store.externalize("short") == "short" and store.externalize(None) is None
+        text = "line of output\n" * 100
+        externalized = store.externalize(text)
+        assert externalized.startswith(text[:10]) and len(externalized) < 300
+        digests = find_artifacts(externalized)
+        assert len(digests) == 1 and store.read_text(digests[0]) == text
+        assert store.path(digests[0]) in externalized
+
+    def test_externalize_keeps_traceback_end_and_return_block(self, tmp_path):
+        """
+        Test that the preview of a long traceback keeps the raised exception, and that of a long result its return block.
+        """
+        store = ArtifactStore(str(tmp_path), threshold=1000, preview_bytes=200)
+        frames = "".join('  File "/tmp/tool.py", line {}, in step_{}\n    step_{}()\n'.format(i, i, i + 1) for i in range(60))
+        traceback = "Traceback (most recent call last):\n" + frames + "ModuleNotFoundError: No module named 'docx'\n"
+        externalized = store.externalize(traceback)
+        assert len(traceback) > 3000 and len(externalized) < 1000
+        assert externalized.startswith("Traceback") and "ModuleNotFoundError: No module named 'docx'" in externalized
+        result = "progress\n" * 500 + "<return>\n{'rows': 42}\n</return>\n" + "done\n" * 100
+        externalized = store.externalize(result)
+        assert "<return>\n{'rows': 42}\n</return>" in externalized and len(externalized) < 1000
+        assert store.read_text(find_artifacts(externalized)[0]) == result
@@ -0,0 +1,77 @@
+import os
+import asyncio
+import pytest
+from oscopilot.environments.bash_env import Shell
+
+
+async def collect(env, code):
+    return [output async for output in env.astep(code)]
+
+
+def outputs_of(messages):
+    return [(message["content"].strip(), message.get("stream")) for message in messages
+            if message["format"] == "output" and message["content"].strip()]
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="The shell environment echoes the end marker to stderr on POSIX only")
+class TestAstep:
+    """
+    A test class for verifying the asyncio-native steps of the subprocess environments.
+    """
+
+    def test_same_messages_as_step(self):
+        """
+        Test that astep yields the same output messages as step, in the same process across steps.
+        """
+        env = Shell()
+        code = "echo one\necho two >&2\nexport KEPT=three"
+        try:
+            expected = outputs_of(list(env.step(code)))
+
+            async def run():
+                first = await collect(env, code)
+                second = await collect(env, "echo $KEPT")
+                await env.aterminate()
+                return first, second
+
+            first, second = asyncio.run(run())
+            assert outputs_of(first) == expected
+            assert outputs_of(second) == [("three", "stdout")]
+        finally:
+            env.terminate()
+
+    def test_concurrent_steps(self, tmp_path):
+        """
+        Test that one event loop runs the steps of several environments at the same time.
+
+        Each step marks that it started and waits for the steps of all environments to have started, a barrier
+        that steps run one after the other cannot pass.
+        """
+        envs = [Shell() for _ in range(4)]
+        barrier = ("touch {dir}/{index}\n"
+                   "for _ in $(seq 200); do [ $(ls {dir} | wc -l) -eq {count} ] && break; sleep 0.05; done\n"
+                   "[ $(ls {dir} | wc -l) -eq {count} ] && echo {index} || echo alone")
+
+        async def run():
+            results = await asyncio.gather(*(collect(env, barrier.format(dir=tmp_path, index=index, count=len(envs)))
+                                             for index, env in enumerate(envs)))
+            await asyncio.gather(*(env.aterminate() for env in envs))
+            return results
+
+        results = asyncio.run(run())
+        assert [outputs_of(messages) for messages in results] == [[(str(index), "stdout")] for index in range(4)]
+
+    def test_interrupt_output_stays_in_its_step(self):
+        """
+        Test that astep reads the output following a KeyboardInterrupt line within its step, leaving nothing to the next ones.
+        """
+        env = Shell()
+        steps = ["echo KeyboardInterrupt >&2; sleep 0.2; echo after", "echo second", "echo third"]
+
+        async def run():
+            results = [outputs_of(await collect(env, code)) for code in steps]
+            await env.aterminate()
+            return results
+
+        results = asyncio.run(run())
+        assert [[content for content, _ in outputs] for outputs in results] == [["KeyboardInterrupt", "after"], ["second"], ["third"]]
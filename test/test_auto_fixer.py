@@ -0,0 +1,66 @@
+import pytest
+from oscopilot.modules.executor.auto_fixer import auto_fix_tool
+
+
+class TestAutoFixer:
+    """
+    A test class for verifying the rule-based repair of mechanical errors in generated code.
+
+    Each rule must fix the error it targets without an LLM call, and leave the tool untouched when no
+    rule applies so that the LLM repair takes over.
+    """
+
+    code = '''
+def count_lines(file_path):
+    """
+    Count the lines of a text file.
+    """
+    with open(file_path) as f:
+        return len(f.readlines())
+'''
+
+    def test_missing_import(self):
+        """
+        Test that a standard library module reported by a NameError is imported.
+        """
+        code = "def list_dir(path):\n    return os.listdir(path)\n"
+        error = "NameError: name 'os' is not defined"
+        new_code, new_invoke = auto_fix_tool(code, "list_dir('.')", error, '/tmp')
+        assert new_code.startswith("import os\n")
+        assert new_invoke == "list_dir('.')"
+
+    def test_miscapitalized_invoke(self):
+        """
+        Test that an invoke calling a mis-capitalized function name is pointed at the defined function.
+        """
+        error = "NameError: name 'CountLines' is not defined"
+        new_code, new_invoke = auto_fix_tool(self.code, "CountLines('a.txt')", error, '/tmp')
+        assert new_code == self.code
+        assert new_invoke == "count_lines('a.txt')"
+
+    def test_relative_path(self, tmp_path):
+        """
+        Test that a relative path existing under the working directory is made absolute.
+        """
+        (tmp_path / 'notes_xyz.txt').write_text('a\nb\n')
+        error = "FileNotFoundError: [Errno 2] No such file or directory: 'notes_xyz.txt'"
+        new_code, new_invoke = auto_fix_tool(self.code, "count_lines('notes_xyz.txt')", error, str(tmp_path))
+        assert new_invoke == "count_lines({!r})".format(str(tmp_path / 'notes_xyz.txt'))
+
+    def test_no_applicable_rule(self):
+        """
+        Test that errors no rule can fix are left to the LLM repair.
+        """
+        error = "ZeroDivisionError: division by zero"
+        assert auto_fix_tool(self.code, "count_lines('a.txt')", error, '/tmp') is None
+        assert auto_fix_tool(self.code, "count_lines('a.txt')", "NameError: name 'foo' is not defined", '/tmp') is None
+
+    def test_reformatted_invoke_is_not_a_fix(self):
+        """
+        Test that an invoke only reformatted by the rules, such as its double quotes, does not count as fixed.
+        """
+        error = "NameError: name 'foo' is not defined"
+        assert auto_fix_tool(self.code, 'count_lines("a.txt")', error, '/tmp') is None
+        code = "def list_dir(path):\n    return os.listdir(path)\n"
+        new_code, new_invoke = auto_fix_tool(code, 'list_dir(".")', "NameError: name 'os' is not defined", '/tmp')
+        assert new_code.startswith("import os\n") and new_invoke == 'list_dir(".")'
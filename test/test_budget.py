@@ -0,0 +1,48 @@
+import pytest
+from oscopilot.utils.budget import TaskBudget, get_current_budget, set_current_budget, reset_current_budget, record_token_usage
+
+
+class TestTaskBudget:
+    """
+    A test class for verifying the accounting of the per-task time and token budgets.
+    """
+
+    def test_unlimited_budget(self):
+        """
+        Test that a budget without limits is never low nor exhausted.
+        """
+        budget = TaskBudget()
+        budget.add_tokens(10 ** 9)
+        assert not budget.is_low() and not budget.is_exhausted()
+
+    def test_token_budget_degrades_then_exhausts(self):
+        """
+        Test that a token budget becomes low below the threshold and exhausted at the limit.
+        """
+        budget = TaskBudget(max_tokens=1000, low_fraction=0.2)
+        budget.add_tokens(700)
+        assert not budget.is_low()
+        budget.add_tokens(150)
+        assert budget.is_low() and not budget.is_exhausted()
+        budget.add_tokens(150)
+        assert budget.is_exhausted()
+
+    def test_time_budget(self):
+        """
+        Test that a wall-clock budget is exhausted once its time has passed.
+        """
+        budget = TaskBudget(max_seconds=10)
+        budget.start_time -= 11
+        assert budget.is_exhausted()
+
+    def test_token_usage_recorded_in_current_budget(self):
+        """
+        Test that LLM token usage is accounted to the budget of the current context only while it is set.
+        """
+        budget = TaskBudget(max_tokens=100)
+        token = set_current_budget(budget)
+        record_token_usage(40)
+        reset_current_budget(token)
+        record_token_usage(40)
+        assert budget.tokens_used == 40
+        assert get_current_budget() is None
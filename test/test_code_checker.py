@@ -0,0 +1,67 @@
+import pytest
+from oscopilot.modules.executor.code_checker import check_tool_code
+
+
+class TestCodeChecker:
+    """
+    A test class for verifying the static checks applied to generated code before it is executed.
+
+    The checks must reject code that is certain to fail at runtime with a precise error message, while
+    accepting valid code without false positives.
+    """
+
+    code = '''
+import os
+def list_txt_files(folder, suffix='.txt'):
+    """
+    List the files with the given suffix in a folder.
+    """
+    return [os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(suffix)]
+'''
+
+    def test_valid_python_code(self):
+        """
+        Test that valid code with a matching invocation passes the check.
+        """
+        assert check_tool_code(self.code, "list_txt_files('/tmp')", 'Python') is None
+
+    def test_python_syntax_error(self):
+        """
+        Test that a syntax error is reported with its line number.
+        """
+        error = check_tool_code("def broken(:\n    pass", "broken()", 'Python')
+        assert error.startswith("SyntaxError") and "line 1" in error
+
+    def test_missing_module_and_undefined_name(self):
+        """
+        Test that unresolved imports and names that are never defined are reported.
+        """
+        code = "import not_a_real_module_xyz\ndef copy_file(src, dst):\n    shutil.copy(src, dst)\n"
+        error = check_tool_code(code, "copy_file('a', 'b')", 'Python')
+        assert "No module named 'not_a_real_module_xyz'" in error
+        assert "name 'shutil' is not defined" in error
+
+    def test_invoke_signature_mismatch(self):
+        """
+        Test that an invocation missing a required argument is reported against the function signature.
+        """
+        error = check_tool_code(self.code, "list_txt_files(suffix='.md')", 'Python')
+        assert error.startswith("TypeError") and "'folder'" in error
+
+    def test_shell_syntax_error(self):
+        """
+        Test that shell code is checked with `bash -n`.
+        """
+        assert check_tool_code("echo hi", "", 'Shell') is None
+        assert check_tool_code("if [ -d /tmp ]; then echo hi", "", 'Shell') is not None
+
+    def test_map_invoke(self):
+        """
+        Test that a Map invocation passes the items to the per-item function as its only argument.
+        """
+        code = "import os\ndef count_lines(path):\n    return len(open(path).readlines())\n"
+        assert check_tool_code(code, "count_lines([os.path.join('/tmp', f) for f in os.listdir('/tmp')])", 'Map') is None
+        assert "only argument" in check_tool_code(code, "count_lines('/tmp/a', '/tmp/b')", 'Map')
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,73 @@
+import os
+import pytest
+from oscopilot.utils import setup_config
+from oscopilot.utils.config import Config
+from oscopilot.environments.base_env import BaseEnv, diff_snapshots, format_fs_diff
+
+
+class TestFsSnapshot:
+    """
+    A test class for verifying the working directory snapshots used to report the changes made by an execution.
+    """
+
+    @pytest.fixture
+    def env(self, tmp_path):
+        """
+        Creates an environment whose working directory is a temporary directory with a few files.
+        """
+        setup_config()
+        env = BaseEnv()
+        env.working_dir = str(tmp_path)
+        (tmp_path / 'keep.txt').write_text('keep')
+        (tmp_path / 'edit.txt').write_text('old')
+        (tmp_path / 'remove.txt').write_text('remove')
+        (tmp_path / '.oscopilot').mkdir()
+        return env
+
+    def test_diff_created_modified_deleted(self, env, tmp_path):
+        """
+        Test that created, modified and deleted entries are reported, and unchanged ones are not.
+        """
+        before = env.snapshot_working_dir()
+        (tmp_path / 'edit.txt').write_text('new content')
+        (tmp_path / 'remove.txt').unlink()
+        (tmp_path / 'out').mkdir()
+        (tmp_path / 'out' / 'report.csv').write_text('a,b')
+        (tmp_path / '.oscopilot' / 'internal.log').write_text('ignored')
+        diff = diff_snapshots(before, env.snapshot_working_dir())
+        assert diff['created'] == ['out/', 'out/report.csv']
+        assert diff['modified'] == ['edit.txt']
+        assert diff['deleted'] == ['remove.txt']
+        assert format_fs_diff(diff).splitlines()[0] == 'created: out/'
+
+    def test_no_changes(self, env):
+        """
+        Test that an execution without side effects is described as such.
+        """
+        before = env.snapshot_working_dir()
+        assert env.working_dir_changes(before) == "No files or folders were created, modified or deleted."
+
+    def test_large_directory_falls_back_to_listing(self, env):
+        """
+        Test that directories over the entry limit are not snapshotted and the listing is used instead.
+        """
+        assert env.snapshot_working_dir(max_entries=2) is None
+        assert 'keep.txt' in env.working_dir_changes(None)
+
+    def test_listing_skips_internal_dir(self, env):
+        """
+        Test that the internal directory is not listed with the contents of the working directory.
+        """
+        listing = env.list_working_dir()
+        assert 'keep.txt' in listing and '.oscopilot' not in listing
+
+    def test_internal_files_outside_working_dir(self, env, tmp_path, monkeypatch):
+        """
+        Test that the log files and the artifacts of the executions are written outside of the working directory.
+        """
+        monkeypatch.setitem(Config._instance.parameters, 'spill_output', True)
+        monkeypatch.setitem(Config._instance.parameters, 'artifact_threshold', 1024)
+        log_prefix = env.output_log_prefix()
+        assert os.path.dirname(log_prefix) == env.internal_dir('logs')
+        assert os.path.commonpath([log_prefix, str(tmp_path)]) != str(tmp_path)
+        assert os.path.commonpath([env.artifact_store().root, str(tmp_path)]) != str(tmp_path)
@@ -0,0 +1,107 @@
+from types import SimpleNamespace
+from oscopilot import FridayAgent
+from oscopilot.utils.schema import JudgementResult
+
+
+class StubPlanner:
+    """
+    Stands for the planner, with a fixed plan of independent Shell subtasks.
+    """
+
+    def __init__(self, prompt):
+        self.sub_task_list = []
+        self.tool_node = {}
+        self.tool_graph = {}
+
+    def reset_plan(self):
+        pass
+
+    def set_plan(self, sub_tasks):
+        self.sub_task_list = list(sub_tasks)
+        self.tool_node = {name: SimpleNamespace(node_type='Shell', code='', status=False) for name in sub_tasks}
+        self.tool_graph = {name: [] for name in sub_tasks}
+
+    def update_tool(self, tool, return_val='', relevant_code=None, status=False, node_type='Code'):
+        self.tool_node[tool].status = status
+
+    def topological_sort(self):
+        self.sub_task_list = [name for name, node in self.tool_node.items() if not node.status]
+
+
+class StubRetriever:
+    def __init__(self, prompt, tool_manager):
+        pass
+
+
+class StubExecutor:
+    def __init__(self, prompt, tool_manager, max_iter=3):
+        pass
+
+
+class BatchAgent(FridayAgent):
+    """
+    The agent with its planning, execution and refinement stubbed out, refining subtasks by a script of outcomes.
+    """
+
+    def __init__(self, sub_tasks, outcomes, judgements):
+        config = SimpleNamespace(
+            generated_tool_repo_path=None, max_repair_iterations=1, score=0, fast_path=False, direct_invoke=False,
+            native_api=False, batch_judge_size=len(sub_tasks), prewarm='', time_budget=None, token_budget=None,
+            trace_path=None,
+        )
+        super().__init__(StubPlanner, StubRetriever, StubExecutor, lambda path: None, config=config)
+        self.sub_tasks = sub_tasks
+        self.outcomes = outcomes
+        self.judgements = judgements
+        self.executed = []
+        self.refined = []
+
+    def planning(self, task):
+        self.planner.set_plan(self.sub_tasks)
+        return self.planner.sub_task_list
+
+    def executing(self, tool_name, original_task):
+        self.executed.append(tool_name)
+        return SimpleNamespace(get_all_state=lambda: ('', 'Shell', '', '', tool_name + ' done', None))
+
+    def batch_judging(self, tool_names, execution_states):
+        return [self.judgements[tool_name] for tool_name in tool_names]
+
+    def self_refining(self, tool_name, execution_state, judgement=None):
+        self.refined.append(tool_name)
+        isTaskCompleted, isReplan = self.outcomes.pop(0)
+        if isReplan:
+            self.planner.topological_sort()
+        if isTaskCompleted:
+            self.planner.update_tool(tool_name, status=True)
+        return isTaskCompleted, isReplan
+
+
+class TestJudgeBatch:
+    """
+    A test class for verifying that the subtasks of a judging batch run once, whatever happens to the batch.
+    """
+
+    def test_replan_does_not_execute_batch_again(self):
+        """
+        Test that after a replan the subtasks left in the batch are refined without being executed a second time.
+        """
+        complete = JudgementResult('Complete', '', 10)
+        agent = BatchAgent(['a', 'b', 'c'], [(False, True), (True, False), (True, False), (True, False)],
+                           {'a': JudgementResult('Replan', 'wrong approach', 0), 'b': complete, 'c': complete})
+        agent.plan_and_execute("task")
+        assert agent.executed == ['a', 'b', 'c', 'a']
+        assert agent.refined == ['a', 'a', 'b', 'c']
+        assert not agent.pending_executions
+
+    def test_task_failure_keeps_batch_results(self):
+        """
+        Test that when a subtask fails the task, the subtasks of its batch the judge accepted are still completed.
+        """
+        agent = BatchAgent(['a', 'b', 'c'], [(False, False)],
+                           {'a': JudgementResult('Amend', 'broken', 0), 'b': JudgementResult('Complete', '', 10),
+                            'c': JudgementResult('Amend', 'broken', 0)})
+        agent.plan_and_execute("task")
+        assert agent.executed == ['a', 'b', 'c']
+        assert agent.planner.tool_node['b'].status and not agent.planner.tool_node['c'].status
+        assert agent.inner_monologue.result == 'b done'
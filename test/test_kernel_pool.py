@@ -0,0 +1,71 @@
+from oscopilot.environments.kernel_pool import KernelPool
+
+
+class FakeKernel:
+    """
+    Stands for a Jupyter kernel environment, recording the calls made by the pool.
+    """
+    started = 0
+
+    def __init__(self):
+        FakeKernel.started += 1
+        self.alive = True
+        self.resets = 0
+
+    def is_alive(self):
+        return self.alive
+
+    def reset(self):
+        self.resets += 1
+
+    def terminate(self):
+        self.alive = False
+
+
+class TestKernelPool:
+    """
+    A test class for verifying that kernels are reused across steps with checkout and checkin.
+    """
+
+    def test_reuse_and_reset(self):
+        """
+        Test that an idle kernel is reused, cleared first with reset enabled, and that dead kernels are replaced.
+        """
+        pool = KernelPool(FakeKernel, size=1, reset=True)
+        kernel = pool.checkout()
+        pool.checkin(kernel)
+        assert pool.checkout() is kernel and kernel.resets == 1
+        kernel.alive = False
+        pool.checkin(kernel)
+        assert pool.checkout() is not kernel
+        pool.close()
+
+    def test_affinity(self):
+        """
+        Test that a kernel stays with its affinity key, keeping its state, until the key is released.
+        """
+        pool = KernelPool(FakeKernel, size=2)
+        first = pool.checkout("task-1")
+        pool.checkin(first, "task-1")
+        other = pool.checkout("task-2")
+        assert other is not first
+        pool.checkin(other, "task-2", discard=True)
+        assert not other.alive
+        assert pool.checkout("task-1") is first
+        pool.checkin(first, "task-1")
+        pool.release("task-1")
+        assert pool.checkout() is first and first.alive
+        pool.close()
+
+    def test_prewarm(self):
+        """
+        Test that prewarmed kernels serve the first checkouts as warm hits and that the pool counts cold starts.
+        """
+        pool = KernelPool(FakeKernel, size=2)
+        assert pool.prewarm() == 2
+        assert pool.prewarm() == 0
+        first, second = pool.checkout(), pool.checkout()
+        assert first is not second and pool.metrics() == {"warm_hits": 2, "cold_starts": 0}
+        pool.checkout()
+        assert pool.metrics() == {"warm_hits": 2, "cold_starts": 1}
+        pool.close()
@@ -0,0 +1,57 @@
+import sys
+import time
+import asyncio
+import subprocess
+import pytest
+from oscopilot.utils.limits import ExecutionLimits, LIMIT_ERROR_PREFIX, HAS_PRLIMIT, run_with_limits, arun_with_limits
+
+
+class TestExecutionLimits:
+    """
+    A test class for verifying that generated code is stopped by its execution limits with a structured error.
+    """
+
+    def test_timeout_kills_process_group(self):
+        """
+        Test that a command running past the timeout is killed together with its children.
+        """
+        start = time.monotonic()
+        returncode, stdout, stderr = run_with_limits("echo started; sleep 30 & sleep 30", ExecutionLimits(timeout=1), shell=True)
+        assert time.monotonic() - start < 10
+        assert returncode != 0 and stdout == "started\n"
+        assert stderr.strip() == LIMIT_ERROR_PREFIX + ": the execution exceeded the wall-clock limit of 1 seconds and was stopped."
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="resource limits are POSIX only")
+    def test_cpu_limit(self):
+        """
+        Test that a busy loop is stopped by the CPU time limit.
+        """
+        returncode, _, stderr = run_with_limits([sys.executable, "-c", "while True: pass"], ExecutionLimits(timeout=30, cpu_seconds=1))
+        assert returncode != 0 and "CPU time limit of 1 seconds" in stderr
+
+    def test_output_cap(self):
+        """
+        Test that the middle of output beyond the cap is dropped and counted, in the synchronous and asynchronous runners.
+        """
+        code = [sys.executable, "-c", "print('x' * 9999)"]
+        limits = ExecutionLimits(max_output_bytes=100)
+        for returncode, stdout, stderr in (run_with_limits(code, limits), asyncio.run(arun_with_limits(code, limits))):
+            assert returncode == 0 and stderr == ""
+            assert stdout == "x" * 50 + "\n[... 9900 bytes of output were dropped, 10000 bytes in 1 lines in total ...]\n" + "x" * 49 + "\n"
+
+    @pytest.mark.skipif(not HAS_PRLIMIT, reason="prlimit is Linux only")
+    def test_limits_applied_after_start(self):
+        """
+        Test that where prlimit is available the limits are set on the started process rather than in a preexec_fn.
+        """
+        import resource
+        limits = ExecutionLimits(cpu_seconds=7, memory_mb=512)
+        assert limits.preexec_fn() is None
+        process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(5)"])
+        try:
+            limits.limit_process(process.pid)
+            assert resource.prlimit(process.pid, resource.RLIMIT_CPU)[0] == 7
+            assert resource.prlimit(process.pid, resource.RLIMIT_AS) == (512 * 1024 * 1024, 512 * 1024 * 1024)
+        finally:
+            process.kill()
+            process.wait()
@@ -0,0 +1,41 @@
+import sys
+import subprocess
+from oscopilot.modules.executor.map_runner import build_map_code
+
+
+CODE = '''
+def invert(item):
+    """
+    Returns the inverse of a number.
+    """
+    return 1 / item
+'''
+
+
+def run(code, tmp_path):
+    script = tmp_path / "map_code.py"
+    script.write_text(code)
+    return subprocess.run([sys.executable, str(script)], capture_output=True, text=True, timeout=60)
+
+
+class TestMapRunner:
+    """
+    A test class for verifying that Map tools are fanned out over a process pool with ordered results.
+    """
+
+    def test_results_in_order(self, tmp_path):
+        """
+        Test that the results of all items are printed in the order of the items.
+        """
+        completed = run(build_map_code(CODE, "invert([1, 2, 4, 5, 8])", 3), tmp_path)
+        assert completed.returncode == 0, completed.stderr
+        result = completed.stdout.split("<return>\n")[1].split("</return>")[0].strip()
+        assert eval(result) == [{"item": item, "result": 1 / item} for item in [1, 2, 4, 5, 8]]
+
+    def test_failed_items_reported(self, tmp_path):
+        """
+        Test that the items that failed are reported with their errors.
+        """
+        completed = run(build_map_code(CODE, "invert(list(range(-2, 3)))", 2), tmp_path)
+        assert completed.returncode == 1
+        assert "1 of 5 items failed" in completed.stderr and "0: ZeroDivisionError" in completed.stderr
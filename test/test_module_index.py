@@ -0,0 +1,47 @@
+import os
+import zipfile
+from oscopilot.modules.executor.module_index import ModuleIndex, Wheelhouse, wheel_top_level_modules
+
+
+def write_wheel(directory, file_name, files):
+    path = os.path.join(directory, file_name)
+    with zipfile.ZipFile(path, "w") as wheel:
+        for name, content in files.items():
+            wheel.writestr(name, content)
+    return path
+
+
+class TestModuleIndex:
+    """
+    A test class for verifying the index of importable modules and of the modules a wheelhouse provides.
+    """
+
+    def test_summary(self):
+        """
+        Test that the summary lists installable modules, leaves out the standard library and is truncated to the limit.
+        """
+        index = ModuleIndex()
+        names = index.third_party()
+        assert "json" not in names and "os" not in names
+        assert "wheelhouse_only_module" in index.summary(len(names) + 1, ["wheelhouse_only_module"])
+        assert index.summary(0, ["a", "b"]) == " (and {} more)".format(len(set(names) | {"a", "b"}))
+
+    def test_wheelhouse_providers(self, tmp_path):
+        """
+        Test that the top-level modules of the wheels are read from their metadata, or from their files without it.
+        """
+        write_wheel(str(tmp_path), "Pillow-10.0.0-cp311-cp311-linux_x86_64.whl", {
+            "PIL/__init__.py": "",
+            "Pillow-10.0.0.dist-info/top_level.txt": "PIL\n",
+        })
+        plain = write_wheel(str(tmp_path), "tiny_pkg-1.0-py3-none-any.whl", {
+            "tiny.py": "",
+            "tiny_pkg/__init__.py": "",
+            "tiny_pkg-1.0.dist-info/METADATA": "",
+        })
+        (tmp_path / "notes.txt").write_text("not a wheel")
+        assert wheel_top_level_modules(plain) == ["tiny", "tiny_pkg"]
+        wheelhouse = Wheelhouse(str(tmp_path))
+        assert wheelhouse.modules() == {"PIL", "tiny", "tiny_pkg"}
+        assert wheelhouse.providers["PIL"].startswith("Pillow-")
+        assert wheelhouse.install(["not_in_wheelhouse"]) == []
@@ -0,0 +1,66 @@
+import os
+import json
+from oscopilot.tool_repository.manager.openapi_registry import OpenAPIRegistry
+
+
+def write_doc(path, description, schema_name):
+    doc = {
+        "openapi": "3.1.0",
+        "info": {"title": "FastAPI", "description": description},
+        "paths": {
+            "/tools/echo": {"post": {"requestBody": {"content": {"application/json": {"schema": {"$ref": "#/components/schemas/" + schema_name}}}}}},
+        },
+        "components": {"schemas": {
+            schema_name: {"type": "object", "properties": {"item": {"$ref": "#/components/schemas/Item"}}},
+            "Item": {"type": "string"},
+            "Unused": {"type": "integer"},
+        }},
+    }
+    with open(path, "w") as f:
+        json.dump(doc, f)
+
+
+class TestOpenAPIRegistry:
+    """
+    A test class for verifying that the OpenAPI registry precomputes path documents and follows file changes.
+    """
+
+    def test_path_doc(self, tmp_path):
+        """
+        Test that a path maps to a document with only the schemas it references, directly or not.
+        """
+        write_doc(tmp_path / "default_api.json", "Default tools", "EchoBody")
+        registry = OpenAPIRegistry(str(tmp_path))
+        assert registry.description_pair() == {"default_api.json": "Default tools"}
+        doc = registry.path_doc("/tools/echo")
+        assert list(doc["paths"]) == ["/tools/echo"]
+        assert sorted(doc["components"]["schemas"]) == ["EchoBody", "Item"]
+        assert "error" in registry.path_doc("/tools/missing")
+
+    def test_reload_on_change(self, tmp_path):
+        """
+        Test that a changed document is reloaded and that the default document takes precedence.
+        """
+        path = tmp_path / "default_api.json"
+        write_doc(path, "Default tools", "EchoBody")
+        write_doc(tmp_path / "other.json", "Other tools", "OtherBody")
+        registry = OpenAPIRegistry(str(tmp_path))
+        assert "EchoBody" in registry.path_doc("/tools/echo")["components"]["schemas"]
+        write_doc(path, "Changed tools", "ChangedBody")
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert registry.description_pair()["default_api.json"] == "Changed tools"
+        assert "ChangedBody" in registry.path_doc("/tools/echo")["components"]["schemas"]
+
+    def test_validate_args(self, tmp_path):
+        """
+        Test that arguments of a direct API call are checked against the schema of the request body.
+        """
+        write_doc(tmp_path / "default_api.json", "Default tools", "EchoBody")
+        registry = OpenAPIRegistry(str(tmp_path))
+        assert registry.api_operation("/tools/echo") == {
+            "method": "post", "content_type": "application/json", "schema": {"$ref": "#/components/schemas/EchoBody"}}
+        assert registry.validate_args("/tools/echo", {"item": "text"}) == []
+        assert registry.validate_args("/tools/echo", {"item": 1}) == ["args.item must be of type string"]
+        assert registry.validate_args("/tools/echo", ["text"]) == ["args must be of type object"]
+        assert registry.validate_args("/tools/missing", {}) == ["The api /tools/missing is not existed"]
@@ -0,0 +1,48 @@
+import pytest
+from oscopilot.utils.output_capture import OutputCapture
+
+
+class TestOutputCapture:
+    """
+    A test class for verifying that output captures stay bounded and keep the return block of a tool whole.
+    """
+
+    def capture(self, text, max_bytes, chunk_size=3, spill_path=None):
+        capture = OutputCapture(max_bytes, spill_path)
+        data = text.encode()
+        for i in range(0, len(data), chunk_size):
+            capture.write(data[i:i + chunk_size])
+        return capture
+
+    def test_small_output_unchanged(self):
+        """
+        Test that output within the cap is returned unchanged, markers split across writes included.
+        """
+        text = "line 1\n<return>\n42\n</return>\nafter\n"
+        capture = self.capture(text, 1000)
+        assert capture.getvalue() == text
+        assert capture.total_bytes == len(text) and capture.total_lines == 5
+
+    def test_head_tail_and_return_block(self):
+        """
+        Test that the head and tail are kept around a dropped middle, and that a return block longer than the
+        cap is kept whole at the end.
+        """
+        result = "r" * 500
+        text = "".join("line {}\n".format(i) for i in range(1000)) + "<return>\n" + result + "\n</return>\n"
+        value = self.capture(text, 40, chunk_size=7).getvalue()
+        head, rest = value.split("\n[... ", 1)
+        assert head == "line 0\nline 1\nline 2"
+        assert rest.endswith("line 998\nline 999\n<return>\n" + result + "\n</return>\n")
+        assert len(value) < 700
+
+    def test_spill(self, tmp_path):
+        """
+        Test that the full stream is written to the spill file, whose path is given in the note.
+        """
+        path = str(tmp_path / "logs" / "run.stdout.log")
+        text = "x" * 1000
+        value = self.capture(text, 10, chunk_size=64, spill_path=path).getvalue()
+        assert path in value
+        with open(path) as f:
+            assert f.read() == text
@@ -0,0 +1,53 @@
+import pytest
+from oscopilot.environments.python_worker_pool import PythonWorkerPool
+from oscopilot.utils.limits import ExecutionLimits, LIMIT_ERROR_PREFIX
+
+
+class TestPythonWorkerPool:
+    """
+    A test class for verifying that warm Python workers run code like a fresh interpreter would.
+    """
+
+    def setup_method(self, method):
+        self.pool = PythonWorkerPool(1, preload_modules=['json'], max_runs=3)
+
+    def teardown_method(self, method):
+        self.pool.close()
+
+    def test_output_and_errors(self):
+        """
+        Test that stdout, including output of subprocesses, and tracebacks are captured per run.
+        """
+        returncode, stdout, stderr = self.pool.run("import os\nprint('hello')\nos.system('echo from child')")
+        assert returncode == 0 and stdout == "hello\nfrom child\n" and stderr == ""
+        returncode, stdout, stderr = self.pool.run("print('before')\n1 / 0")
+        assert returncode == 1 and stdout == "before\n"
+        assert 'File "temp_code.py", line 2' in stderr and stderr.strip().endswith("ZeroDivisionError: division by zero")
+
+    def test_namespace_isolation(self):
+        """
+        Test that names and the working directory set by one run are not visible to the next.
+        """
+        self.pool.run("import os\nleaked = 1\nos.chdir('/')")
+        returncode, stdout, stderr = self.pool.run("import os\nprint(os.getcwd() != '/')\nprint(leaked)")
+        assert returncode == 1 and stdout == "True\n" and "NameError" in stderr
+
+    def test_exit_status_and_recycling(self):
+        """
+        Test that sys.exit sets the return code and that a worker is replaced after max_runs runs.
+        """
+        assert self.pool.run("import sys\nsys.exit(3)")[0] == 3
+        pids = [int(self.pool.run("import os\nprint(os.getpid())")[1]) for _ in range(3)]
+        assert pids[0] == pids[1] and pids[1] != pids[2]
+
+    def test_timeout_and_output_cap(self):
+        """
+        Test that a run past the timeout replaces the worker with a structured error, and that output is capped.
+        """
+        limits = ExecutionLimits(timeout=1, max_output_bytes=10)
+        pid = self.pool.run("import os\nprint(os.getpid())")[1]
+        returncode, stdout, stderr = self.pool.run("while True: pass", limits=limits)
+        assert returncode == 1 and stderr.startswith(LIMIT_ERROR_PREFIX)
+        assert self.pool.run("import os\nprint(os.getpid())")[1] != pid
+        stdout = self.pool.run("print('y' * 20)", limits=limits)[1]
+        assert stdout == "yyyyy\n[... 11 bytes of output were dropped, 21 bytes in 1 lines in total ...]\nyyyy\n"
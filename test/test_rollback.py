@@ -0,0 +1,89 @@
+import os
+import shutil
+import pytest
+from oscopilot.utils import setup_config
+from oscopilot.environments.base_env import BaseEnv
+
+
+class TestRollback:
+    """
+    A test class for verifying that the working directory can be restored to a checkpoint after a failed execution.
+    """
+
+    @pytest.fixture
+    def env(self, tmp_path):
+        """
+        Creates an environment whose working directory is a temporary directory with a few files.
+        """
+        setup_config()
+        env = BaseEnv()
+        env.working_dir = str(tmp_path)
+        (tmp_path / 'data').mkdir()
+        (tmp_path / 'data' / 'table.csv').write_text('a,b\n1,2\n')
+        (tmp_path / 'notes.txt').write_text('notes')
+        return env
+
+    def contents(self, root):
+        """
+        Returns the relative path and content of every file under a directory, internal files excluded.
+        """
+        files = {}
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [name for name in dirnames if name != '.oscopilot']
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                with open(path) as f:
+                    files[os.path.relpath(path, root)] = f.read()
+        return files
+
+    def test_restore_changes(self, env, tmp_path):
+        """
+        Test that files modified in place, deleted and created after a checkpoint are restored or removed.
+        """
+        before = self.contents(tmp_path)
+        assert env.checkpoint_working_dir()
+        with open(tmp_path / 'data' / 'table.csv', 'r+') as f:
+            f.write('broken')
+        (tmp_path / 'notes.txt').unlink()
+        (tmp_path / 'partial').mkdir()
+        (tmp_path / 'partial' / 'out.txt').write_text('half done')
+        assert env.restore_working_dir() == 4
+        assert self.contents(tmp_path) == before
+        assert not (tmp_path / 'partial').exists()
+        assert env.restore_working_dir() == 0
+
+    def test_incremental_checkpoint(self, env, tmp_path):
+        """
+        Test that a later checkpoint picks up the changes made since the previous one.
+        """
+        assert env.checkpoint_working_dir()
+        (tmp_path / 'notes.txt').write_text('updated notes')
+        (tmp_path / 'data' / 'table.csv').unlink()
+        assert env.checkpoint_working_dir()
+        expected = self.contents(tmp_path)
+        (tmp_path / 'notes.txt').write_text('overwritten')
+        env.restore_working_dir()
+        assert self.contents(tmp_path) == expected
+
+    def test_restore_after_cleanup(self, env, tmp_path):
+        """
+        Test that the checkpoint survives code that deletes everything in the working directory.
+        """
+        before = self.contents(tmp_path)
+        assert env.checkpoint_working_dir()
+        assert os.path.commonpath([env.checkpoint_dir, str(tmp_path)]) != str(tmp_path)
+        for path in tmp_path.iterdir():
+            if path.is_dir():
+                shutil.rmtree(path)
+            else:
+                path.unlink()
+        assert env.restore_working_dir() == 3
+        assert self.contents(tmp_path) == before
+
+    def test_no_checkpoint(self, env, tmp_path):
+        """
+        Test that nothing is restored without a checkpoint.
+        """
+        (tmp_path / 'new.txt').write_text('new')
+        assert env.restore_working_dir() is None
+        assert (tmp_path / 'new.txt').exists()
@@ -0,0 +1,43 @@
+import os
+import pytest
+from oscopilot.environments.shell_session import ShellSession
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="The shell session needs bash")
+class TestShellSession:
+    """
+    A test class for verifying that a shell session keeps its state across steps and recovers from a dead shell.
+    """
+
+    def setup_method(self, method):
+        self.session = ShellSession()
+
+    def teardown_method(self, method):
+        self.session.close()
+
+    def test_state_continuity(self, tmp_path):
+        """
+        Test that the working directory and exported variables of one step are visible to the next.
+        """
+        assert self.session.run("cd {}\nexport GREETING=hello".format(tmp_path)) == (0, "", "")
+        pid = self.session.process.pid
+        assert self.session.run("pwd\necho $GREETING") == (0, "{}\nhello\n".format(tmp_path), "")
+        assert self.session.process.pid == pid
+
+    def test_exit_status_and_streams(self):
+        """
+        Test that the exit status of the last command is returned and that stderr is kept apart from stdout.
+        """
+        returncode, stdout, stderr = self.session.run("printf partial\necho oops >&2\nfalse")
+        assert returncode == 1 and stdout == "partial" and stderr == "oops\n"
+
+    def test_restart_after_exit(self, tmp_path):
+        """
+        Test that a step exiting the shell reports its status and that the next step runs in a new shell in the same directory.
+        """
+        self.session.run("cd {}".format(tmp_path))
+        pid = self.session.process.pid
+        assert self.session.run("exit 3")[0] == 3
+        returncode, stdout, _ = self.session.run("pwd")
+        assert returncode == 0 and stdout == "{}\n".format(tmp_path)
+        assert self.session.process.pid != pid
@@ -0,0 +1,55 @@
+import os
+import time
+import pytest
+from oscopilot.environments.bash_env import Shell
+
+
+# Steps used to wait for at least 0.6 s after the end marker, by sleeping between reads.
+OLD_STEP_FLOOR_SECONDS = 0.6
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="The shell environment echoes the end marker to stderr on POSIX only")
+class TestStepLatency:
+    """
+    A test class for verifying that a step returns as soon as its output is read, without sleeping between reads.
+    """
+
+    def setup_method(self, method):
+        self.env = Shell()
+
+    def teardown_method(self, method):
+        self.env.terminate()
+
+    def test_trivial_step_latency(self):
+        """
+        Test that a trivial shell step can return well before the former floor of the output polling.
+
+        The fastest of several steps is compared, so that a loaded machine slowing down some steps does not matter:
+        with polling, no step could return before the floor.
+        """
+        list(self.env.step("echo warmup"))
+        durations = []
+        for _ in range(5):
+            start = time.perf_counter()
+            outputs = list(self.env.step("echo hi"))
+            durations.append(time.perf_counter() - start)
+            assert "hi" in [output["content"].strip() for output in outputs if output["format"] == "output"]
+        assert min(durations) < OLD_STEP_FLOOR_SECONDS / 2, "fastest step took {:.3f} s".format(min(durations))
+
+    def test_both_streams_drained(self):
+        """
+        Test that the output written to stderr just before the end of a step is part of that step.
+        """
+        for index in range(5):
+            outputs = list(self.env.step("echo out{0}\necho err{0} >&2".format(index)))
+            streams = {output["content"].strip(): output.get("stream") for output in outputs if output["format"] == "output"}
+            assert streams.get("out{}".format(index)) == "stdout" and streams.get("err{}".format(index)) == "stderr"
+
+    def test_interrupt_output_stays_in_its_step(self):
+        """
+        Test that the output following a KeyboardInterrupt line belongs to its step rather than to the next ones.
+        """
+        steps = ["echo KeyboardInterrupt >&2; sleep 0.2; echo after", "echo second", "echo third"]
+        outputs = [[output["content"].strip() for output in self.env.step(code)
+                    if output["format"] == "output" and output["content"].strip()] for code in steps]
+        assert outputs == [["KeyboardInterrupt", "after"], ["second"], ["third"]]
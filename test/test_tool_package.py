@@ -0,0 +1,59 @@
+import os
+import sys
+import subprocess
+from oscopilot.tool_repository.manager.tool_package import ToolPackage
+from oscopilot.tool_repository.manager.tool_manager import ToolManager
+
+
+GREET_TOOL = '''
+class greet:
+    def __call__(self, name):
+        return "hello " + name
+'''
+
+
+def run_tool(package, name, invoke):
+    code = package.import_code(name) + "\nprint(" + invoke + ")"
+    return subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+
+
+class TestToolPackage:
+    """
+    A test class for verifying that stored tools are importable from the compiled tool package.
+    """
+
+    def test_import_and_invoke(self, tmp_path):
+        """
+        Test that a tool is imported by name and invoked as if its code had run.
+        """
+        package = ToolPackage(str(tmp_path))
+        package.materialize({"greet": GREET_TOOL}, str(tmp_path))
+        assert package.has_tool("greet", GREET_TOOL) and not package.has_tool("greet", GREET_TOOL + "\n")
+        completed = run_tool(package, "greet", "greet()('tools')")
+        assert completed.returncode == 0 and completed.stdout == "hello tools\n"
+
+    def test_artifacts_follow_content(self, tmp_path):
+        """
+        Test that the compiled artifact of a tool is replaced when its code changes and removed with the tool.
+        """
+        package = ToolPackage(str(tmp_path))
+        marshal_dir = os.path.join(package.package_dir, "__marshal__")
+        package.materialize({"greet": GREET_TOOL}, str(tmp_path))
+        first = os.listdir(marshal_dir)
+        changed = GREET_TOOL.replace("hello", "hi")
+        package.materialize({"greet": changed}, str(tmp_path))
+        assert len(os.listdir(marshal_dir)) == 1 and os.listdir(marshal_dir) != first
+        assert run_tool(package, "greet", "greet()('tools')").stdout == "hi tools\n"
+        package.materialize({}, str(tmp_path))
+        assert os.listdir(marshal_dir) == []
+        assert "cannot import name 'greet'" in run_tool(package, "greet", "greet()('tools')").stderr
+
+    def test_package_written_on_first_use(self, tmp_path):
+        """
+        Test that a tool manager writes the tool package only once a tool is added, not when it is constructed.
+        """
+        tool_manager = ToolManager(str(tmp_path))
+        assert not os.path.exists(ToolPackage(str(tmp_path)).package_dir)
+        tool_manager.add_new_tool({"name": "greet", "description": "Greets someone.", "code": GREET_TOOL})
+        assert tool_manager.tool_package.has_tool("greet", GREET_TOOL)
+        assert run_tool(tool_manager.tool_package, "greet", "greet()('tools')").stdout == "hello tools\n"
@@ -0,0 +1,76 @@
+import pytest
+from oscopilot.utils.trace import TraceRecorder, TraceReplayer, TraceMismatchError, get_current_trace, recording_trace, replaying_trace, is_replaying, task_trace_path
+
+
+class FakeState:
+    result = "<return>\n3\n</return>"
+    error = ""
+    pwd = "/tmp"
+
+
+class TestTrace:
+    """
+    A test class for verifying that recorded runs can be replayed event by event without network or execution.
+    """
+
+    messages = [{"role": "system", "content": "sys"}, {"role": "user", "content": "count the files"}]
+
+    def record(self):
+        """
+        Records a small run: one retrieval, one LLM call and one execution.
+        """
+        recorder = TraceRecorder("count the files")
+        recorder.record_retrieval("count the files", ["count_files"], 0.1)
+        recorder.record_llm(self.messages, "```python\nprint(3)\n```", 1.5)
+        recorder.record_step("print(3)", "Python", FakeState(), 0.4)
+        return recorder.to_bundle()
+
+    def test_replay_in_recorded_order(self):
+        """
+        Test that the recorded responses and execution state are served in order.
+        """
+        replayer = TraceReplayer(self.record())
+        assert replayer.replay_retrieval("count the files") == ["count_files"]
+        assert replayer.replay_llm(self.messages) == "```python\nprint(3)\n```"
+        state = replayer.replay_step("print(3)", "Python")
+        assert state['result'] == FakeState.result and state['static_check_failed'] is None
+        assert replayer.recorded_seconds == pytest.approx(2.0)
+
+    def test_divergence(self):
+        """
+        Test that out-of-order requests fail, and changed requests only fail in strict mode.
+        """
+        with pytest.raises(TraceMismatchError):
+            TraceReplayer(self.record()).replay_llm(self.messages)
+        changed = [{"role": "user", "content": "something else"}]
+        replayer = TraceReplayer(self.record())
+        replayer.replay_retrieval("count the files")
+        assert replayer.replay_llm(changed) == "```python\nprint(3)\n```"
+        strict_replayer = TraceReplayer(self.record(), strict=True)
+        strict_replayer.replay_retrieval("count the files")
+        with pytest.raises(TraceMismatchError):
+            strict_replayer.replay_llm(changed)
+
+    def test_recording_context(self, tmp_path):
+        """
+        Test that a recording is only active within its context and is saved on exit.
+        """
+        path = tmp_path / "trace.json"
+        with recording_trace("task", str(path)) as recorder:
+            assert get_current_trace() is recorder
+            with recording_trace("nested task", str(tmp_path / "nested.json")) as nested:
+                assert nested is None
+        assert get_current_trace() is None
+        replayer = TraceReplayer.load(str(path))
+        assert replayer.task == "task" and replayer.events == []
+        with replaying_trace(replayer):
+            assert get_current_trace().replaying and is_replaying()
+        assert not is_replaying()
+
+    def test_task_trace_path(self):
+        """
+        Test that the tasks of a batch are recorded into one bundle each, named after their index.
+        """
+        assert task_trace_path("/tmp/trace.json", 3) == "/tmp/trace.3.json"
+        assert task_trace_path("trace", 0) == "trace.0"
+        assert task_trace_path(None, 1) is None